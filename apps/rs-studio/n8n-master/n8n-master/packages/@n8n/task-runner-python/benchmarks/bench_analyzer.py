@@ -0,0 +1,50 @@
+"""TaskAnalyzer cost of validating code, on a cache miss and on a cache hit."""
+
+from functools import partial
+
+from benchmarks.harness import SECURITY_CONFIG, Result, measure
+from src.task_analyzer import TaskAnalyzer
+
+CODE_LINES = (10, 1_000, 10_000)
+
+
+def make_code(lines: int) -> str:
+    body = [
+        f"value_{i} = json.dumps(_items[{i} % len(_items)]['json'].get('key_{i}', {i}))"
+        for i in range(lines)
+    ]
+    return "\n".join(["import json", *body, "return _items"])
+
+
+def run(repeat: int) -> list[Result]:
+    results = []
+
+    for lines in CODE_LINES:
+        code = make_code(lines)
+        payload_bytes = len(code.encode("utf-8"))
+
+        results.append(
+            Result(
+                "analyzer.validate_uncached",
+                {"lines": lines},
+                measure(
+                    lambda code=code: TaskAnalyzer(SECURITY_CONFIG).validate(code),
+                    repeat,
+                ),
+                payload_bytes=payload_bytes,
+            )
+        )
+
+        analyzer = TaskAnalyzer(SECURITY_CONFIG)
+        analyzer.validate(code)
+
+        results.append(
+            Result(
+                "analyzer.validate_cached",
+                {"lines": lines},
+                measure(partial(analyzer.validate, code), repeat),
+                payload_bytes=payload_bytes,
+            )
+        )
+
+    return results
@@ -0,0 +1,169 @@
+"""End-to-end task latency through a runner subprocess connected to a local broker."""
+
+import asyncio
+import time
+from functools import partial
+
+from benchmarks.bench_executor import CODE, TASK_TIMEOUT
+from benchmarks.harness import (
+    KB,
+    NODE_MODES,
+    Result,
+    make_items,
+    repeat_for,
+)
+from src.constants import (
+    ENV_MAX_CONCURRENCY,
+    ENV_MAX_PAYLOAD_SIZE,
+    ENV_TASK_TIMEOUT,
+    RUNNER_TASK_DONE,
+    RUNNER_TASK_ERROR,
+    RUNNER_TASK_OFFER,
+    RUNNER_TASK_REJECTED,
+)
+from src.message_serde import NODE_MODE_MAP
+from src.message_types.broker import Items, NodeMode
+from src.nanoid import nanoid
+from tests.fixtures.local_task_broker import LocalTaskBroker, WebsocketMessage
+from tests.fixtures.task_runner_manager import TaskRunnerManager
+
+NODE_MODE_TO_BROKER_STYLE = {v: k for k, v in NODE_MODE_MAP.items()}
+MAX_PAYLOAD_SIZE = 2 * 1024 * 1024 * 1024  # 2 GiB
+
+
+class BenchmarkBroker(LocalTaskBroker):
+    """Local broker that hands out offers and task results as they arrive, instead of polling."""
+
+    def __init__(self):
+        super().__init__(max_msg_size=0)
+        self.offers: asyncio.Queue[tuple[str, float]] = asyncio.Queue()
+        self.waiters: dict[str, asyncio.Future[WebsocketMessage]] = {}
+
+    async def _handle_message(self, connection_id: str, message: WebsocketMessage):
+        self.received_messages.clear()  # results are not kept, some are large
+
+        message_type = message.get("type")
+
+        if message_type == RUNNER_TASK_OFFER:
+            expires_at = time.monotonic() + message["validFor"] / 1000
+            self.offers.put_nowait((message["offerId"], expires_at))
+
+        elif message_type in (
+            RUNNER_TASK_DONE,
+            RUNNER_TASK_ERROR,
+            RUNNER_TASK_REJECTED,
+        ):
+            waiter = self.waiters.pop(message["taskId"], None)
+            if waiter and not waiter.done():
+                waiter.set_result(message)
+
+        await super()._handle_message(connection_id, message)
+
+    async def run_task(self, node_mode: NodeMode, items: Items) -> WebsocketMessage:
+        task_id = nanoid()
+        self.task_settings[task_id] = {
+            "code": CODE[node_mode],
+            "nodeMode": NODE_MODE_TO_BROKER_STYLE[node_mode],
+            "items": items,
+            "continueOnFail": False,
+        }
+        waiter = asyncio.get_running_loop().create_future()
+        self.waiters[task_id] = waiter
+
+        while True:
+            offer_id, expires_at = await self.offers.get()
+            if expires_at > time.monotonic():
+                break
+
+        connection_id = next(iter(self.connections))
+        await self.send_to_connection(
+            connection_id,
+            {"type": "broker:taskofferaccept", "taskId": task_id, "offerId": offer_id},
+        )
+
+        try:
+            message = await waiter
+        finally:
+            del self.task_settings[task_id]
+
+        if message["type"] != RUNNER_TASK_DONE:
+            raise RuntimeError(f"Task {task_id} did not complete: {message}")
+
+        return message
+
+
+async def measure_async(coroutine_fn, repeat: int) -> list[float]:
+    runs = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        await coroutine_fn()
+        runs.append(time.perf_counter() - start)
+    return runs
+
+
+async def run_async(
+    sizes: dict[str, int], concurrency_levels: list[int], repeat: int
+) -> list[Result]:
+    broker = BenchmarkBroker()
+    await broker.start()
+
+    manager = TaskRunnerManager(
+        task_broker_url=broker.get_url(),
+        custom_env={
+            ENV_MAX_CONCURRENCY: str(max(concurrency_levels)),
+            ENV_MAX_PAYLOAD_SIZE: str(MAX_PAYLOAD_SIZE),
+            ENV_TASK_TIMEOUT: str(TASK_TIMEOUT),
+        },
+    )
+    await manager.start()
+
+    results = []
+
+    try:
+        for node_mode in NODE_MODES:
+            for size_name, size_bytes in sizes.items():
+                items = make_items(size_bytes)
+
+                results.append(
+                    Result(
+                        "e2e.task",
+                        {"node_mode": node_mode, "size": size_name},
+                        await measure_async(
+                            partial(broker.run_task, node_mode, items),
+                            repeat_for(size_bytes, repeat),
+                        ),
+                        payload_bytes=size_bytes,
+                    )
+                )
+
+            items = make_items(KB)
+
+            for concurrency in concurrency_levels:
+
+                async def run_concurrently(
+                    node_mode=node_mode, items=items, concurrency=concurrency
+                ):
+                    await asyncio.gather(
+                        *(broker.run_task(node_mode, items) for _ in range(concurrency))
+                    )
+
+                runs = await measure_async(run_concurrently, repeat)
+                results.append(
+                    Result(
+                        "e2e.concurrent_tasks",
+                        {"node_mode": node_mode, "concurrency": concurrency},
+                        runs,
+                        extra={"tasks_per_s": concurrency / min(runs)},
+                    )
+                )
+    finally:
+        await manager.stop()
+        await broker.stop()
+
+    return results
+
+
+def run(
+    sizes: dict[str, int], concurrency_levels: list[int], repeat: int
+) -> list[Result]:
+    return asyncio.run(run_async(sizes, concurrency_levels, repeat))
@@ -0,0 +1,93 @@
+"""TaskExecutor spawn latency and round trip of items through a subprocess."""
+
+import asyncio
+from functools import partial
+
+from benchmarks.harness import (
+    NODE_MODES,
+    SECURITY_CONFIG,
+    Result,
+    make_items,
+    measure,
+    repeat_for,
+)
+from src import json_codec
+from src.message_types.broker import Items, NodeMode
+from src.task_executor import TaskExecutor
+
+CODE = {"all_items": "return _items", "per_item": "return _item"}
+TASK_TIMEOUT = 600  # s
+PIPE_READER_TIMEOUT = 60  # s
+
+
+async def execute_async(node_mode: NodeMode, items: Items) -> Items:
+    process, read_conn, write_conn = TaskExecutor.create_process(
+        CODE[node_mode], node_mode, items, SECURITY_CONFIG
+    )
+    result, _, _ = await TaskExecutor.execute_process(
+        process,
+        read_conn,
+        write_conn,
+        TASK_TIMEOUT,
+        PIPE_READER_TIMEOUT,
+        continue_on_fail=False,
+    )
+    return result
+
+
+def execute(node_mode: NodeMode, items: Items) -> Items:
+    return asyncio.run(execute_async(node_mode, items))
+
+
+def execute_concurrently(node_mode: NodeMode, items: Items, concurrency: int) -> None:
+    async def execute_all():
+        await asyncio.gather(
+            *(execute_async(node_mode, items) for _ in range(concurrency))
+        )
+
+    asyncio.run(execute_all())
+
+
+def run(
+    sizes: dict[str, int], concurrency_levels: list[int], repeat: int
+) -> list[Result]:
+    results = []
+
+    for node_mode in NODE_MODES:
+        results.append(
+            Result(
+                "executor.spawn",
+                {"node_mode": node_mode},
+                measure(partial(execute, node_mode, []), repeat),
+            )
+        )
+
+        for size_name, size_bytes in sizes.items():
+            items = make_items(size_bytes)
+
+            results.append(
+                Result(
+                    "executor.round_trip",
+                    {"node_mode": node_mode, "size": size_name},
+                    measure(
+                        partial(execute, node_mode, items),
+                        repeat_for(size_bytes, repeat),
+                    ),
+                    payload_bytes=len(json_codec.dumps(items)),
+                )
+            )
+
+        for concurrency in concurrency_levels:
+            runs = measure(
+                partial(execute_concurrently, node_mode, [], concurrency), repeat
+            )
+            results.append(
+                Result(
+                    "executor.concurrent_spawn",
+                    {"node_mode": node_mode, "concurrency": concurrency},
+                    runs,
+                    extra={"tasks_per_s": concurrency / min(runs)},
+                )
+            )
+
+    return results
@@ -0,0 +1,38 @@
+"""Throughput of each installed JSON codec on realistic item payloads."""
+
+from functools import partial
+
+from benchmarks.harness import Result, make_items, measure, repeat_for
+from src import json_codec
+from src.json_codec import AVAILABLE_CODECS
+
+
+def run(sizes: dict[str, int], repeat: int) -> list[Result]:
+    results = []
+
+    for size_name, size_bytes in sizes.items():
+        items = make_items(size_bytes)
+        payload_bytes = len(json_codec.dumps(items))
+
+        for name, codec in sorted(AVAILABLE_CODECS.items()):
+            encoded = codec.dumps(items)
+            runs = repeat_for(size_bytes, repeat)
+
+            results.append(
+                Result(
+                    "json_codec.dumps",
+                    {"codec": name, "size": size_name},
+                    measure(partial(codec.dumps, items), runs),
+                    payload_bytes=payload_bytes,
+                )
+            )
+            results.append(
+                Result(
+                    "json_codec.loads",
+                    {"codec": name, "size": size_name},
+                    measure(partial(codec.loads, encoded), runs),
+                    payload_bytes=payload_bytes,
+                )
+            )
+
+    return results
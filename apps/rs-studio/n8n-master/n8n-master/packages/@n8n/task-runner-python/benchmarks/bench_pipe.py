@@ -0,0 +1,79 @@
+"""Throughput of results streamed from a subprocess to the runner over the pipe."""
+
+import asyncio
+import os
+from functools import partial
+from unittest.mock import MagicMock
+
+from benchmarks.harness import Result, make_items, measure, repeat_for
+from src import json_codec
+from src.message_serde import MessageSerde
+from src.message_types.runner import RunnerTaskDone
+from src.pipe_reader import PipeReader
+from src.pipe_writer import PipeWriter
+
+
+def transfer(items, raw_result: bool = False) -> PipeReader:
+    read_fd, write_fd = os.pipe()
+    pipe_reader = PipeReader(read_fd, MagicMock(), raw_result=raw_result)
+
+    def write():
+        try:
+            PipeWriter(write_fd).write_result(items, [])
+        finally:
+            os.close(write_fd)
+
+    async def read_and_write():
+        await asyncio.gather(pipe_reader.read(), asyncio.to_thread(write))
+
+    try:
+        asyncio.run(read_and_write())
+    finally:
+        os.close(read_fd)
+
+    if pipe_reader.error:
+        raise pipe_reader.error
+
+    return pipe_reader
+
+
+def forward(items, raw_result: bool) -> None:
+    """Pipe a result and serialize it into the message to the broker."""
+
+    pipe_reader = transfer(items, raw_result)
+    assert pipe_reader.pipe_message is not None
+    task_done = RunnerTaskDone(
+        task_id="task-id", data={"result": pipe_reader.pipe_message["result"]}
+    )
+    MessageSerde.serialize_runner_message(task_done)
+
+
+def run(sizes: dict[str, int], repeat: int) -> list[Result]:
+    results = []
+
+    for size_name, size_bytes in sizes.items():
+        items = make_items(size_bytes)
+
+        results.append(
+            Result(
+                "pipe.transfer_result",
+                {"size": size_name},
+                measure(partial(transfer, items), repeat_for(size_bytes, repeat)),
+                payload_bytes=len(json_codec.dumps(items)),
+            )
+        )
+
+        for mode, raw_result in (("decoded", False), ("raw", True)):
+            results.append(
+                Result(
+                    "pipe.forward_result",
+                    {"size": size_name, "mode": mode},
+                    measure(
+                        partial(forward, items, raw_result),
+                        repeat_for(size_bytes, repeat),
+                    ),
+                    payload_bytes=len(json_codec.dumps(items)),
+                )
+            )
+
+    return results
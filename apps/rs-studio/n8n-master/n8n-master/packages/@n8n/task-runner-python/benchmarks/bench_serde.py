@@ -0,0 +1,57 @@
+"""MessageSerde cost of parsing task settings and serializing task results."""
+
+from functools import partial
+
+from benchmarks.harness import Result, make_items, measure, repeat_for
+from src import json_codec
+from src.message_serde import MessageSerde
+from src.message_types.runner import RunnerTaskDone
+
+
+def run(sizes: dict[str, int], repeat: int) -> list[Result]:
+    results = []
+
+    for size_name, size_bytes in sizes.items():
+        items = make_items(size_bytes)
+        runs = repeat_for(size_bytes, repeat)
+
+        # as received from the broker, undecoded
+        task_settings = json_codec.dumps(
+            {
+                "type": "broker:tasksettings",
+                "taskId": "task-id",
+                "settings": {
+                    "code": "return _items",
+                    "nodeMode": "runOnceForAllItems",
+                    "items": items,
+                },
+            }
+        )
+
+        results.append(
+            Result(
+                "serde.deserialize_task_settings",
+                {"size": size_name},
+                measure(
+                    partial(MessageSerde.deserialize_broker_message, task_settings),
+                    runs,
+                ),
+                payload_bytes=len(task_settings),
+            )
+        )
+
+        task_done = RunnerTaskDone(task_id="task-id", data={"result": items})
+        serialized = MessageSerde.serialize_runner_message(task_done)
+
+        results.append(
+            Result(
+                "serde.serialize_task_done",
+                {"size": size_name},
+                measure(
+                    partial(MessageSerde.serialize_runner_message, task_done), runs
+                ),
+                payload_bytes=len(serialized),
+            )
+        )
+
+    return results
@@ -0,0 +1,116 @@
+"""Shared helpers for the benchmark suite: payloads, timing and results."""
+
+import os
+import platform
+import time
+from collections.abc import Callable
+from dataclasses import dataclass, field
+from typing import Any
+
+from src import json_codec
+from src.config.security_config import SecurityConfig
+from src.message_types.broker import Items, NodeMode
+
+KB = 1024
+MB = 1024 * KB
+
+SIZES = {"1KB": KB, "100KB": 100 * KB, "10MB": 10 * MB}
+LARGE_SIZES = {"100MB": 100 * MB, "500MB": 500 * MB}
+
+NODE_MODES: tuple[NodeMode, ...] = ("all_items", "per_item")
+
+# payloads above this are measured once, as a single run takes seconds
+SINGLE_RUN_THRESHOLD = 10 * MB
+
+SECURITY_CONFIG = SecurityConfig(
+    stdlib_allow={"json", "datetime"},
+    external_allow=set(),
+    builtins_deny={"eval", "exec", "compile", "open", "input"},
+    runner_env_deny=True,
+)
+
+ITEM_NAMES = ["Alice", "Bob", "Conceição", "Đorđe", "Zoë", "山田"]
+ITEM_CITIES = ["Lisboa", "São Paulo", "Zürich"]
+
+
+@dataclass
+class Result:
+    benchmark: str
+    params: dict[str, Any]
+    runs: list[float]  # seconds
+    payload_bytes: int = 0
+    extra: dict[str, Any] = field(default_factory=dict)
+
+    def to_dict(self) -> dict[str, Any]:
+        best = min(self.runs)
+        result = {
+            "benchmark": self.benchmark,
+            "params": self.params,
+            "runs": len(self.runs),
+            "best_s": best,
+            "mean_s": sum(self.runs) / len(self.runs),
+            **self.extra,
+        }
+
+        if self.payload_bytes:
+            result["payload_bytes"] = self.payload_bytes
+            result["mb_per_s"] = self.payload_bytes / MB / best if best else None
+
+        return result
+
+
+def measure(fn: Callable[[], Any], repeat: int) -> list[float]:
+    """Wall time in seconds of each of `repeat` runs of `fn`."""
+
+    runs = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        runs.append(time.perf_counter() - start)
+    return runs
+
+
+def repeat_for(size_bytes: int, repeat: int) -> int:
+    return 1 if size_bytes > SINGLE_RUN_THRESHOLD else repeat
+
+
+def make_item(index: int) -> dict[str, Any]:
+    """An item shaped like typical n8n node output: nested, mixed types, some non-ASCII."""
+
+    return {
+        "json": {
+            "id": index,
+            "name": ITEM_NAMES[index % len(ITEM_NAMES)],
+            "email": f"user{index}@example.com",
+            "active": index % 2 == 0,
+            "score": index * 0.37 % 100,
+            "createdAt": f"2024-01-{1 + index % 28:02d}T10:00:00.000Z",
+            "tags": ["a", "b", "c"][: 1 + index % 3],
+            "address": {
+                "street": f"{index % 999 + 1} Main St",
+                "city": ITEM_CITIES[index % len(ITEM_CITIES)],
+                "zip": f"{10000 + index % 90000}",
+            },
+        },
+    }
+
+
+def make_items(size_bytes: int) -> Items:
+    """Items adding up to roughly `size_bytes` of JSON."""
+
+    item_size = len(json_codec.dumps(make_item(0)))
+    return [make_item(i) for i in range(max(1, size_bytes // item_size))]
+
+
+def get_sizes(include_large: bool) -> dict[str, int]:
+    return {**SIZES, **LARGE_SIZES} if include_large else dict(SIZES)
+
+
+def get_environment() -> dict[str, Any]:
+    return {
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+        "json_codec": json_codec.codec.name,
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+    }
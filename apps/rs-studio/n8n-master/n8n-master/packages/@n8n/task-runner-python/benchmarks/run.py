@@ -0,0 +1,104 @@
+"""Run the benchmark suite and emit results as JSON.
+
+Usage: uv run python -m benchmarks.run [--suite NAME ...] [--large] [--output PATH]
+"""
+
+import argparse
+import contextlib
+import json
+import sys
+
+from benchmarks import (
+    bench_analyzer,
+    bench_e2e,
+    bench_executor,
+    bench_json_codec,
+    bench_pipe,
+    bench_serde,
+)
+from benchmarks.harness import Result, get_environment, get_sizes
+
+SUITES = ("json_codec", "serde", "pipe", "analyzer", "executor", "e2e")
+
+
+def run_suite(
+    suite: str, sizes: dict[str, int], concurrency_levels: list[int], repeat: int
+) -> list[Result]:
+    match suite:
+        case "json_codec":
+            return bench_json_codec.run(sizes, repeat)
+        case "serde":
+            return bench_serde.run(sizes, repeat)
+        case "pipe":
+            return bench_pipe.run(sizes, repeat)
+        case "analyzer":
+            return bench_analyzer.run(repeat)
+        case "executor":
+            return bench_executor.run(sizes, concurrency_levels, repeat)
+        case "e2e":
+            return bench_e2e.run(sizes, concurrency_levels, repeat)
+        case _:
+            raise ValueError(f"Unknown benchmark suite: {suite}")
+
+
+def format_row(result: dict) -> str:
+    params = ", ".join(f"{k}={v}" for k, v in result["params"].items())
+    row = f"{result['benchmark']:<36}{params:<44}{result['best_s'] * 1000:>12.2f} ms"
+
+    if result.get("mb_per_s") is not None:
+        row += f"{result['mb_per_s']:>12.1f} MB/s"
+    elif "tasks_per_s" in result:
+        row += f"{result['tasks_per_s']:>12.1f} tasks/s"
+
+    return row
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument(
+        "--suite",
+        action="append",
+        choices=SUITES,
+        help="suite to run, repeatable (default: all)",
+    )
+    parser.add_argument(
+        "--large",
+        action="store_true",
+        help="also run 100MB and 500MB payloads, needing several GB of memory",
+    )
+    parser.add_argument(
+        "--concurrency",
+        default="1,4,8",
+        help="comma-separated concurrency levels (default: 1,4,8)",
+    )
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--output", help="write JSON results to a file, else stdout")
+    args = parser.parse_args()
+
+    sizes = get_sizes(args.large)
+    concurrency_levels = [int(level) for level in args.concurrency.split(",")]
+
+    results = []
+
+    # stdout is reserved for the JSON report
+    with contextlib.redirect_stdout(sys.stderr):
+        for suite in args.suite or SUITES:
+            print(f"Running {suite} benchmarks...")
+            for result in run_suite(suite, sizes, concurrency_levels, args.repeat):
+                row = result.to_dict()
+                print(format_row(row))
+                results.append(row)
+
+    report = json.dumps(
+        {"environment": get_environment(), "results": results}, indent=2
+    )
+
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(report + "\n")
+    else:
+        print(report)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,70 @@
+import asyncio
+import random
+from collections import deque
+from urllib.parse import urlparse
+
+from websockets.asyncio.client import ClientConnection
+
+from src.constants import (
+    BROKER_RECONNECT_BASE_DELAY,
+    BROKER_RECONNECT_MAX_DELAY,
+    TASK_BROKER_WS_PATH,
+)
+
+
+class BrokerConnection:
+    """Connection state for one task broker. A runner may hold one per broker."""
+
+    def __init__(self, uri: str, runner_id: str):
+        self.uri = uri
+        websocket_host = urlparse(uri).netloc
+        self.websocket_url = (
+            f"ws://{websocket_host}{TASK_BROKER_WS_PATH}?id={runner_id}"
+        )
+
+        self.websocket: ClientConnection | None = None
+        self.is_registered = False
+        self.reconnect_attempts = 0
+
+        # serialized task output, sent in order by `sender_coroutine`, flagged if a task result
+        self.send_queue: asyncio.Queue[tuple[bytes, bool]] = asyncio.Queue()
+        self.sender_coroutine: asyncio.Task | None = None
+
+        # results of tasks that finished while disconnected, sent once registered again
+        self.pending_results: deque[bytes] = deque()
+        self.pending_results_size = 0  # bytes
+
+    def buffer_result(self, serialized: bytes, max_size: int) -> int:
+        """Hold a task result until the runner is registered again, returning how many results were dropped to make room."""
+
+        if len(serialized) > max_size:
+            return 1
+
+        dropped = 0
+        while self.pending_results_size + len(serialized) > max_size:
+            self.pending_results_size -= len(self.pending_results.popleft())
+            dropped += 1
+
+        self.pending_results.append(serialized)
+        self.pending_results_size += len(serialized)
+
+        return dropped
+
+    def take_pending_results(self) -> list[bytes]:
+        results = list(self.pending_results)
+        self.pending_results.clear()
+        self.pending_results_size = 0
+
+        return results
+
+    def get_reconnect_delay(self) -> float:
+        """Exponential backoff with jitter, so that runners do not reconnect in lockstep after a broker restart."""
+
+        delay = min(
+            BROKER_RECONNECT_BASE_DELAY * 2**self.reconnect_attempts,
+            BROKER_RECONNECT_MAX_DELAY,
+        )
+        if delay < BROKER_RECONNECT_MAX_DELAY:
+            self.reconnect_attempts += 1
+
+        return delay / 2 + random.uniform(0, delay / 2)
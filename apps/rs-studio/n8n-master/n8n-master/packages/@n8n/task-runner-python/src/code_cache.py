@@ -0,0 +1,61 @@
+import hashlib
+import marshal
+from collections import OrderedDict
+
+from src.message_types.broker import NodeMode
+from src.task_executor import TaskExecutor
+
+CodeCacheKey = tuple[str, NodeMode]  # (code_hash, node_mode)
+
+
+class CodeCache:
+    """User code compiled once in the runner and reused across tasks.
+
+    Entries are marshalled code objects, which subprocesses load instead of
+    wrapping and compiling the source again. Entries are evicted least
+    recently used first once `max_size` is exceeded.
+    """
+
+    def __init__(self, max_size: int):
+        self.max_size = max_size
+        self.hits = 0
+        self.misses = 0
+        self._cache: OrderedDict[CodeCacheKey, bytes] = OrderedDict()
+
+    def __len__(self) -> int:
+        return len(self._cache)
+
+    def get(self, cache_key: CodeCacheKey) -> bytes | None:
+        compiled_code = self._cache.get(cache_key)
+
+        if compiled_code is None:
+            self.misses += 1
+            return None
+
+        self.hits += 1
+        self._cache.move_to_end(cache_key)
+        return compiled_code
+
+    def put(self, cache_key: CodeCacheKey, compiled_code: bytes) -> None:
+        self._cache[cache_key] = compiled_code
+        self._cache.move_to_end(cache_key)
+
+        if len(self._cache) > self.max_size:
+            self._cache.popitem(last=False)  # least recently used
+
+    @staticmethod
+    def to_cache_key(code: str, node_mode: NodeMode) -> CodeCacheKey:
+        return (hashlib.sha256(code.encode()).hexdigest(), node_mode)
+
+    @staticmethod
+    def compile(code: str, node_mode: NodeMode) -> bytes | None:
+        """Compile and marshal user code, or `None` if it does not compile.
+
+        Code that does not compile is left to the subprocess, so that the
+        error is reported to the user exactly as before.
+        """
+
+        try:
+            return marshal.dumps(TaskExecutor.compile_code(code, node_mode))
+        except (SyntaxError, ValueError, OverflowError, RecursionError, MemoryError):
+            return None
@@ -0,0 +1,106 @@
+from collections.abc import Callable, Mapping
+from types import ModuleType
+from typing import Any
+
+from src.constants import COLUMNAR_ARRAY_MODULES
+from src.errors import SecurityViolationError
+from src.message_types.broker import Items
+
+type Columns = dict[str, Any]
+
+# converted exactly, e.g. `bool` is not taken for `int`
+ARRAY_SCALAR_TYPES = (bool, int, float, str)
+
+
+def import_array_module(safe_import: Callable) -> ModuleType | None:
+    """The first of `COLUMNAR_ARRAY_MODULES` that is allowlisted and installed, if any."""
+
+    for module_name in COLUMNAR_ARRAY_MODULES:
+        try:
+            return safe_import(module_name)
+        except (SecurityViolationError, ImportError):
+            continue
+
+    return None
+
+
+def to_columns(items: Items, array_module: ModuleType | None) -> Columns:
+    """Turn the `json` of items into one array per field, in the order fields first appear.
+
+    Fields missing from an item are None. Only columns whose values all have the
+    same scalar type become arrays, so that array modules do not coerce them,
+    e.g. `[1, "a"]` to strings. Other columns stay lists, as do columns with None
+    for NumPy, which has no missing value for these types.
+    """
+
+    rows = [item.get("json", {}) for item in items]
+    field_names = dict.fromkeys(name for row in rows for name in row)
+
+    columns: Columns = {}
+    for name in field_names:
+        values = [row.get(name) for row in rows]
+        columns[name] = _to_array(values, array_module)
+
+    return columns
+
+
+def from_columns(columns: Mapping[str, Any]) -> Items:
+    """Turn columns returned by user code back into items, one per row."""
+
+    names = list(columns)
+    values = [_to_list(name, columns[name]) for name in names]
+
+    lengths = {len(column) for column in values}
+    if len(lengths) > 1:
+        raise ValueError(
+            f"Columns returned by the code have different lengths: {sorted(lengths)}"
+        )
+
+    return [{"json": dict(zip(names, row))} for row in zip(*values)]
+
+
+def _to_array(values: list, array_module: ModuleType | None) -> Any:
+    if array_module is None:
+        return values
+
+    is_numpy = array_module.__name__ == "numpy"
+    value_types = {type(value) for value in values}
+    if type(None) in value_types:
+        if is_numpy:
+            return values
+        value_types.remove(type(None))
+
+    if len(value_types) != 1 or value_types.pop() not in ARRAY_SCALAR_TYPES:
+        return values
+
+    try:
+        if is_numpy:
+            return array_module.asarray(values)
+        return array_module.array(values)
+    except (ValueError, TypeError, OverflowError):  # e.g. integers over 64 bits
+        return values
+
+
+def _to_list(name: str, column: Any) -> list:
+    # NumPy arrays and pandas series have `tolist`, Arrow arrays `to_pylist`,
+    # both yielding plain Python values that can be encoded as JSON
+    if hasattr(column, "tolist"):
+        return column.tolist()
+    if hasattr(column, "to_pylist"):
+        return column.to_pylist()
+    if isinstance(column, (list, tuple)):
+        return [_to_python(value) for value in column]
+
+    raise ValueError(
+        f"Column '{name}' returned by the code must be a list or array, got {type(column).__name__}"
+    )
+
+
+def _to_python(value: Any) -> Any:
+    # scalars taken out of arrays, e.g. by iterating over them, are not plain
+    # Python values either: NumPy ones have `item`, Arrow ones `as_py`
+    if hasattr(value, "item"):
+        return value.item()
+    if hasattr(value, "as_py"):
+        return value.as_py()
+    return value
@@ -0,0 +1,115 @@
+import logging
+import math
+import os
+import time
+
+from src.constants import (
+    CONCURRENCY_MEMORY_HEADROOM,
+    CONCURRENCY_MIN_CPU_SHARE,
+    CONCURRENCY_TASK_SMOOTHING,
+    CONCURRENCY_TUNE_INTERVAL,
+    LOG_CONCURRENCY_TUNED,
+    MEMINFO_PATH,
+)
+from src.task_state import TaskStats
+
+
+class ConcurrencyTuner:
+    """Picks how many tasks to run at once from host capacity and recent tasks.
+
+    CPU bound: CPUs not busy with other work on the host, divided by the share
+    of a CPU an average task uses (CPU time over wall time), so that tasks
+    mostly waiting on I/O can overlap. Memory bound: tasks already running plus
+    as many more as fit in available memory at the average task peak RSS.
+
+    The lower bound is used, within `min_concurrency` and `max_concurrency`,
+    and recomputed at most every `CONCURRENCY_TUNE_INTERVAL` seconds.
+    """
+
+    def __init__(self, min_concurrency: int, max_concurrency: int):
+        self.min_concurrency = min_concurrency
+        self.max_concurrency = max_concurrency
+        self.target = min_concurrency
+        self.cpu_share: float | None = None  # moving average, CPU seconds per second
+        self.peak_rss: float | None = None  # moving average, bytes
+        self.logger = logging.getLogger(__name__)
+
+        self._tuned_at: float | None = None
+
+    def limit(self, running: int) -> int:
+        """Tasks to run at once, given the number running now."""
+
+        now = time.monotonic()
+        if self._tuned_at is None or now - self._tuned_at >= CONCURRENCY_TUNE_INTERVAL:
+            self._tuned_at = now
+            self._tune(running)
+
+        return self.target
+
+    def record(self, stats: TaskStats, duration: float) -> None:
+        """Add the resource profile of a finished task."""
+
+        if stats.cpu_user is not None and stats.cpu_system is not None and duration > 0:
+            cpu_share = (stats.cpu_user + stats.cpu_system) / duration
+            self.cpu_share = self._smooth(self.cpu_share, cpu_share)
+
+        if stats.peak_rss:
+            self.peak_rss = self._smooth(self.peak_rss, stats.peak_rss)
+
+    def _tune(self, running: int) -> None:
+        target = min(self._get_cpu_bound(running), self._get_memory_bound(running))
+        target = max(self.min_concurrency, min(target, self.max_concurrency))
+
+        if target != self.target:
+            self.logger.info(
+                LOG_CONCURRENCY_TUNED.format(previous=self.target, target=target)
+            )
+            self.target = target
+
+    def _get_cpu_bound(self, running: int) -> int:
+        cpu_count = os.process_cpu_count() or 1
+        cpu_share = max(
+            self.cpu_share if self.cpu_share is not None else 1.0,
+            CONCURRENCY_MIN_CPU_SHARE,
+        )
+
+        try:
+            load = os.getloadavg()[0]
+        except OSError:
+            load = 0.0
+
+        # our own tasks are part of the load average
+        outside_load = max(load - running * cpu_share, 0.0)
+        free_cpus = max(cpu_count - outside_load, 0.0)
+
+        return math.floor(free_cpus / cpu_share)
+
+    def _get_memory_bound(self, running: int) -> int:
+        available = ConcurrencyTuner._get_available_memory()
+        if available is None or not self.peak_rss:
+            return self.max_concurrency
+
+        return running + math.floor(
+            available * CONCURRENCY_MEMORY_HEADROOM / self.peak_rss
+        )
+
+    @staticmethod
+    def _smooth(average: float | None, value: float) -> float:
+        if average is None:
+            return value
+
+        return average + CONCURRENCY_TASK_SMOOTHING * (value - average)
+
+    @staticmethod
+    def _get_available_memory() -> int | None:
+        """Memory available to new processes in bytes, where `/proc` is available."""
+
+        try:
+            with open(MEMINFO_PATH) as f:
+                for line in f:
+                    if line.startswith("MemAvailable:"):
+                        return int(line.split()[1]) * 1024
+        except (OSError, IndexError, ValueError):
+            pass
+
+        return None
@@ -7,3 +7,5 @@ class SecurityConfig:
     external_allow: set[str]
     builtins_deny: set[str]
     runner_env_deny: bool
+    max_memory: int = 0  # bytes of address space, 0 for no limit
+    max_cpu_time: int = 0  # seconds per task, 0 for no limit
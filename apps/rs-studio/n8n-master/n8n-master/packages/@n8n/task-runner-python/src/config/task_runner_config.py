@@ -1,26 +1,65 @@
-from dataclasses import dataclass
+from dataclasses import dataclass, field
 
 from src.env import read_bool_env, read_int_env, read_str_env
 from src.errors import ConfigurationError
+from src.json_codec import AVAILABLE_CODECS
 from src.constants import (
+    BROKER_URI_SEPARATOR,
     BUILTINS_DENY_DEFAULT,
+    DEFAULT_CONCURRENCY_AUTO,
     DEFAULT_MAX_CONCURRENCY,
+    DEFAULT_MIN_CONCURRENCY,
+    DEFAULT_RESULT_BUFFER_SIZE,
+    DEFAULT_RAW_RESULTS,
+    DEFAULT_PRELOAD_MODULES,
+    JSON_CODEC_AUTO,
+    DEFAULT_MAX_QUEUED_BYTES,
+    DEFAULT_MAX_QUEUED_TASKS,
+    DEFAULT_WORKFLOW_MAX_CONCURRENCY,
     DEFAULT_MAX_PAYLOAD_SIZE,
     DEFAULT_TASK_BROKER_URI,
     DEFAULT_TASK_TIMEOUT,
+    DEFAULT_TASK_MAX_CPU_TIME,
+    DEFAULT_TASK_MAX_MEMORY,
     DEFAULT_AUTO_SHUTDOWN_TIMEOUT,
+    DEFAULT_CODE_CACHE_SIZE,
+    DEFAULT_SHARED_MEMORY_ITEMS,
     DEFAULT_SHUTDOWN_TIMEOUT,
+    DEFAULT_VALIDATION_CACHE_PATH,
+    DEFAULT_VALIDATION_CACHE_SIZE,
+    DEFAULT_WORKER_MAX_MEMORY_GROWTH,
+    DEFAULT_WORKER_MAX_TASKS,
+    DEFAULT_WORKER_POOL_SIZE,
     ENV_BLOCK_RUNNER_ENV_ACCESS,
     ENV_BUILTINS_DENY,
     ENV_EXTERNAL_ALLOW,
     ENV_GRANT_TOKEN,
+    ENV_CONCURRENCY_AUTO,
     ENV_MAX_CONCURRENCY,
+    ENV_MIN_CONCURRENCY,
+    ENV_RESULT_BUFFER_SIZE,
+    ENV_RAW_RESULTS,
+    ENV_JSON_CODEC,
+    ENV_PRELOAD_MODULES,
+    ENV_MAX_QUEUED_BYTES,
+    ENV_MAX_QUEUED_TASKS,
+    ENV_WORKFLOW_MAX_CONCURRENCY,
+    ENV_WORKFLOW_WEIGHTS,
     ENV_MAX_PAYLOAD_SIZE,
     ENV_STDLIB_ALLOW,
     ENV_TASK_BROKER_URI,
     ENV_TASK_TIMEOUT,
+    ENV_TASK_MAX_CPU_TIME,
+    ENV_TASK_MAX_MEMORY,
     ENV_AUTO_SHUTDOWN_TIMEOUT,
+    ENV_CODE_CACHE_SIZE,
     ENV_GRACEFUL_SHUTDOWN_TIMEOUT,
+    ENV_SHARED_MEMORY_ITEMS,
+    ENV_VALIDATION_CACHE_PATH,
+    ENV_VALIDATION_CACHE_SIZE,
+    ENV_WORKER_MAX_MEMORY_GROWTH,
+    ENV_WORKER_MAX_TASKS,
+    ENV_WORKER_POOL_SIZE,
     PIPE_MSG_MAX_SIZE,
     TYPICAL_PAYLOAD_RATIO,
     PARSE_THROUGHPUT_BYTES_PER_SEC,
@@ -47,6 +86,32 @@ def parse_allowlist(allowlist_str: str, list_name: str) -> set[str]:
     return modules
 
 
+def parse_workflow_weights(weights_str: str) -> dict[str, int]:
+    """Parse `workflow_id=weight` pairs, e.g. `abc123=4,def456=2`."""
+
+    weights: dict[str, int] = {}
+
+    for raw_pair in weights_str.split(","):
+        if not (pair := raw_pair.strip()):
+            continue
+
+        workflow_id, sep, raw_weight = pair.partition("=")
+        workflow_id = workflow_id.strip()
+        try:
+            weight = int(raw_weight)
+        except ValueError:
+            weight = 0
+
+        if not sep or not workflow_id or weight <= 0:
+            raise ConfigurationError(
+                f"{ENV_WORKFLOW_WEIGHTS} entries must be 'workflow_id=weight' with a positive integer weight, got '{pair}'"
+            )
+
+        weights[workflow_id] = weight
+
+    return weights
+
+
 @dataclass
 class TaskRunnerConfig:
     grant_token: str
@@ -61,6 +126,45 @@ class TaskRunnerConfig:
     builtins_deny: set[str]
     env_deny: bool
     pipe_reader_timeout: float
+    worker_pool_size: int = DEFAULT_WORKER_POOL_SIZE
+    worker_max_tasks: int = DEFAULT_WORKER_MAX_TASKS
+    worker_max_memory_growth: int = DEFAULT_WORKER_MAX_MEMORY_GROWTH
+    shared_memory_items: bool = DEFAULT_SHARED_MEMORY_ITEMS
+    validation_cache_path: str = DEFAULT_VALIDATION_CACHE_PATH
+    validation_cache_size: int = DEFAULT_VALIDATION_CACHE_SIZE
+    code_cache_size: int = DEFAULT_CODE_CACHE_SIZE
+    task_max_memory: int = DEFAULT_TASK_MAX_MEMORY
+    task_max_cpu_time: int = DEFAULT_TASK_MAX_CPU_TIME
+    workflow_max_concurrency: int = DEFAULT_WORKFLOW_MAX_CONCURRENCY
+    workflow_weights: dict[str, int] = field(default_factory=dict)
+    max_queued_tasks: int = DEFAULT_MAX_QUEUED_TASKS
+    max_queued_bytes: int = DEFAULT_MAX_QUEUED_BYTES
+    concurrency_auto: bool = DEFAULT_CONCURRENCY_AUTO
+    min_concurrency: int = DEFAULT_MIN_CONCURRENCY
+    result_buffer_size: int = DEFAULT_RESULT_BUFFER_SIZE
+    raw_results: bool = DEFAULT_RAW_RESULTS
+    preload_modules: bool = DEFAULT_PRELOAD_MODULES
+    json_codec: str = JSON_CODEC_AUTO
+
+    @property
+    def task_broker_uris(self) -> list[str]:
+        return [
+            uri
+            for raw_uri in self.task_broker_uri.split(BROKER_URI_SEPARATOR)
+            if (uri := raw_uri.strip())
+        ]
+
+    @property
+    def is_worker_pool_enabled(self) -> bool:
+        return self.worker_pool_size > 0
+
+    @property
+    def is_validation_cache_enabled(self) -> bool:
+        return bool(self.validation_cache_path)
+
+    @property
+    def is_code_cache_enabled(self) -> bool:
+        return self.code_cache_size > 0
 
     @property
     def is_auto_shutdown_enabled(self) -> bool:
@@ -102,6 +206,103 @@ class TaskRunnerConfig:
                 f"Max payload size of {max_payload_size} bytes exceeds pipe message limit of {PIPE_MSG_MAX_SIZE} bytes. Reduce {ENV_MAX_PAYLOAD_SIZE}."
             )
 
+        worker_pool_size = read_int_env(ENV_WORKER_POOL_SIZE, DEFAULT_WORKER_POOL_SIZE)
+        if worker_pool_size < 0:
+            raise ConfigurationError(
+                f"Worker pool size must be non-negative, got {worker_pool_size}"
+            )
+
+        worker_max_tasks = read_int_env(ENV_WORKER_MAX_TASKS, DEFAULT_WORKER_MAX_TASKS)
+        if worker_max_tasks <= 0:
+            raise ConfigurationError(
+                f"Worker max tasks must be positive, got {worker_max_tasks}"
+            )
+
+        worker_max_memory_growth = read_int_env(
+            ENV_WORKER_MAX_MEMORY_GROWTH, DEFAULT_WORKER_MAX_MEMORY_GROWTH
+        )
+        if worker_max_memory_growth < 0:
+            raise ConfigurationError(
+                f"Worker max memory growth must be non-negative, got {worker_max_memory_growth}"
+            )
+
+        validation_cache_size = read_int_env(
+            ENV_VALIDATION_CACHE_SIZE, DEFAULT_VALIDATION_CACHE_SIZE
+        )
+        if validation_cache_size <= 0:
+            raise ConfigurationError(
+                f"Validation cache size must be positive, got {validation_cache_size}"
+            )
+
+        code_cache_size = read_int_env(ENV_CODE_CACHE_SIZE, DEFAULT_CODE_CACHE_SIZE)
+        if code_cache_size < 0:
+            raise ConfigurationError(
+                f"Code cache size must be non-negative, got {code_cache_size}"
+            )
+
+        task_max_memory = read_int_env(ENV_TASK_MAX_MEMORY, DEFAULT_TASK_MAX_MEMORY)
+        if task_max_memory < 0:
+            raise ConfigurationError(
+                f"Task max memory must be non-negative, got {task_max_memory}"
+            )
+
+        task_max_cpu_time = read_int_env(
+            ENV_TASK_MAX_CPU_TIME, DEFAULT_TASK_MAX_CPU_TIME
+        )
+        if task_max_cpu_time < 0:
+            raise ConfigurationError(
+                f"Task max CPU time must be non-negative, got {task_max_cpu_time}"
+            )
+
+        workflow_max_concurrency = read_int_env(
+            ENV_WORKFLOW_MAX_CONCURRENCY, DEFAULT_WORKFLOW_MAX_CONCURRENCY
+        )
+        if workflow_max_concurrency < 0:
+            raise ConfigurationError(
+                f"Workflow max concurrency must be non-negative, got {workflow_max_concurrency}"
+            )
+
+        max_queued_tasks = read_int_env(ENV_MAX_QUEUED_TASKS, DEFAULT_MAX_QUEUED_TASKS)
+        if max_queued_tasks < 0:
+            raise ConfigurationError(
+                f"Max queued tasks must be non-negative, got {max_queued_tasks}"
+            )
+
+        max_queued_bytes = read_int_env(ENV_MAX_QUEUED_BYTES, DEFAULT_MAX_QUEUED_BYTES)
+        if max_queued_bytes < 0:
+            raise ConfigurationError(
+                f"Max queued bytes must be non-negative, got {max_queued_bytes}"
+            )
+
+        task_broker_uri = read_str_env(ENV_TASK_BROKER_URI, DEFAULT_TASK_BROKER_URI)
+        if not task_broker_uri.replace(BROKER_URI_SEPARATOR, "").strip():
+            raise ConfigurationError(
+                f"{ENV_TASK_BROKER_URI} must contain at least one broker URI"
+            )
+
+        max_concurrency = read_int_env(ENV_MAX_CONCURRENCY, DEFAULT_MAX_CONCURRENCY)
+        concurrency_auto = read_bool_env(ENV_CONCURRENCY_AUTO, DEFAULT_CONCURRENCY_AUTO)
+        min_concurrency = read_int_env(ENV_MIN_CONCURRENCY, DEFAULT_MIN_CONCURRENCY)
+        if concurrency_auto and not 0 < min_concurrency <= max_concurrency:
+            raise ConfigurationError(
+                f"Min concurrency must be positive and at most max concurrency ({max_concurrency}), got {min_concurrency}"
+            )
+
+        result_buffer_size = read_int_env(
+            ENV_RESULT_BUFFER_SIZE, DEFAULT_RESULT_BUFFER_SIZE
+        )
+        if result_buffer_size < 0:
+            raise ConfigurationError(
+                f"Result buffer size must be non-negative, got {result_buffer_size}"
+            )
+
+        # selected by `json_codec` on import, only checked here
+        json_codec = read_str_env(ENV_JSON_CODEC, JSON_CODEC_AUTO)
+        if json_codec != JSON_CODEC_AUTO and json_codec not in AVAILABLE_CODECS:
+            raise ConfigurationError(
+                f"JSON codec '{json_codec}' is not installed, expected one of: {', '.join([JSON_CODEC_AUTO, *AVAILABLE_CODECS])}"
+            )
+
         # Calculate pipe reader timeout based on configured max payload size (3s for default 1 GiB)
         typical_payload = max_payload_size * TYPICAL_PAYLOAD_RATIO
         pipe_reader_timeout = (
@@ -110,8 +311,8 @@ class TaskRunnerConfig:
 
         return cls(
             grant_token=grant_token,
-            task_broker_uri=read_str_env(ENV_TASK_BROKER_URI, DEFAULT_TASK_BROKER_URI),
-            max_concurrency=read_int_env(ENV_MAX_CONCURRENCY, DEFAULT_MAX_CONCURRENCY),
+            task_broker_uri=task_broker_uri,
+            max_concurrency=max_concurrency,
             max_payload_size=max_payload_size,
             task_timeout=task_timeout,
             auto_shutdown_timeout=auto_shutdown_timeout,
@@ -130,4 +331,29 @@ class TaskRunnerConfig:
             ),
             env_deny=read_bool_env(ENV_BLOCK_RUNNER_ENV_ACCESS, True),
             pipe_reader_timeout=pipe_reader_timeout,
+            worker_pool_size=worker_pool_size,
+            worker_max_tasks=worker_max_tasks,
+            worker_max_memory_growth=worker_max_memory_growth,
+            shared_memory_items=read_bool_env(
+                ENV_SHARED_MEMORY_ITEMS, DEFAULT_SHARED_MEMORY_ITEMS
+            ),
+            validation_cache_path=read_str_env(
+                ENV_VALIDATION_CACHE_PATH, DEFAULT_VALIDATION_CACHE_PATH
+            ),
+            validation_cache_size=validation_cache_size,
+            code_cache_size=code_cache_size,
+            task_max_memory=task_max_memory,
+            task_max_cpu_time=task_max_cpu_time,
+            workflow_max_concurrency=workflow_max_concurrency,
+            workflow_weights=parse_workflow_weights(
+                read_str_env(ENV_WORKFLOW_WEIGHTS, "")
+            ),
+            max_queued_tasks=max_queued_tasks,
+            max_queued_bytes=max_queued_bytes,
+            concurrency_auto=concurrency_auto,
+            min_concurrency=min_concurrency,
+            result_buffer_size=result_buffer_size,
+            raw_results=read_bool_env(ENV_RAW_RESULTS, DEFAULT_RAW_RESULTS),
+            preload_modules=read_bool_env(ENV_PRELOAD_MODULES, DEFAULT_PRELOAD_MODULES),
+            json_codec=json_codec,
         )
@@ -26,29 +26,87 @@ RUNNER_RPC_CALL = "runner:rpc"
 TASK_TYPE_PYTHON = "python"
 RUNNER_NAME = "Python Task Runner"
 DEFAULT_MAX_CONCURRENCY = 5  # tasks
+DEFAULT_MIN_CONCURRENCY = 1  # tasks, lower bound when tuning concurrency to host load
+DEFAULT_CONCURRENCY_AUTO = False  # tune concurrency to host load, up to max concurrency
+CONCURRENCY_TUNE_INTERVAL = 5.0  # seconds between host load measurements
+CONCURRENCY_TASK_SMOOTHING = 0.2  # weight of latest task in resource moving averages
+CONCURRENCY_MIN_CPU_SHARE = 0.1  # floor on CPU share per task, bounds I/O-bound tasks
+CONCURRENCY_MEMORY_HEADROOM = 0.8  # share of available memory that new tasks may use
+MEMINFO_PATH = "/proc/meminfo"
+DEFAULT_WORKFLOW_MAX_CONCURRENCY = 0  # running tasks per workflow, 0 for no cap
+DEFAULT_MAX_QUEUED_TASKS = (
+    100  # tasks waiting for their workflow's cap, across all workflows
+)
+DEFAULT_MAX_QUEUED_BYTES = (
+    256 * 1024 * 1024
+)  # 256 MiB of queued task settings, across all workflows
 DEFAULT_MAX_PAYLOAD_SIZE = 1024 * 1024 * 1024  # 1 GiB
 DEFAULT_TASK_TIMEOUT = 60  # seconds
+DEFAULT_TASK_MAX_MEMORY = 0  # bytes of address space per task subprocess, 0 to disable
+DEFAULT_TASK_MAX_CPU_TIME = 0  # seconds of CPU time per task, 0 to disable
 DEFAULT_AUTO_SHUTDOWN_TIMEOUT = 0  # seconds
 DEFAULT_SHUTDOWN_TIMEOUT = 10  # seconds
-OFFER_INTERVAL = 0.25  # 250ms
+OFFER_INTERVAL = 0.25  # 250ms, longest delay between offer rounds after a slot frees up
+OFFER_MIN_INTERVAL = 0.01  # 10ms, shortest delay between offer rounds
+OFFER_ACCEPT_LATENCY_SMOOTHING = 0.2  # weight of latest latency in moving average
 OFFER_VALIDITY = 5000  # ms
 OFFER_VALIDITY_MAX_JITTER = 500  # ms
 OFFER_VALIDITY_LATENCY_BUFFER = 0.1  # 100ms
 MAX_VALIDATION_CACHE_SIZE = 500  # cached validation results
+DEFAULT_VALIDATION_CACHE_PATH = ""  # SQLite file shared by runners, empty to disable
+DEFAULT_VALIDATION_CACHE_SIZE = 10_000  # cached validation results
+DEFAULT_CODE_CACHE_SIZE = 500  # compiled user code objects, 0 to disable
+VALIDATION_CACHE_BUSY_TIMEOUT = 1.0  # seconds to wait for another runner's write
+VALIDATION_CACHE_TOUCH_INTERVAL = 60.0  # seconds before a hit records its use again
+VALIDATION_CACHE_TRIM_FRACTION = 0.1  # of max size, inserts between evictions
+ANALYZER_MAX_WORKERS = 2  # threads parsing and validating task code off the event loop
+DEFAULT_WORKER_POOL_SIZE = 0  # pre-warmed workers, 0 to spawn a process per task
+DEFAULT_WORKER_MAX_TASKS = (
+    1  # tasks per worker before it is recycled, of one workflow if above 1
+)
+DEFAULT_WORKER_MAX_MEMORY_GROWTH = 0  # bytes, 0 to disable
+DEFAULT_SHARED_MEMORY_ITEMS = False  # pass input items via shared memory
+DEFAULT_RAW_RESULTS = False  # forward result items to the broker without decoding them
+DEFAULT_PRELOAD_MODULES = False  # import allowlisted modules once in the forkserver
+SHARED_MEMORY_DIR = "/dev/shm"
 
 # Executor
 EXECUTOR_USER_OUTPUT_KEY = "__n8n_internal_user_output__"
-EXECUTOR_CIRCULAR_REFERENCE_KEY = "__n8n_internal_circular_ref__"
+EXECUTOR_USER_FUNCTION_NAME = "_user_function"
 EXECUTOR_ALL_ITEMS_FILENAME = "<all_items_task_execution>"
 EXECUTOR_PER_ITEM_FILENAME = "<per_item_task_execution>"
 EXECUTOR_FILENAMES = {EXECUTOR_ALL_ITEMS_FILENAME, EXECUTOR_PER_ITEM_FILENAME}
+EXECUTOR_COLUMNS_NAME = "_columns"  # all-items code using it gets items as columns
+COLUMNAR_ARRAY_MODULES = ("numpy", "pyarrow")  # in order of preference, if allowlisted
 SIGTERM_EXIT_CODE = -15
 SIGKILL_EXIT_CODE = -9
+SIGXCPU_EXIT_CODE = -24  # CPU time limit exceeded
+MEMORY_LIMIT_EXIT_CODE = 80  # task subprocess ran out of memory
 PIPE_MSG_PREFIX_LENGTH = 4  # bytes
+PIPE_FRAME_TYPE_LENGTH = 1  # bytes
+PIPE_FRAME_ITEMS = 1  # JSON array holding a chunk of result items
+PIPE_FRAME_RESULT_END = 2  # JSON object with print args, closes a result
+PIPE_FRAME_ERROR = 3  # JSON object with error info and print args
+PIPE_FRAME_PRINT = 4  # JSON array with the formatted args of one print() call
+PIPE_FRAME_PART = (
+    5  # part of a payload too large for one frame, ended by the next frame
+)
+PIPE_CHUNK_SIZE = 1024 * 1024  # bytes of encoded items per frame
+PIPE_MAX_FRAME_SIZE = 4 * PIPE_CHUNK_SIZE  # bytes, larger payloads are sent in parts
+PIPE_READ_BUDGET = 4 * 1024 * 1024  # bytes read per event loop wakeup
 PIPE_MSG_MAX_SIZE = (
     2 ** (PIPE_MSG_PREFIX_LENGTH * 8) - 1
 )  # bytes (~4 GiB with 4-byte prefix)
 
+# print() in user code, streamed to the runner as called
+PRINT_STREAM_BURST = 100  # print() calls sent before the rate limit applies
+PRINT_STREAM_RATE = 50  # print() calls sent per second after the burst
+PRINT_STREAM_MAX_BYTES = 1024 * 1024  # bytes of print() output sent per task
+
+# JSON
+JSON_CODEC_AUTO = "auto"
+JSON_CODECS = ("orjson", "msgspec", "stdlib")  # in order of preference
+
 # Pipe reader join timeout
 TYPICAL_PAYLOAD_RATIO = 0.1  # assume typical size is 10% of max payload
 PARSE_THROUGHPUT_BYTES_PER_SEC = 100_000_000  # 100 MB/s
@@ -57,26 +115,97 @@ PIPE_READER_JOIN_TIMEOUT_SAFETY_BUFFER = 2.0  # seconds
 # Broker
 DEFAULT_TASK_BROKER_URI = "http://127.0.0.1:5679"
 TASK_BROKER_WS_PATH = "/runners/_ws"
+BROKER_URI_SEPARATOR = ","  # to connect to several brokers, sharing task slots
+BROKER_RECONNECT_BASE_DELAY = 0.5  # seconds, doubled on each failed attempt
+BROKER_RECONNECT_MAX_DELAY = 30.0  # seconds
+SEND_QUEUE_FLUSH_TIMEOUT = 2.0  # seconds to send queued task output on shutdown
+DEFAULT_RESULT_BUFFER_SIZE = (
+    64 * 1024 * 1024
+)  # bytes of task results held per broker while disconnected
 
 # Health check
 DEFAULT_HEALTH_CHECK_SERVER_HOST = "127.0.0.1"
 DEFAULT_HEALTH_CHECK_SERVER_PORT = 5681
+HEALTH_CHECK_REQUEST_TIMEOUT = 1.0  # seconds
+METRICS_PATH = "/metrics"
+METRICS_CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+TASKS_PATH = "/tasks"
+TASKS_CONTENT_TYPE = "application/json"
+RECENT_TASKS_SIZE = 100  # finished tasks kept for profiling
+
+# Metrics
+METRICS_PREFIX = "n8n_runner_"
+METRICS_DURATION_BUCKETS = (
+    0.005,
+    0.01,
+    0.025,
+    0.05,
+    0.1,
+    0.25,
+    0.5,
+    1.0,
+    2.5,
+    5.0,
+    10.0,
+    30.0,
+    60.0,
+)  # seconds
+METRICS_SIZE_BUCKETS = (
+    1024,
+    10 * 1024,
+    100 * 1024,
+    1024**2,
+    10 * 1024**2,
+    100 * 1024**2,
+    1024**3,
+)  # bytes
+TASK_OUTCOME_SUCCESS = "success"
+TASK_OUTCOME_ERROR = "error"
+TASK_OUTCOME_CANCELLED = "cancelled"
+TASK_OUTCOME_TIMEOUT = "timeout"
+REJECTION_LABEL_OFFER_EXPIRED = "offer_expired"
+REJECTION_LABEL_AT_CAPACITY = "at_capacity"
+REJECTION_LABEL_SATURATED = "saturated"
+STOP_LABEL_CANCEL = "cancel"
+CACHE_LABEL_HIT = "hit"
+CACHE_LABEL_MISS = "miss"
+STOP_LABEL_SHUTDOWN = "shutdown"
 
 # Env vars
 ENV_TASK_BROKER_URI = "N8N_RUNNERS_TASK_BROKER_URI"
 ENV_GRANT_TOKEN = "N8N_RUNNERS_GRANT_TOKEN"
 ENV_MAX_CONCURRENCY = "N8N_RUNNERS_MAX_CONCURRENCY"
+ENV_MIN_CONCURRENCY = "N8N_RUNNERS_MIN_CONCURRENCY"
+ENV_CONCURRENCY_AUTO = "N8N_RUNNERS_CONCURRENCY_AUTO"
+ENV_WORKFLOW_MAX_CONCURRENCY = "N8N_RUNNERS_WORKFLOW_MAX_CONCURRENCY"
+ENV_WORKFLOW_WEIGHTS = "N8N_RUNNERS_WORKFLOW_WEIGHTS"
+ENV_MAX_QUEUED_TASKS = "N8N_RUNNERS_MAX_QUEUED_TASKS"
+ENV_MAX_QUEUED_BYTES = "N8N_RUNNERS_MAX_QUEUED_BYTES"
+ENV_RESULT_BUFFER_SIZE = "N8N_RUNNERS_RESULT_BUFFER_SIZE"
+ENV_RAW_RESULTS = "N8N_RUNNERS_RAW_RESULTS"
+ENV_JSON_CODEC = "N8N_RUNNERS_JSON_CODEC"
+ENV_PRELOAD_MODULES = "N8N_RUNNERS_PRELOAD_MODULES"
 ENV_MAX_PAYLOAD_SIZE = "N8N_RUNNERS_MAX_PAYLOAD"
 ENV_TASK_TIMEOUT = "N8N_RUNNERS_TASK_TIMEOUT"
+ENV_TASK_MAX_MEMORY = "N8N_RUNNERS_TASK_MAX_MEMORY"
+ENV_TASK_MAX_CPU_TIME = "N8N_RUNNERS_TASK_MAX_CPU_TIME"
 ENV_AUTO_SHUTDOWN_TIMEOUT = "N8N_RUNNERS_AUTO_SHUTDOWN_TIMEOUT"
 ENV_GRACEFUL_SHUTDOWN_TIMEOUT = "N8N_RUNNERS_GRACEFUL_SHUTDOWN_TIMEOUT"
 ENV_STDLIB_ALLOW = "N8N_RUNNERS_STDLIB_ALLOW"
 ENV_EXTERNAL_ALLOW = "N8N_RUNNERS_EXTERNAL_ALLOW"
 ENV_BUILTINS_DENY = "N8N_RUNNERS_BUILTINS_DENY"
+ENV_WORKER_POOL_SIZE = "N8N_RUNNERS_WORKER_POOL_SIZE"
+ENV_WORKER_MAX_TASKS = "N8N_RUNNERS_WORKER_MAX_TASKS"
+ENV_WORKER_MAX_MEMORY_GROWTH = "N8N_RUNNERS_WORKER_MAX_MEMORY_GROWTH"
+ENV_SHARED_MEMORY_ITEMS = "N8N_RUNNERS_SHARED_MEMORY_ITEMS"
+ENV_CODE_CACHE_SIZE = "N8N_RUNNERS_CODE_CACHE_SIZE"
+ENV_VALIDATION_CACHE_PATH = "N8N_RUNNERS_VALIDATION_CACHE_PATH"
+ENV_VALIDATION_CACHE_SIZE = "N8N_RUNNERS_VALIDATION_CACHE_SIZE"
 ENV_HEALTH_CHECK_SERVER_ENABLED = "N8N_RUNNERS_HEALTH_CHECK_SERVER_ENABLED"
 ENV_HEALTH_CHECK_SERVER_HOST = "N8N_RUNNERS_HEALTH_CHECK_SERVER_HOST"
 ENV_HEALTH_CHECK_SERVER_PORT = "N8N_RUNNERS_HEALTH_CHECK_SERVER_PORT"
 ENV_LAUNCHER_LOG_LEVEL = "N8N_RUNNERS_LAUNCHER_LOG_LEVEL"
+ENV_LOG_FORMAT = "N8N_RUNNERS_LOG_FORMAT"
 ENV_BLOCK_RUNNER_ENV_ACCESS = "N8N_BLOCK_RUNNER_ENV_ACCESS"
 ENV_SENTRY_DSN = "N8N_SENTRY_DSN"
 ENV_N8N_VERSION = "N8N_VERSION"
@@ -99,12 +228,23 @@ IGNORED_ERROR_TYPES = (
 # Logging
 LOG_FORMAT = "%(asctime)s.%(msecs)03d\t%(levelname)s\t%(message)s"
 LOG_TIMESTAMP_FORMAT = "%Y-%m-%d %H:%M:%S"
-LOG_TASK_COMPLETE = 'Completed task {task_id} in {duration} ({result_size}) for node "{node_name}" ({node_id}) in workflow "{workflow_name}" ({workflow_id})'
+LOG_FORMAT_TEXT = "text"
+LOG_FORMAT_JSON = "json"  # one JSON object per line, with extra fields as keys
+DEFAULT_LOG_FORMAT = LOG_FORMAT_TEXT
+LOG_TASK_COMPLETE = 'Completed task {task_id} in {duration} ({result_size}, peak RSS {peak_rss}) for node "{node_name}" ({node_id}) in workflow "{workflow_name}" ({workflow_id})'
 LOG_TASK_CANCEL = 'Cancelled task {task_id} for node "{node_name}" ({node_id}) in workflow "{workflow_name}" ({workflow_id})'
 LOG_TASK_CANCEL_UNKNOWN = (
     "Received cancel for unknown task: {task_id}. Discarding message."
 )
 LOG_TASK_CANCEL_WAITING = "Cancelled task {task_id} (waiting for settings)"
+LOG_CONCURRENCY_TUNED = "Concurrency limit changed from {previous} to {target} tasks"
+LOG_RESULTS_REPLAYED = (
+    "Sending {count} task results held while disconnected from broker at {uri}"
+)
+LOG_RESULTS_DROPPED = "Dropped {count} task results held for broker at {uri}, buffer of {size} bytes is full"
+LOG_TASK_CANCEL_QUEUED = "Cancelled task {task_id} (queued)"
+LOG_TASK_QUEUE_TIMEOUT = "Task {task_id} timed out while queued"
+LOG_TASK_QUEUED = 'Queued task {task_id} behind {running} running tasks of workflow "{workflow_name}" ({workflow_id})'
 LOG_SENTRY_MISSING = "Sentry is enabled but sentry-sdk is not installed. Install with: uv sync --all-extras"
 LOG_PIPE_READER_TIMEOUT_TRIGGERED = (
     "Pipe reader thread did not finish reading within {timeout}s. "
@@ -112,6 +252,14 @@ LOG_PIPE_READER_TIMEOUT_TRIGGERED = (
     "For large payloads, increase N8N_RUNNERS_MAX_PAYLOAD to scale timeout."
 )
 
+LOG_MODULES_PRELOADED = "Preloading modules for task subprocesses: {modules}"
+LOG_WORKER_SPAWN_FAILED = "Failed to spawn pre-warmed worker: {error}"
+LOG_WORKER_RECYCLED = "Recycling worker {pid} after {tasks_run} tasks"
+LOG_VALIDATION_CACHE_ERROR = (
+    "Validation cache at {path} failed, validating without it: {error}"
+)
+LOG_SHARED_MEMORY_UNAVAILABLE = "Shared memory unavailable for input items, passing them to the subprocess directly: {error}"
+
 # RPC
 RPC_BROWSER_CONSOLE_LOG_METHOD = "logNodeOutput"
 
@@ -120,6 +268,10 @@ TASK_REJECTED_REASON_OFFER_EXPIRED = (
     "Offer expired - not accepted within validity window"
 )
 TASK_REJECTED_REASON_AT_CAPACITY = "No open task slots - runner already at capacity"
+TASK_REJECTED_REASON_SATURATED = (
+    "Runner saturated - workflow at its concurrency limit and task queue full"
+)
+TASK_REJECTED_REASON_SHUTTING_DOWN = "Runner shutting down - queued task not started"
 
 # Security
 BUILTINS_DENY_DEFAULT = "eval,exec,compile,open,input,breakpoint,getattr,object,type,vars,setattr,delattr,hasattr,dir,memoryview,__build_class__,globals,locals,license,help,credits,copyright"
@@ -6,6 +6,7 @@ from .security_violation_error import SecurityViolationError
 from .task_cancelled_error import TaskCancelledError
 from .task_killed_error import TaskKilledError
 from .task_missing_error import TaskMissingError
+from .task_resource_limit_error import TaskResourceLimitError
 from .task_result_missing_error import TaskResultMissingError
 from .task_result_read_error import TaskResultReadError
 from .task_subprocess_failed_error import TaskSubprocessFailedError
@@ -23,6 +24,7 @@ __all__ = [
     "TaskKilledError",
     "TaskMissingError",
     "TaskSubprocessFailedError",
+    "TaskResourceLimitError",
     "TaskResultMissingError",
     "TaskResultReadError",
     "TaskRuntimeError",
@@ -0,0 +1,14 @@
+class TaskResourceLimitError(Exception):
+    """Raised when a task subprocess is stopped for running out of memory or CPU time.
+
+    Limits are set per task with N8N_RUNNERS_TASK_MAX_MEMORY and
+    N8N_RUNNERS_TASK_MAX_CPU_TIME.
+    """
+
+    def __init__(self, resource: str):
+        super().__init__(
+            "Task ran out of memory"
+            if resource == "memory"
+            else "Task exceeded its CPU time limit"
+        )
+        self.resource = resource
@@ -3,6 +3,14 @@ import errno
 import logging
 
 from src.config.health_check_config import HealthCheckConfig
+from src.constants import (
+    HEALTH_CHECK_REQUEST_TIMEOUT,
+    METRICS_CONTENT_TYPE,
+    METRICS_PATH,
+    TASKS_CONTENT_TYPE,
+    TASKS_PATH,
+)
+from src.metrics import Metrics
 
 HEALTH_CHECK_RESPONSE = (
     b"HTTP/1.1 200 OK\r\nContent-Type: text/plain\r\nContent-Length: 2\r\n\r\nOK"
@@ -10,8 +18,9 @@ HEALTH_CHECK_RESPONSE = (
 
 
 class HealthCheckServer:
-    def __init__(self):
+    def __init__(self, metrics: Metrics | None = None):
         self.server: asyncio.Server | None = None
+        self.metrics = metrics
         self.logger = logging.getLogger(__name__)
 
     async def start(self, config: HealthCheckConfig) -> None:
@@ -38,13 +47,53 @@ class HealthCheckServer:
             self.logger.info("Health check server stopped")
 
     async def _handle_request(
-        self, _reader: asyncio.StreamReader, writer: asyncio.StreamWriter
+        self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter
     ) -> None:
         try:
-            writer.write(HEALTH_CHECK_RESPONSE)
+            path = await self._read_path(reader)
+
+            if path == METRICS_PATH and self.metrics is not None:
+                writer.write(
+                    self._response(
+                        self.metrics.render().encode("utf-8"), METRICS_CONTENT_TYPE
+                    )
+                )
+            elif path == TASKS_PATH and self.metrics is not None:
+                writer.write(
+                    self._response(
+                        self.metrics.recent_tasks.render(), TASKS_CONTENT_TYPE
+                    )
+                )
+            else:
+                writer.write(HEALTH_CHECK_RESPONSE)
+
             await writer.drain()
         except Exception:
             pass
         finally:
             writer.close()
             await writer.wait_closed()
+
+    async def _read_path(self, reader: asyncio.StreamReader) -> str | None:
+        """Path of the request line, e.g. `GET /metrics HTTP/1.1`, if any arrives in time."""
+
+        try:
+            request_line = await asyncio.wait_for(
+                reader.readline(), timeout=HEALTH_CHECK_REQUEST_TIMEOUT
+            )
+        except (TimeoutError, ValueError):
+            return None
+
+        parts = request_line.split()
+        if len(parts) < 2:
+            return None
+
+        return parts[1].decode("latin-1").split("?", 1)[0]
+
+    @staticmethod
+    def _response(body: bytes, content_type: str) -> bytes:
+        headers = (
+            f"HTTP/1.1 200 OK\r\nContent-Type: {content_type}\r\n"
+            f"Content-Length: {len(body)}\r\n\r\n"
+        )
+        return headers.encode("latin-1") + body
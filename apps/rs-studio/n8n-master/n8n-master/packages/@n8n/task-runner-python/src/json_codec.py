@@ -0,0 +1,155 @@
+import json
+import math
+from enum import Enum
+from typing import TYPE_CHECKING, Any
+
+# codecs for optional packages are only used, and only type checked, when installed
+if TYPE_CHECKING:
+    import msgspec
+    import orjson
+else:
+    try:
+        import orjson
+    except ImportError:
+        orjson = None
+
+    try:
+        import msgspec
+    except ImportError:
+        msgspec = None
+
+from src.constants import ENV_JSON_CODEC, JSON_CODEC_AUTO, JSON_CODECS
+from src.env import read_str_env
+
+type JsonInput = bytes | bytearray | memoryview | str
+
+
+class JsonCodec:
+    """Stdlib JSON codec, keeping non-ASCII characters as is.
+
+    All codecs encode alike, as orjson does: NaN and infinity as `null`, enums
+    by value, and other values JSON has no type for with `str()`.
+    """
+
+    name = "stdlib"
+
+    def dumps(self, value: Any) -> bytes:
+        try:
+            encoded = json.dumps(
+                value, default=_default, ensure_ascii=False, allow_nan=False
+            )
+        except ValueError as e:
+            if not str(e).startswith("Out of range float values"):
+                raise
+            encoded = json.dumps(
+                _with_finite_floats(value), default=_default, ensure_ascii=False
+            )
+
+        return encoded.encode("utf-8")
+
+    def loads(self, data: JsonInput) -> Any:
+        if isinstance(data, memoryview):
+            data = str(data, "utf-8")
+        return json.loads(data)
+
+
+class OrjsonCodec(JsonCodec):
+    """Encodes and decodes with orjson, falling back to stdlib for values orjson rejects,
+    e.g. integers over 64 bits or `NaN` literals."""
+
+    name = "orjson"
+
+    # datetimes and dataclasses are handed to `default`, as stdlib would stringify them
+    OPTIONS = (
+        (
+            orjson.OPT_NON_STR_KEYS
+            | orjson.OPT_PASSTHROUGH_DATETIME
+            | orjson.OPT_PASSTHROUGH_DATACLASS
+        )
+        if orjson is not None
+        else 0
+    )
+
+    def dumps(self, value: Any) -> bytes:
+        try:
+            return orjson.dumps(value, default=_default, option=self.OPTIONS)
+        except TypeError:
+            return super().dumps(value)
+
+    def loads(self, data: JsonInput) -> Any:
+        try:
+            return orjson.loads(data)
+        except orjson.JSONDecodeError:
+            return super().loads(data)
+
+
+class MsgspecCodec(JsonCodec):
+    """Decodes with msgspec. Encodes with stdlib, as msgspec formats datetimes and
+    other types natively instead of calling `str()` on them."""
+
+    name = "msgspec"
+
+    def loads(self, data: JsonInput) -> Any:
+        try:
+            return msgspec.json.decode(data)
+        except msgspec.DecodeError:
+            return super().loads(data)
+
+
+AVAILABLE_CODECS: dict[str, JsonCodec] = {"stdlib": JsonCodec()}
+
+if msgspec is not None:
+    AVAILABLE_CODECS["msgspec"] = MsgspecCodec()
+
+if orjson is not None:
+    AVAILABLE_CODECS["orjson"] = OrjsonCodec()
+
+
+def get_codec(name: str = JSON_CODEC_AUTO) -> JsonCodec:
+    """Get a codec by name, or the fastest one installed for `auto`."""
+
+    if name == JSON_CODEC_AUTO:
+        return next(
+            AVAILABLE_CODECS[codec_name]
+            for codec_name in JSON_CODECS
+            if codec_name in AVAILABLE_CODECS
+        )
+
+    if name not in AVAILABLE_CODECS:
+        raise ValueError(f"JSON codec '{name}' is not installed")
+
+    return AVAILABLE_CODECS[name]
+
+
+def _default(value: Any) -> Any:
+    return value.value if isinstance(value, Enum) else str(value)
+
+
+def _with_finite_floats(value: Any) -> Any:
+    """Copy of `value` with NaN and infinity replaced by None, for stdlib to encode."""
+
+    if isinstance(value, float):
+        return value if math.isfinite(value) else None
+    if isinstance(value, dict):
+        return {key: _with_finite_floats(item) for key, item in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [_with_finite_floats(item) for item in value]
+    return value
+
+
+def _codec_from_env() -> JsonCodec:
+    """The codec set by `N8N_RUNNERS_JSON_CODEC`, read on import so that subprocesses,
+    started with the runner's environment, use the same one. An unknown or missing
+    codec is reported by the runner's config, so `auto` is used in its place."""
+
+    try:
+        name = read_str_env(ENV_JSON_CODEC, JSON_CODEC_AUTO)
+    except ValueError:
+        name = JSON_CODEC_AUTO
+
+    return AVAILABLE_CODECS.get(name) or get_codec()
+
+
+codec = _codec_from_env()
+dumps = codec.dumps
+loads = codec.loads
@@ -1,7 +1,22 @@
+import atexit
+import copy
+import queue
 import sys
 import logging
 import os
-from src.constants import LOG_FORMAT, LOG_TIMESTAMP_FORMAT, ENV_LAUNCHER_LOG_LEVEL
+from datetime import UTC, datetime
+from logging.handlers import QueueHandler, QueueListener
+
+from src import json_codec
+from src.constants import (
+    DEFAULT_LOG_FORMAT,
+    ENV_LAUNCHER_LOG_LEVEL,
+    ENV_LOG_FORMAT,
+    LOG_FORMAT,
+    LOG_FORMAT_JSON,
+    LOG_FORMAT_TEXT,
+    LOG_TIMESTAMP_FORMAT,
+)
 
 COLORS = {
     "DEBUG": "\033[34m",  # blue
@@ -13,6 +28,9 @@ COLORS = {
 
 RESET = "\033[0m"
 
+# attributes of every log record, so anything else was passed as `extra`
+LOG_RECORD_ATTRIBUTES = set(vars(logging.makeLogRecord({}))) | {"message", "asctime"}
+
 
 class ColorFormatter(logging.Formatter):
     def __init__(self, *args, **kwargs):
@@ -49,6 +67,50 @@ class ColorFormatter(logging.Formatter):
         return formatted
 
 
+class JsonFormatter(logging.Formatter):
+    """Formats a record as one line of JSON, with fields passed as `extra` as top-level keys."""
+
+    def format(self, record):
+        entry = {
+            "timestamp": datetime.fromtimestamp(record.created, UTC).isoformat(
+                timespec="milliseconds"
+            ),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+        }
+
+        for key, value in vars(record).items():
+            if key not in LOG_RECORD_ATTRIBUTES:
+                entry[key] = value
+
+        if record.exc_info and not record.exc_text:
+            record.exc_text = self.formatException(record.exc_info)
+        if record.exc_text:
+            entry["exception"] = record.exc_text
+
+        return json_codec.dumps(entry).decode("utf-8")
+
+
+class LogQueueHandler(QueueHandler):
+    """Hands records to a listener thread, which formats and writes them off the event loop."""
+
+    def prepare(self, record):
+        # resolved here, as args and tracebacks may not outlive the call
+        record = copy.copy(record)
+        record.message = record.getMessage()
+        record.msg = record.message
+        record.args = None
+
+        if record.exc_info:
+            record.exc_text = record.exc_text or logging.Formatter().formatException(
+                record.exc_info
+            )
+            record.exc_info = None
+
+        return record
+
+
 def setup_logging():
     logger = logging.getLogger()
 
@@ -56,9 +118,25 @@ def setup_logging():
     log_level = getattr(logging, log_level_str, logging.INFO)
     logger.setLevel(log_level)
 
+    log_format = os.getenv(ENV_LOG_FORMAT, DEFAULT_LOG_FORMAT).lower()
+
     stream_handler = logging.StreamHandler(sys.stdout)
-    stream_handler.setFormatter(ColorFormatter(LOG_FORMAT, LOG_TIMESTAMP_FORMAT))
-    logger.addHandler(stream_handler)
+    if log_format == LOG_FORMAT_JSON:
+        stream_handler.setFormatter(JsonFormatter())
+    else:
+        stream_handler.setFormatter(ColorFormatter(LOG_FORMAT, LOG_TIMESTAMP_FORMAT))
+
+    log_queue: queue.SimpleQueue[logging.LogRecord] = queue.SimpleQueue()
+    listener = QueueListener(log_queue, stream_handler)
+    listener.start()
+    atexit.register(listener.stop)  # writes out queued records on exit
+
+    logger.addHandler(LogQueueHandler(log_queue))
+
+    if log_format not in (LOG_FORMAT_TEXT, LOG_FORMAT_JSON):
+        logger.warning(
+            f"Unknown log format '{log_format}' in {ENV_LOG_FORMAT}, using '{LOG_FORMAT_TEXT}'"
+        )
 
     # Hardcoded to INFO as websocket logs are too verbose
     logging.getLogger("websockets.client").setLevel(logging.INFO)
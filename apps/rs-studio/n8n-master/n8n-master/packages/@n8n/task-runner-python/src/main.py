@@ -9,6 +9,7 @@ from src.config.sentry_config import SentryConfig
 from src.config.task_runner_config import TaskRunnerConfig
 from src.errors import ConfigurationError
 from src.logs import setup_logging
+from src.metrics import Metrics
 from src.task_runner import TaskRunner
 from src.shutdown import Shutdown
 
@@ -31,11 +32,13 @@ async def main():
         logger.error(f"Invalid health check configuration: {e}")
         sys.exit(1)
 
+    metrics = Metrics()
+
     health_check_server: "HealthCheckServer | None" = None
     if health_check_config.enabled:
         from src.health_check_server import HealthCheckServer
 
-        health_check_server = HealthCheckServer()
+        health_check_server = HealthCheckServer(metrics)
         try:
             await health_check_server.start(health_check_config)
         except OSError as e:
@@ -48,7 +51,7 @@ async def main():
         logger.error(str(e))
         sys.exit(1)
 
-    task_runner = TaskRunner(task_runner_config)
+    task_runner = TaskRunner(task_runner_config, metrics)
     logger.info("Starting runner...")
 
     shutdown = Shutdown(task_runner, health_check_server, sentry)
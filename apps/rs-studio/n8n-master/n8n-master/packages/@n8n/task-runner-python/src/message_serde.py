@@ -1,7 +1,16 @@
-import json
 from dataclasses import asdict
-from typing import cast
+from typing import TYPE_CHECKING, cast
 
+# only used, and only type checked, when installed
+if TYPE_CHECKING:
+    import msgspec
+else:
+    try:
+        import msgspec
+    except ImportError:
+        msgspec = None
+
+from src import json_codec
 from src.message_types.broker import NodeMode, TaskSettings
 from src.constants import (
     BROKER_INFO_REQUEST,
@@ -20,7 +29,9 @@ from src.message_types import (
     BrokerTaskSettings,
     BrokerTaskCancel,
     BrokerRpcResponse,
+    RunnerTaskDone,
 )
+from src.raw_items import RawItems
 
 
 NODE_MODE_MAP = {
@@ -68,6 +79,68 @@ def _parse_task_settings(d: dict) -> BrokerTaskSettings:
     )
 
 
+if msgspec is not None:
+
+    class _LazySettings(msgspec.Struct, rename="camel"):
+        code: str
+        node_mode: str
+        items: msgspec.Raw
+        continue_on_fail: bool = False
+        workflow_name: str = "Unknown"
+        workflow_id: str = "Unknown"
+        node_name: str = "Unknown"
+        node_id: str = "Unknown"
+
+    class _LazyMessage(msgspec.Struct, rename="camel"):
+        type: str
+        task_id: str | None = None
+        settings: _LazySettings | None = None
+
+    _lazy_decoder = msgspec.json.Decoder(_LazyMessage)
+
+
+def _parse_task_settings_lazily(data: str | bytes) -> BrokerTaskSettings | None:
+    """Parse task settings without decoding their input items, which are kept as raw JSON.
+
+    Returns None for other messages, or task settings this cannot parse, e.g.
+    with a field of an unexpected type, to be parsed in full instead.
+    """
+
+    if msgspec is None:
+        return None
+
+    try:
+        message = _lazy_decoder.decode(data)
+    except msgspec.DecodeError:
+        return None
+
+    settings = message.settings
+    if (
+        message.type != BROKER_TASK_SETTINGS
+        or message.task_id is None
+        or settings is None
+    ):
+        return None
+
+    items = bytes(settings.items)
+    if not items.startswith(b"["):
+        return None
+
+    return BrokerTaskSettings(
+        task_id=message.task_id,
+        settings=TaskSettings(
+            code=settings.code,
+            node_mode=_get_node_mode(settings.node_mode),
+            continue_on_fail=settings.continue_on_fail,
+            items=RawItems.from_json(items),
+            workflow_name=settings.workflow_name,
+            workflow_id=settings.workflow_id,
+            node_name=settings.node_name,
+            node_id=settings.node_id,
+        ),
+    )
+
+
 def _parse_task_offer_accept(d: dict) -> BrokerTaskOfferAccept:
     try:
         task_id = d["taskId"]
@@ -113,8 +186,12 @@ class MessageSerde:
     """Responsible for deserializing incoming messages and serializing outgoing messages."""
 
     @staticmethod
-    def deserialize_broker_message(data: str) -> BrokerMessage:
-        message_dict = json.loads(data)
+    def deserialize_broker_message(data: str | bytes) -> BrokerMessage:
+        task_settings = _parse_task_settings_lazily(data)
+        if task_settings is not None:
+            return task_settings
+
+        message_dict = json_codec.loads(data)
         message_type = message_dict.get("type")
 
         if message_type not in MESSAGE_TYPE_MAP:
@@ -123,12 +200,36 @@ class MessageSerde:
         return MESSAGE_TYPE_MAP[message_type](message_dict)
 
     @staticmethod
-    def serialize_runner_message(message: RunnerMessage) -> str:
+    def serialize_runner_message(message: RunnerMessage) -> bytes:
+        """Encode a message as UTF-8 JSON, to be sent as is in a text frame."""
+
+        if isinstance(message, RunnerTaskDone) and isinstance(
+            message.data.get("result"), RawItems
+        ):
+            return MessageSerde._serialize_raw_task_done(message)
+
         data = asdict(message)
         camel_case_data = {
             MessageSerde._snake_to_camel_case(k): v for k, v in data.items()
         }
-        return json.dumps(camel_case_data)
+        return json_codec.dumps(camel_case_data)
+
+    @staticmethod
+    def _serialize_raw_task_done(message: RunnerTaskDone) -> bytes:
+        """Splice still-encoded result items into the message, without decoding them."""
+
+        result = cast(RawItems, message.data["result"])
+        data = {key: value for key, value in message.data.items() if key != "result"}
+        envelope = json_codec.dumps(
+            {"type": message.type, "taskId": message.task_id, "data": data}
+        )
+
+        # `data` is the last key, so the envelope ends in the closing braces of both
+        parts = [envelope[:-2], b',"result":' if data else b'"result":']
+        parts.extend(result.to_json_parts())
+        parts.append(b"}}")
+
+        return b"".join(parts)
 
     @staticmethod
     def _snake_to_camel_case(snake_case_str: str) -> str:
@@ -1,5 +1,5 @@
 from dataclasses import dataclass
-from typing import Literal, Any
+from typing import TYPE_CHECKING, Literal, Any
 
 from src.constants import (
     BROKER_INFO_REQUEST,
@@ -10,6 +10,9 @@ from src.constants import (
     BROKER_RPC_RESPONSE,
 )
 
+if TYPE_CHECKING:
+    from src.raw_items import RawItems
+
 
 @dataclass
 class BrokerInfoRequest:
@@ -38,7 +41,7 @@ class TaskSettings:
     code: str
     node_mode: NodeMode
     continue_on_fail: bool
-    items: Items
+    items: "Items | RawItems"  # raw if parsed lazily, see `MessageSerde`
     workflow_name: str
     workflow_id: str
     node_name: str
@@ -1,10 +1,20 @@
-from typing import Any, TypedDict
+from typing import Any, NotRequired, TypedDict
 
 from src.message_types.broker import Items
+from src.raw_items import RawItems
 
 PrintArgs = list[list[Any]]  # Args to all `print()` calls in a Python code task
 
 
+class TaskUsage(TypedDict):
+    peak_rss: int  # bytes
+    cpu_user: float  # seconds
+    cpu_system: float  # seconds
+    exec_duration: float  # seconds in user code
+    serialize_duration: float  # seconds encoding the result
+    import_duration: float  # seconds user code spent importing modules
+
+
 class TaskErrorInfo(TypedDict):
     message: str
     description: str
@@ -13,13 +23,15 @@ class TaskErrorInfo(TypedDict):
 
 
 class PipeResultMessage(TypedDict):
-    result: Items
+    result: Items | RawItems
     print_args: PrintArgs
+    usage: NotRequired[TaskUsage]
 
 
 class PipeErrorMessage(TypedDict):
     error: TaskErrorInfo
     print_args: PrintArgs
+    usage: NotRequired[TaskUsage]
 
 
 PipeMessage = PipeResultMessage | PipeErrorMessage
@@ -0,0 +1,202 @@
+import math
+from bisect import bisect_left
+from collections.abc import Callable
+
+from src.constants import (
+    METRICS_DURATION_BUCKETS,
+    METRICS_PREFIX,
+    METRICS_SIZE_BUCKETS,
+)
+from src.recent_tasks import RecentTasks
+
+type LabelValues = tuple[str, ...]
+
+
+def _format_value(value: float) -> str:
+    if math.isinf(value):
+        return "+Inf" if value > 0 else "-Inf"
+
+    if float(value).is_integer():
+        return str(int(value))
+
+    return repr(float(value))
+
+
+def _escape_label_value(value: str) -> str:
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _format_labels(names: tuple[str, ...], values: LabelValues) -> str:
+    if not names:
+        return ""
+
+    pairs = (
+        f'{name}="{_escape_label_value(value)}"' for name, value in zip(names, values)
+    )
+
+    return "{" + ",".join(pairs) + "}"
+
+
+class Counter:
+    """Monotonically increasing value, optionally split by label values."""
+
+    type = "counter"
+
+    def __init__(self, name: str, help: str, label_names: tuple[str, ...] = ()):
+        self.name = METRICS_PREFIX + name
+        self.help = help
+        self.label_names = label_names
+        self.values: dict[LabelValues, float] = {} if label_names else {(): 0}
+
+    def inc(self, *label_values: str, amount: float = 1) -> None:
+        self.values[label_values] = self.values.get(label_values, 0) + amount
+
+    def samples(self) -> list[str]:
+        return [
+            f"{self.name}{_format_labels(self.label_names, label_values)} {_format_value(value)}"
+            for label_values, value in self.values.items()
+        ]
+
+
+class Gauge:
+    """Value read from runner state when metrics are rendered."""
+
+    type = "gauge"
+
+    def __init__(self, name: str, help: str):
+        self.name = METRICS_PREFIX + name
+        self.help = help
+        self.read: Callable[[], float] = lambda: 0
+
+    def set_function(self, read: Callable[[], float]) -> None:
+        self.read = read
+
+    def samples(self) -> list[str]:
+        return [f"{self.name} {_format_value(self.read())}"]
+
+
+class Histogram:
+    """Distribution of observed values over fixed, cumulative buckets."""
+
+    type = "histogram"
+
+    def __init__(self, name: str, help: str, buckets: tuple[float, ...]):
+        self.name = METRICS_PREFIX + name
+        self.help = help
+        self.buckets = tuple(sorted(buckets))
+        self.counts = [0] * (len(self.buckets) + 1)  # last one is +Inf
+        self.sum = 0.0
+
+    def observe(self, value: float) -> None:
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.sum += value
+
+    def samples(self) -> list[str]:
+        lines = []
+        cumulative = 0
+
+        for upper_bound, count in zip((*self.buckets, math.inf), self.counts):
+            cumulative += count
+            lines.append(
+                f'{self.name}_bucket{{le="{_format_value(upper_bound)}"}} {cumulative}'
+            )
+
+        lines.append(f"{self.name}_sum {_format_value(self.sum)}")
+        lines.append(f"{self.name}_count {cumulative}")
+
+        return lines
+
+
+type Metric = Counter | Gauge | Histogram
+
+
+class Metrics:
+    """Runner metrics, exposed in Prometheus text format.
+
+    Metrics are only updated and rendered on the event loop thread, so they
+    need no locking and each update is a dict or list increment.
+    """
+
+    def __init__(self):
+        self.tasks = Counter(
+            "tasks_total", "Tasks finished, by outcome", label_names=("outcome",)
+        )
+        self.task_duration = Histogram(
+            "task_duration_seconds",
+            "Duration of successful tasks",
+            METRICS_DURATION_BUCKETS,
+        )
+        self.task_result_size = Histogram(
+            "task_result_size_bytes",
+            "Size of results of successful tasks",
+            METRICS_SIZE_BUCKETS,
+        )
+        self.subprocess_spawn = Histogram(
+            "subprocess_spawn_seconds",
+            "Time to start or acquire a subprocess for a task",
+            METRICS_DURATION_BUCKETS,
+        )
+        self.task_imports = Histogram(
+            "task_import_seconds",
+            "Time user code spent importing modules, saved by preloading them",
+            METRICS_DURATION_BUCKETS,
+        )
+        self.subprocesses_stopped = Counter(
+            "subprocesses_stopped_total",
+            "Task subprocesses stopped by the runner, by reason",
+            label_names=("reason",),
+        )
+        self.offers_sent = Counter("offers_sent_total", "Task offers sent to broker")
+        self.offers_accepted = Counter(
+            "offers_accepted_total", "Task offers accepted by broker"
+        )
+        self.tasks_rejected = Counter(
+            "tasks_rejected_total",
+            "Tasks rejected after offer acceptance, by reason",
+            label_names=("reason",),
+        )
+        self.results_dropped = Counter(
+            "results_dropped_total",
+            "Task results dropped while disconnected from a broker, buffer full",
+        )
+        self.code_cache_lookups = Counter(
+            "code_cache_lookups_total",
+            "Compiled code cache lookups, by result",
+            label_names=("result",),
+        )
+        self.running_tasks = Gauge("running_tasks", "Tasks accepted and not finished")
+        self.connected_brokers = Gauge(
+            "connected_brokers", "Brokers the runner is registered with"
+        )
+        self.max_concurrency = Gauge(
+            "max_concurrency", "Tasks the runner currently takes on at once"
+        )
+        self.queued_tasks = Gauge(
+            "queued_tasks", "Tasks waiting for their workflow to be below its cap"
+        )
+        self.open_offers = Gauge("open_offers", "Task offers awaiting acceptance")
+        self.offer_accept_latency = Gauge(
+            "offer_accept_latency_seconds",
+            "Moving average of time from sending an offer to its acceptance",
+        )
+        self.idle_workers = Gauge(
+            "idle_workers", "Pre-warmed worker subprocesses ready for tasks"
+        )
+        self.recent_tasks = RecentTasks()
+
+    def all(self) -> list[Metric]:
+        return [
+            metric
+            for metric in vars(self).values()
+            if isinstance(metric, (Counter, Gauge, Histogram))
+        ]
+
+    def render(self) -> str:
+        lines = []
+
+        for metric in self.all():
+            lines.append(f"# HELP {metric.name} {metric.help}")
+            lines.append(f"# TYPE {metric.name} {metric.type}")
+            lines.extend(metric.samples())
+
+        return "\n".join(lines) + "\n"
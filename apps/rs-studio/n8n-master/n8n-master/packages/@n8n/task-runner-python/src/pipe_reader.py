@@ -1,64 +1,234 @@
-import json
+import asyncio
 import os
-import threading
+import time
+from collections.abc import Callable
 from typing import cast
 
 from multiprocessing.connection import Connection
 
+from src import json_codec
 from src.errors import (
     InvalidPipeMsgContentError,
     InvalidPipeMsgLengthError,
 )
-from src.message_types.pipe import PipeMessage
-from src.constants import PIPE_MSG_PREFIX_LENGTH
+from src.message_types.broker import Items
+from src.message_types.pipe import PipeMessage, PrintArgs
+from src.raw_items import RawItems
+from src.constants import (
+    PIPE_FRAME_ERROR,
+    PIPE_FRAME_ITEMS,
+    PIPE_FRAME_PART,
+    PIPE_FRAME_PRINT,
+    PIPE_FRAME_RESULT_END,
+    PIPE_FRAME_TYPE_LENGTH,
+    PIPE_MAX_FRAME_SIZE,
+    PIPE_MSG_PREFIX_LENGTH,
+    PIPE_READ_BUDGET,
+    DEFAULT_MAX_PAYLOAD_SIZE,
+)
 
 type PipeConnection = Connection
 
+FRAME_HEADER_LENGTH = PIPE_FRAME_TYPE_LENGTH + PIPE_MSG_PREFIX_LENGTH
+
+
+class PipeReader:
+    """Reads a result from a pipe on the event loop, one frame at a time.
+
+    The pipe is registered with the event loop and read as data arrives,
+    straight into a buffer sized by the frame header, so no thread is
+    held per task.
+
+    Args of `print()` calls are passed to `on_print` as they arrive, or else
+    collected into the message's `print_args`.
+
+    With `raw_result`, result items are kept as the encoded JSON arrays
+    received, in a `RawItems`, instead of being decoded.
 
-class PipeReader(threading.Thread):
-    """Background thread that reads result from pipe."""
+    Frames over `PIPE_MAX_FRAME_SIZE`, or frames adding up to over `max_size`
+    bytes, are rejected before their buffer is allocated.
+    """
 
-    def __init__(self, read_fd: int, read_conn: PipeConnection):
-        super().__init__()
+    def __init__(
+        self,
+        read_fd: int,
+        read_conn: PipeConnection,
+        close_on_exit: bool = True,
+        on_print: Callable[[list[str]], None] | None = None,
+        raw_result: bool = False,
+        max_size: int = DEFAULT_MAX_PAYLOAD_SIZE,
+    ):
         self.read_fd = read_fd
         self.read_conn = read_conn
+        self.close_on_exit = close_on_exit  # pipes of pre-warmed workers are reused
+        self.on_print = on_print
+        self.max_size = max_size  # bytes
         self.pipe_message: PipeMessage | None = None
         self.message_size: int | None = None  # bytes
         self.error: Exception | None = None
+        self.transfer_duration: float | None = (
+            None  # seconds, first result byte to last
+        )
+
+        self._result: Items | RawItems = RawItems() if raw_result else []
+        self._print_args: PrintArgs = []
+        self._frame_type: int | None = None  # None while reading a header
+        self._parts: list[bytearray] = []  # of a payload split over frames
+        self._buffer = bytearray(FRAME_HEADER_LENGTH)
+        self._offset = 0
+        self._result_started_at: float | None = None
+        self._done: asyncio.Future[None] | None = None
+        self._loop: asyncio.AbstractEventLoop | None = None
+
+    async def read(self) -> None:
+        """Read until a full message arrives or the pipe fails, setting `pipe_message` or `error`."""
+
+        self._loop = asyncio.get_running_loop()
+        self._done = self._loop.create_future()
+        self.message_size = 0
 
-    def run(self):
         try:
-            length_bytes = PipeReader._read_exact_bytes(
-                self.read_fd, PIPE_MSG_PREFIX_LENGTH
-            )
-            length_int = int.from_bytes(length_bytes, "big")
-            if length_int <= 0:
-                raise InvalidPipeMsgLengthError(length_int)
-            self.message_size = length_int
-            data = PipeReader._read_exact_bytes(self.read_fd, length_int)
-            parsed_msg = json.loads(data.decode("utf-8"))
-            self.pipe_message = self._validate_pipe_message(parsed_msg)
+            os.set_blocking(self.read_fd, False)
+            self._loop.add_reader(self.read_fd, self._on_readable)
         except Exception as e:
-            self.error = e
+            self._finish(e)
+
+        try:
+            await asyncio.shield(self._done)
         finally:
+            self.close()
+
+    def close(self) -> None:
+        """Stop reading, e.g. on timeout. A message not fully read by now is an error."""
+
+        if self._done is not None and not self._done.done():
+            self._finish(EOFError("Pipe closed before reading all data"))
+
+    def _on_readable(self) -> None:
+        bytes_read = 0
+
+        try:
+            # bounded, so that one fast writer cannot starve the event loop
+            while bytes_read < PIPE_READ_BUDGET:
+                view = memoryview(self._buffer)[self._offset :]
+                n = os.readv(self.read_fd, [view])
+                if n == 0:
+                    raise EOFError("Pipe closed before reading all data")
+
+                bytes_read += n
+                self._offset += n
+
+                if self._offset == len(self._buffer) and self._on_buffer_full():
+                    if self._result_started_at is not None:
+                        self.transfer_duration = (
+                            time.perf_counter() - self._result_started_at
+                        )
+                    self._finish()
+                    return
+        except BlockingIOError:
+            pass
+        except (
+            OSError,
+            EOFError,
+            ValueError,  # undecodable JSON
+            RecursionError,  # JSON nested too deep to decode
+            MemoryError,
+            InvalidPipeMsgLengthError,
+            InvalidPipeMsgContentError,
+        ) as e:
+            self._finish(e)
+
+    def _on_buffer_full(self) -> bool:
+        """Handle a full header or payload, returning whether the message is complete."""
+
+        self._offset = 0
+
+        if self._frame_type is None:
+            self._frame_type = self._buffer[0]
+            if self._frame_type != PIPE_FRAME_PRINT and self._result_started_at is None:
+                self._result_started_at = time.perf_counter()
+            length_int = int.from_bytes(self._buffer[PIPE_FRAME_TYPE_LENGTH:], "big")
+            if length_int <= 0 or length_int > PIPE_MAX_FRAME_SIZE:
+                raise InvalidPipeMsgLengthError(length_int)
+
+            assert self.message_size is not None
+            if self.message_size + length_int > self.max_size:
+                raise InvalidPipeMsgLengthError(self.message_size + length_int)
+
+            self._buffer = bytearray(length_int)
+            return False
+
+        frame_type, payload = self._frame_type, self._buffer
+        self._frame_type = None
+        self._buffer = bytearray(FRAME_HEADER_LENGTH)
+
+        assert self.message_size is not None
+        self.message_size += len(payload)
+
+        if frame_type == PIPE_FRAME_PART:
+            self._parts.append(payload)
+            return False
+
+        if self._parts:
+            payload = bytearray().join([*self._parts, payload])
+            self._parts = []
+
+        return self._handle_frame(frame_type, payload)
+
+    def _handle_frame(self, frame_type: int, payload: bytearray) -> bool:
+        if frame_type == PIPE_FRAME_ITEMS:
+            if isinstance(self._result, RawItems):
+                self._result.append(payload)
+                return False
+
+            # parsed chunk by chunk so buffers stay bounded by chunk size
+            items = json_codec.loads(payload)
+            if not isinstance(items, list):
+                raise InvalidPipeMsgContentError("'result' must be a list")
+            self._result.extend(items)
+            return False
+
+        if frame_type == PIPE_FRAME_PRINT:
+            print_args = json_codec.loads(payload)
+            if not isinstance(print_args, list):
+                raise InvalidPipeMsgContentError("Print args must be a list")
+            if self.on_print:
+                self.on_print(print_args)
+            else:
+                self._print_args.append(print_args)
+            return False
+
+        if frame_type == PIPE_FRAME_RESULT_END:
+            msg = json_codec.loads(payload)
+            if isinstance(msg, dict):
+                msg["result"] = self._result
+            self.pipe_message = self._with_print_args(self._validate_pipe_message(msg))
+            return True
+
+        if frame_type == PIPE_FRAME_ERROR:
+            msg = json_codec.loads(payload)
+            self.pipe_message = self._with_print_args(self._validate_pipe_message(msg))
+            return True
+
+        raise InvalidPipeMsgContentError(f"Unknown frame type {frame_type}")
+
+    def _finish(self, error: Exception | None = None) -> None:
+        self.error = error
+
+        if self._loop is not None:
+            self._loop.remove_reader(self.read_fd)
+
+        if self.close_on_exit:
             self.read_conn.close()
 
-    @staticmethod
-    def _read_exact_bytes(fd: int, n: int) -> bytes:
-        """Read exactly n bytes from file descriptor.
-
-        Uses os.read() instead of Connection.recv() because recv() pickles.
-        Preallocates bytearray to avoid repeated reallocation.
-        """
-        result = bytearray(n)
-        offset = 0
-        while offset < n:
-            chunk = os.read(fd, n - offset)
-            if not chunk:
-                raise EOFError("Pipe closed before reading all data")
-            result[offset : offset + len(chunk)] = chunk
-            offset += len(chunk)
-        return bytes(result)
+        if self._done is not None and not self._done.done():
+            self._done.set_result(None)
+
+    def _with_print_args(self, msg: PipeMessage) -> PipeMessage:
+        if self._print_args:
+            msg["print_args"] = [*self._print_args, *msg["print_args"]]
+
+        return msg
 
     def _validate_pipe_message(self, msg) -> PipeMessage:
         if not isinstance(msg, dict):
@@ -79,7 +249,7 @@ class PipeReader(threading.Thread):
         if has_result and has_error:
             raise InvalidPipeMsgContentError("Msg has both 'result' and 'error' keys")
 
-        if has_result and not isinstance(msg["result"], list):
+        if has_result and not isinstance(msg["result"], (list, RawItems)):
             raise InvalidPipeMsgContentError("'result' must be a list")
 
         if has_error and not isinstance(msg["error"], dict):
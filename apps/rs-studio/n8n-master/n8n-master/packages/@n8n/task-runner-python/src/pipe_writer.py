@@ -0,0 +1,114 @@
+import os
+import time
+
+from src import json_codec
+from src.constants import (
+    PIPE_CHUNK_SIZE,
+    PIPE_FRAME_ERROR,
+    PIPE_FRAME_ITEMS,
+    PIPE_FRAME_PART,
+    PIPE_FRAME_PRINT,
+    PIPE_FRAME_RESULT_END,
+    PIPE_FRAME_TYPE_LENGTH,
+    PIPE_MAX_FRAME_SIZE,
+    PIPE_MSG_PREFIX_LENGTH,
+)
+from src.message_types.pipe import PipeErrorMessage, PrintArgs, TaskUsage
+
+
+class PipeWriter:
+    """Writes a task result to the pipe as a stream of frames, one chunk of items at a time.
+
+    Frame layout: 1-byte frame type, 4-byte big-endian payload length, payload.
+    A result is any number of items frames followed by a result-end frame, or an
+    error frame, which discards items sent before it. Print frames may be sent
+    at any point before either. A payload over `PIPE_MAX_FRAME_SIZE`, e.g. of a
+    single large item, is split into part frames ended by the frame of its type.
+    """
+
+    def __init__(self, write_fd: int, chunk_size: int = PIPE_CHUNK_SIZE):
+        self.write_fd = write_fd
+        self.chunk_size = chunk_size
+        self._chunk: list[bytes] = []
+        self._chunk_bytes = 0
+        self.encode_duration = 0.0  # seconds spent encoding items
+
+    def write_item(self, item) -> None:
+        encode_start = time.perf_counter()
+        encoded = PipeWriter._encode(item)
+        self.encode_duration += time.perf_counter() - encode_start
+        self._chunk.append(encoded)
+        self._chunk_bytes += len(encoded) + 1
+
+        if self._chunk_bytes >= self.chunk_size:
+            self.flush()
+
+    def write_result(
+        self, result, print_args: PrintArgs, usage: TaskUsage | None = None
+    ) -> None:
+        self.write_items(result)
+        self.end_result(print_args, usage)
+
+    def write_items(self, result) -> None:
+        if isinstance(result, list):
+            for item in result:
+                self.write_item(item)
+        else:
+            # sent as is for the runner to reject as invalid
+            self._write_frame(PIPE_FRAME_ITEMS, PipeWriter._encode(result))
+
+    def end_result(self, print_args: PrintArgs, usage: TaskUsage | None = None) -> None:
+        self.flush()
+        message: dict = {"print_args": print_args}
+        if usage is not None:
+            message["usage"] = usage
+        self._write_frame(PIPE_FRAME_RESULT_END, PipeWriter._encode(message))
+
+    def write_error(self, message: PipeErrorMessage) -> None:
+        self._chunk = []
+        self._chunk_bytes = 0
+        self._write_frame(PIPE_FRAME_ERROR, PipeWriter._encode(message))
+
+    def write_print(self, encoded_args: bytes) -> None:
+        """Send the encoded args of one `print()` call right away, ahead of any buffered items."""
+
+        self._write_frame(PIPE_FRAME_PRINT, encoded_args)
+
+    def flush(self) -> None:
+        if not self._chunk:
+            return
+
+        payload = b"[" + b",".join(self._chunk) + b"]"
+        self._chunk = []
+        self._chunk_bytes = 0
+        self._write_frame(PIPE_FRAME_ITEMS, payload)
+
+    def _write_frame(self, frame_type: int, payload: bytes) -> None:
+        view = memoryview(payload)
+        while len(view) > PIPE_MAX_FRAME_SIZE:
+            self._write_single_frame(PIPE_FRAME_PART, view[:PIPE_MAX_FRAME_SIZE])
+            view = view[PIPE_MAX_FRAME_SIZE:]
+
+        self._write_single_frame(frame_type, view)
+
+    def _write_single_frame(self, frame_type: int, payload: memoryview) -> None:
+        header = frame_type.to_bytes(PIPE_FRAME_TYPE_LENGTH, "big") + len(
+            payload
+        ).to_bytes(PIPE_MSG_PREFIX_LENGTH, "big")
+
+        PipeWriter._write_bytes(self.write_fd, header)
+        PipeWriter._write_bytes(self.write_fd, payload)
+
+    @staticmethod
+    def _encode(value) -> bytes:
+        return json_codec.dumps(value)
+
+    @staticmethod
+    def _write_bytes(fd: int, data: bytes | memoryview):
+        view = memoryview(data)
+        total_written = 0
+        while total_written < len(data):
+            written = os.write(fd, view[total_written:])
+            if written == 0:
+                raise OSError("Write failed")
+            total_written += written
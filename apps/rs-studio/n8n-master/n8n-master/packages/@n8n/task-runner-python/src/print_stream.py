@@ -0,0 +1,69 @@
+import time
+from collections.abc import Callable
+from typing import Any
+
+from src.constants import (
+    PRINT_STREAM_BURST,
+    PRINT_STREAM_MAX_BYTES,
+    PRINT_STREAM_RATE,
+)
+from src.pipe_writer import PipeWriter
+
+
+class PrintStream:
+    """Sends the args of `print()` calls in user code to the runner as they are made.
+
+    Calls beyond a token bucket of `burst` calls refilled at `rate` per second,
+    or past `max_bytes` of output, are dropped and only counted, so chatty code
+    neither floods the broker nor holds its output in memory.
+    """
+
+    def __init__(
+        self,
+        writer: PipeWriter,
+        format_args: Callable[..., list[str]],
+        burst: int = PRINT_STREAM_BURST,
+        rate: float = PRINT_STREAM_RATE,
+        max_bytes: int = PRINT_STREAM_MAX_BYTES,
+    ):
+        self.writer = writer
+        self.format_args = format_args
+        self.burst = burst
+        self.rate = rate
+        self.max_bytes = max_bytes
+        self.sent_bytes = 0
+        self.dropped = 0
+        self._tokens = float(burst)
+        self._refilled_at = time.monotonic()
+
+    def write(self, *args: Any) -> None:
+        now = time.monotonic()
+        self._tokens = min(
+            self.burst, self._tokens + (now - self._refilled_at) * self.rate
+        )
+        self._refilled_at = now
+
+        if self._tokens < 1 or self.sent_bytes >= self.max_bytes:
+            self.dropped += 1
+            return
+
+        # formatted only once allowed, so dropped calls cost next to nothing
+        payload = PipeWriter._encode(self.format_args(*args))
+        if self.sent_bytes + len(payload) > self.max_bytes:
+            self.dropped += 1
+            return
+
+        self._tokens -= 1
+        self.sent_bytes += len(payload)
+        self.writer.write_print(payload)
+
+    def close(self) -> None:
+        """Report dropped calls, if any, as a last line of output."""
+
+        dropped, self.dropped = self.dropped, 0
+        if dropped:
+            self.writer.write_print(
+                PipeWriter._encode(
+                    [f"[Output truncated - {dropped} more print statements]"]
+                )
+            )
@@ -0,0 +1,107 @@
+import json
+from typing import TYPE_CHECKING
+
+# only used, and only type checked, when installed
+if TYPE_CHECKING:
+    import msgspec
+else:
+    try:
+        import msgspec
+    except ImportError:
+        msgspec = None
+
+from src import json_codec
+from src.errors import InvalidPipeMsgContentError
+from src.message_types.broker import Items
+
+if msgspec is not None:
+    # checks the JSON is well-formed without building the items
+    _array_decoder = msgspec.json.Decoder(list[msgspec.Raw])
+
+
+class RawItems:
+    """Result items as the JSON arrays encoded by the subprocess, one per pipe frame.
+
+    Kept encoded so they can be spliced into the message to the broker as is,
+    without decoding them into Python objects only to encode them again.
+    """
+
+    __slots__ = ("chunks",)
+
+    def __init__(self):
+        self.chunks: list[bytes | bytearray] = []
+
+    def append(self, chunk: bytes | bytearray) -> None:
+        """Add the JSON array of one items frame, after checking that it is a well-formed array.
+
+        Without msgspec, the check decodes the items in full. An array that is only
+        valid to lenient decoders, e.g. with `NaN` literals, is encoded again by the
+        runner's codec, which writes standard JSON.
+        """
+
+        try:
+            count = RawItems._count_standard_json_items(chunk)
+        except (
+            ValueError,
+            TypeError,
+        ):  # decode errors of all codecs subclass ValueError
+            items = RawItems._decode_items(chunk)
+            if items:
+                self.chunks.append(json_codec.dumps(items))
+            return
+
+        if count > 0:
+            self.chunks.append(chunk)
+
+    @staticmethod
+    def _count_standard_json_items(chunk: bytes | bytearray) -> int:
+        if msgspec is not None:
+            return len(_array_decoder.decode(chunk))
+
+        items = json.loads(chunk, parse_constant=_reject_constant)
+        if not isinstance(items, list):
+            raise TypeError("Not a JSON array")
+        return len(items)
+
+    @staticmethod
+    def _decode_items(chunk: bytes | bytearray) -> Items:
+        try:
+            items = json_codec.loads(chunk)
+        except ValueError:
+            raise InvalidPipeMsgContentError("'result' must be a list")
+
+        if not isinstance(items, list):
+            raise InvalidPipeMsgContentError("'result' must be a list")
+
+        return items
+
+    def to_json_parts(self) -> list[bytes | memoryview]:
+        """The items as a single JSON array, in parts to be joined by the caller."""
+
+        parts: list[bytes | memoryview] = [b"["]
+        for i, chunk in enumerate(self.chunks):
+            if i > 0:
+                parts.append(b",")
+            parts.append(memoryview(chunk)[1:-1])
+        parts.append(b"]")
+
+        return parts
+
+    def __bool__(self) -> bool:
+        return bool(self.chunks)
+
+    @classmethod
+    def from_json(cls, data: bytes) -> "RawItems":
+        """Wrap a JSON array already checked by the caller, e.g. as decoded by msgspec."""
+
+        raw_items = cls()
+        if data.strip() != b"[]":
+            raw_items.chunks.append(data)
+        return raw_items
+
+    def to_items(self) -> Items:
+        return [item for chunk in self.chunks for item in json_codec.loads(chunk)]
+
+
+def _reject_constant(name: str):
+    raise ValueError(f"Not standard JSON: {name}")
@@ -0,0 +1,36 @@
+import time
+from collections import deque
+from dataclasses import asdict
+
+from src import json_codec
+from src.constants import RECENT_TASKS_SIZE
+from src.task_state import TaskState
+
+
+class RecentTasks:
+    """Stats of the last finished tasks, for profiling which workflows are expensive.
+
+    Served as JSON by the health check server. Only updated and read on the
+    event loop thread.
+    """
+
+    def __init__(self, max_size: int = RECENT_TASKS_SIZE):
+        self._tasks: deque[dict] = deque(maxlen=max_size)
+
+    def __len__(self) -> int:
+        return len(self._tasks)
+
+    def add(self, task_state: TaskState, outcome: str, duration: float) -> None:
+        self._tasks.append(
+            {
+                "task_id": task_state.task_id,
+                **task_state.context(),
+                "outcome": outcome,
+                "finished_at": time.time(),
+                "duration": duration,
+                **asdict(task_state.stats),
+            }
+        )
+
+    def render(self) -> bytes:
+        return json_codec.dumps(list(self._tasks))
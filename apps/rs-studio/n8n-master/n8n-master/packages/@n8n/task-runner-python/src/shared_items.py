@@ -0,0 +1,63 @@
+import os
+from dataclasses import dataclass
+from multiprocessing.shared_memory import SharedMemory
+
+from src import json_codec
+from src.constants import SHARED_MEMORY_DIR
+from src.message_types.broker import Items
+from src.raw_items import RawItems
+
+
+@dataclass
+class SharedItems:
+    """Reference to input items written as JSON into a shared memory segment."""
+
+    name: str
+    size: int  # bytes
+
+
+def share_items(items: Items | RawItems) -> tuple[SharedMemory, SharedItems]:
+    """Write input items once into a new shared memory segment owned by the caller.
+
+    Raises `OSError` if the segment cannot hold the items, e.g. when `/dev/shm`
+    is too small, since writing past its capacity would crash with `SIGBUS`.
+    """
+
+    if isinstance(items, RawItems):
+        data = b"".join(items.to_json_parts())
+    else:
+        data = json_codec.dumps(items)
+
+    if os.path.isdir(SHARED_MEMORY_DIR):
+        stats = os.statvfs(SHARED_MEMORY_DIR)
+        available = stats.f_bavail * stats.f_frsize
+        if len(data) > available:
+            raise OSError(f"{SHARED_MEMORY_DIR} has only {available} bytes available")
+
+    shm = SharedMemory(create=True, size=max(len(data), 1))
+    assert shm.buf is not None  # only None once closed
+    shm.buf[: len(data)] = data
+
+    return shm, SharedItems(name=shm.name, size=len(data))
+
+
+def load_items(shared_items: SharedItems) -> Items:
+    """Deserialize input items straight from the shared memory segment."""
+
+    # not tracked, as the runner owns the segment and unlinks it
+    shm = SharedMemory(name=shared_items.name, track=False)
+
+    try:
+        assert shm.buf is not None  # only None once closed
+        with shm.buf[: shared_items.size] as view:
+            return json_codec.loads(view)
+    finally:
+        shm.close()
+
+
+def release_items(shm: SharedMemory) -> None:
+    shm.close()
+    try:
+        shm.unlink()
+    except FileNotFoundError:
+        pass
@@ -1,11 +1,22 @@
 import ast
+import asyncio
 import hashlib
+import inspect
+import sys
 from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
 
 from src.errors import SecurityViolationError
+from src import import_validation
 from src.import_validation import validate_module_import
 from src.config.security_config import SecurityConfig
+from src.validation_cache import (
+    CacheKey,
+    CachedViolations,
+    PersistentValidationCache,
+)
 from src.constants import (
+    ANALYZER_MAX_WORKERS,
     MAX_VALIDATION_CACHE_SIZE,
     ERROR_RELATIVE_IMPORT,
     ERROR_DANGEROUS_NAME,
@@ -16,8 +27,6 @@ from src.constants import (
     BLOCKED_NAMES,
 )
 
-CacheKey = tuple[str, tuple]  # (code_hash, allowlists_tuple)
-CachedViolations = list[str]
 ValidationCache = OrderedDict[CacheKey, CachedViolations]
 
 
@@ -155,11 +164,33 @@ class SecurityValidator(ast.NodeVisitor):
         self.violations.append(f"Line {lineno}: {message}")
 
 
+def validation_rules_fingerprint() -> str:
+    """Hash of what validation results depend on besides the code and allowlists:
+    the validator's source, the blocked names and the stdlib module names of this
+    Python version, so that results of other runner versions are not reused."""
+
+    rules = "\n".join(
+        [
+            inspect.getsource(SecurityValidator),
+            inspect.getsource(import_validation),
+            repr(sorted(BLOCKED_NAMES)),
+            repr(sorted(BLOCKED_ATTRIBUTES)),
+            repr(sorted(sys.stdlib_module_names)),
+        ]
+    )
+    return hashlib.sha256(rules.encode()).hexdigest()
+
+
 class TaskAnalyzer:
     _cache: ValidationCache = OrderedDict()
 
-    def __init__(self, security_config: SecurityConfig):
+    def __init__(
+        self,
+        security_config: SecurityConfig,
+        persistent_cache: PersistentValidationCache | None = None,
+    ):
         self._security_config = security_config
+        self._persistent_cache = persistent_cache
         self._allowlists = (
             tuple(sorted(security_config.stdlib_allow)),
             tuple(sorted(security_config.external_allow)),
@@ -168,32 +199,107 @@ class TaskAnalyzer:
             "*" in security_config.stdlib_allow
             and "*" in security_config.external_allow
         )
+        self._executor = ThreadPoolExecutor(
+            max_workers=ANALYZER_MAX_WORKERS, thread_name_prefix="task-analyzer"
+        )
+        self._in_flight: dict[CacheKey, asyncio.Future[CachedViolations]] = {}
 
     def validate(self, code: str) -> None:
         if self._allow_all:
             return
 
         cache_key = self._to_cache_key(code)
-        cached_violations = self._cache.get(cache_key)
-        cache_hit = cached_violations is not None
+        violations = self._get_cached(cache_key)
 
-        if cache_hit:
-            self._cache.move_to_end(cache_key)
+        if violations is None:
+            violations = self._analyze(code)
+            self._set_in_cache(cache_key, violations)
+
+        if violations:
+            self._raise_security_error(violations)
+
+    async def validate_async(self, code: str) -> None:
+        """Like `validate`, but the persistent cache, parsing and validation run on
+        a thread pool, off the event loop.
+
+        Concurrent calls for the same code share a single analysis.
+        """
+
+        if self._allow_all:
+            return
+
+        cache_key = self._to_cache_key(code)
+        violations = self._get_from_memory_cache(cache_key)
+
+        if violations is None:
+            future = self._in_flight.get(cache_key)
+            if future is None:
+                future = asyncio.get_running_loop().run_in_executor(
+                    self._executor, self._load_or_analyze, cache_key, code
+                )
+                future.add_done_callback(
+                    lambda done: self._finish_analysis(cache_key, done)
+                )
+                self._in_flight[cache_key] = future
 
-            if len(cached_violations) == 0:
-                return
+            # shielded so that a cancelled task does not cancel the analysis for others
+            violations = await asyncio.shield(future)
 
-            self._raise_security_error(cached_violations)
+        if violations:
+            self._raise_security_error(violations)
 
+    def shutdown(self) -> None:
+        self._executor.shutdown(wait=False, cancel_futures=True)
+
+    def _analyze(self, code: str) -> CachedViolations:
         tree = ast.parse(code)
 
         security_validator = SecurityValidator(self._security_config)
         security_validator.visit(tree)
 
-        self._set_in_cache(cache_key, security_validator.violations)
+        return security_validator.violations
+
+    def _load_or_analyze(self, cache_key: CacheKey, code: str) -> CachedViolations:
+        """Run on the thread pool, with the blocking I/O of the persistent cache."""
+
+        if self._persistent_cache is None:
+            return self._analyze(code)
+
+        violations = self._persistent_cache.get(cache_key)
+        if violations is None:
+            violations = self._analyze(code)
+            self._persistent_cache.put(cache_key, violations)
+
+        return violations
+
+    def _finish_analysis(
+        self, cache_key: CacheKey, future: asyncio.Future[CachedViolations]
+    ) -> None:
+        del self._in_flight[cache_key]
+
+        # a syntax error is raised to every caller and not cached, as in `validate`
+        if future.cancelled() or future.exception() is not None:
+            return
+
+        self._set_in_memory_cache(cache_key, future.result())
 
-        if security_validator.violations:
-            self._raise_security_error(security_validator.violations)
+    def _get_cached(self, cache_key: CacheKey) -> CachedViolations | None:
+        cached_violations = self._get_from_memory_cache(cache_key)
+
+        if cached_violations is None and self._persistent_cache is not None:
+            cached_violations = self._persistent_cache.get(cache_key)
+            if cached_violations is not None:
+                self._set_in_memory_cache(cache_key, cached_violations)
+
+        return cached_violations
+
+    def _get_from_memory_cache(self, cache_key: CacheKey) -> CachedViolations | None:
+        cached_violations = self._cache.get(cache_key)
+
+        if cached_violations is not None:
+            self._cache.move_to_end(cache_key)
+
+        return cached_violations
 
     def _raise_security_error(self, violations: CachedViolations) -> None:
         raise SecurityViolationError(
@@ -205,8 +311,16 @@ class TaskAnalyzer:
         return (code_hash, self._allowlists)
 
     def _set_in_cache(self, cache_key: CacheKey, violations: CachedViolations) -> None:
+        self._set_in_memory_cache(cache_key, violations)
+
+        if self._persistent_cache is not None:
+            self._persistent_cache.put(cache_key, violations)
+
+    def _set_in_memory_cache(
+        self, cache_key: CacheKey, violations: CachedViolations
+    ) -> None:
         if len(self._cache) >= MAX_VALIDATION_CACHE_SIZE:
-            self._cache.popitem(last=False)  # FIFO
+            self._cache.popitem(last=False)  # least recently used
 
         self._cache[cache_key] = violations.copy()
         self._cache.move_to_end(cache_key)
@@ -1,15 +1,25 @@
+import asyncio
+import dis
+import importlib.util
+import marshal
+import math
 import multiprocessing
 import traceback
 import textwrap
-import json
+import time
 import io
 import os
+import resource
 import sys
+import types
 import logging
+from collections.abc import Callable, Mapping
+from typing import Any
 
 from src.errors import (
     TaskCancelledError,
     TaskKilledError,
+    TaskResourceLimitError,
     TaskResultMissingError,
     TaskResultReadError,
     TaskRuntimeError,
@@ -17,25 +27,35 @@ from src.errors import (
     TaskSubprocessFailedError,
     SecurityViolationError,
 )
+from src import json_codec
+from src.columnar import from_columns, import_array_module, to_columns
 from src.import_validation import validate_module_import
 from src.config.security_config import SecurityConfig
 
 from src.message_types.broker import NodeMode, Items
 from src.message_types.pipe import (
-    PipeResultMessage,
     PipeErrorMessage,
     TaskErrorInfo,
     PrintArgs,
 )
 from src.pipe_reader import PipeReader
+from src.raw_items import RawItems
+from src.pipe_writer import PipeWriter
+from src.print_stream import PrintStream
+from src.task_usage import UsageMeter
+from src.shared_items import SharedItems, load_items
+from src.task_state import TaskStats
 from src.constants import (
-    EXECUTOR_CIRCULAR_REFERENCE_KEY,
     EXECUTOR_USER_OUTPUT_KEY,
+    EXECUTOR_USER_FUNCTION_NAME,
     EXECUTOR_ALL_ITEMS_FILENAME,
     EXECUTOR_PER_ITEM_FILENAME,
+    EXECUTOR_COLUMNS_NAME,
+    DEFAULT_MAX_PAYLOAD_SIZE,
     SIGTERM_EXIT_CODE,
     SIGKILL_EXIT_CODE,
-    PIPE_MSG_PREFIX_LENGTH,
+    SIGXCPU_EXIT_CODE,
+    MEMORY_LIMIT_EXIT_CODE,
     LOG_PIPE_READER_TIMEOUT_TRIGGERED,
 )
 
@@ -45,10 +65,25 @@ from multiprocessing.connection import Connection
 logger = logging.getLogger(__name__)
 
 MULTIPROCESSING_CONTEXT = multiprocessing.get_context("forkserver")
-MAX_PRINT_ARGS_ALLOWED = 100
+
+# per-item code using any of these is given fresh globals for every item
+GLOBALS_WRITE_OPCODES = {"STORE_GLOBAL", "DELETE_GLOBAL"}
+GLOBALS_READ_OPCODES = {"LOAD_GLOBAL", "LOAD_NAME"}
+GLOBALS_ACCESS_NAMES = {"globals", "exec", "eval"}
+# and so is code setting attributes while it uses any of these, which all items share
+SHARED_GLOBAL_NAMES = {EXECUTOR_USER_FUNCTION_NAME, "print"}
+ATTRIBUTE_WRITE_OPCODES = {"STORE_ATTR", "DELETE_ATTR"}
+ATTRIBUTE_WRITE_NAMES = {"setattr", "delattr"}
 
 type PipeConnection = Connection
 
+type TaskCode = str | bytes  # source, or code object marshalled by `CodeCache`
+
+# `sys.modules`, and the attributes of modules and classes, as a worker's tasks found them
+type ModulesSnapshot = tuple[dict[str, Any], list[tuple[object, dict[str, Any]]]]
+
+_MISSING = object()
+
 
 class TaskExecutor:
     """Responsible for executing Python code tasks in isolated subprocesses."""
@@ -57,10 +92,14 @@ class TaskExecutor:
     def create_process(
         code: str,
         node_mode: NodeMode,
-        items: Items,
+        items: Items | RawItems | SharedItems,
         security_config: SecurityConfig,
+        compiled_code: bytes | None = None,
     ) -> tuple[ForkServerProcess, PipeConnection, PipeConnection]:
-        """Create a subprocess for executing a Python code task and a pipe for communication."""
+        """Create a subprocess for executing a Python code task and a pipe for communication.
+
+        With `compiled_code` from `CodeCache`, the subprocess skips compiling `code`.
+        """
 
         fn = (
             TaskExecutor._all_items
@@ -68,14 +107,14 @@ class TaskExecutor:
             else TaskExecutor._per_item
         )
 
-        # thread in runner process reads, subprocess writes
+        # runner process reads, subprocess writes
         read_conn, write_conn = MULTIPROCESSING_CONTEXT.Pipe(duplex=False)
 
         process = MULTIPROCESSING_CONTEXT.Process(
             target=fn,
             args=(
-                code,
-                items,
+                code if compiled_code is None else compiled_code,
+                TaskExecutor._to_subprocess_items(items),
                 write_conn,
                 security_config,
             ),
@@ -84,84 +123,300 @@ class TaskExecutor:
         return process, read_conn, write_conn
 
     @staticmethod
-    def execute_process(
+    def preload_modules(security_config: SecurityConfig) -> list[str]:
+        """Have the forkserver import allowlisted modules, so that subprocesses fork with them already imported.
+
+        Takes effect only if called before the first subprocess is started.
+        Returns the modules to preload: those allowlisted by name and installed.
+
+        The modules are imported before subprocesses clear their environment, so
+        their import-time code can read the runner's full environment. Hence it is
+        opt-in, for allowlists of trusted modules.
+        """
+
+        modules = sorted(
+            name
+            for name in security_config.stdlib_allow | security_config.external_allow
+            if validate_module_import(name, security_config)[0]
+            and TaskExecutor._is_installed(name)
+        )
+
+        # the forkserver skips modules that fail to import
+        MULTIPROCESSING_CONTEXT.set_forkserver_preload(["__main__", *modules])
+
+        return modules
+
+    @staticmethod
+    def _is_installed(module_name: str) -> bool:
+        if module_name == "*":
+            return False
+
+        try:
+            return importlib.util.find_spec(module_name) is not None
+        except (ImportError, ValueError):
+            return False
+
+    @staticmethod
+    def create_worker(
+        security_config: SecurityConfig,
+        max_tasks: int,
+    ) -> tuple[ForkServerProcess, PipeConnection, PipeConnection]:
+        """Start a pre-warmed worker subprocess that runs up to `max_tasks` tasks received over a pipe."""
+
+        # runner process writes tasks, worker reads
+        task_read_conn, task_write_conn = MULTIPROCESSING_CONTEXT.Pipe(duplex=False)
+
+        # runner process reads, worker writes
+        read_conn, write_conn = MULTIPROCESSING_CONTEXT.Pipe(duplex=False)
+
+        process = MULTIPROCESSING_CONTEXT.Process(
+            target=TaskExecutor._worker,
+            args=(
+                task_read_conn,
+                write_conn,
+                security_config,
+                max_tasks,
+            ),
+        )
+
+        try:
+            process.start()
+        finally:
+            task_read_conn.close()
+            write_conn.close()
+
+        return process, task_write_conn, read_conn
+
+    @staticmethod
+    async def execute_process(
         process: ForkServerProcess,
         read_conn: PipeConnection,
         write_conn: PipeConnection,
         task_timeout: int,
         pipe_reader_timeout: float,
         continue_on_fail: bool,
-    ) -> tuple[Items, PrintArgs, int]:
-        """Execute a subprocess for a Python code task."""
+        stats: TaskStats | None = None,
+        on_print: Callable[[list[str]], None] | None = None,
+        raw_result: bool = False,
+        max_payload_size: int = DEFAULT_MAX_PAYLOAD_SIZE,
+    ) -> tuple[Items | RawItems, PrintArgs, int]:
+        """Execute a subprocess for a Python code task.
+
+        The result pipe and the subprocess exit are both awaited on the event loop.
+        With `on_print`, print() output is passed on as it arrives instead of returned.
+        With `raw_result`, result items are returned still encoded, as `RawItems`.
+        """
 
         print_args: PrintArgs = []
 
-        pipe_reader = PipeReader(read_conn.fileno(), read_conn)
-        pipe_reader.start()
+        pipe_reader = PipeReader(
+            read_conn.fileno(),
+            read_conn,
+            on_print=on_print,
+            raw_result=raw_result,
+            max_size=max_payload_size,
+        )
+        reading = asyncio.create_task(pipe_reader.read())
 
         try:
             try:
+                spawn_start = time.perf_counter()
+                # a forkserver start is a send to the forkserver socket, cheap enough
+                # for the event loop; large inputs should go by shared memory anyway
                 process.start()
+                if stats is not None:
+                    stats.spawn_duration = time.perf_counter() - spawn_start
             except Exception as e:
                 raise TaskSubprocessFailedError(-1, e)
             finally:
                 write_conn.close()
 
-            process.join(timeout=task_timeout)
-
-            if process.is_alive():
-                TaskExecutor.stop_process(process)
+            if not await TaskExecutor._wait_for_exit(process, task_timeout):
+                await asyncio.to_thread(TaskExecutor.stop_process, process)
                 raise TaskTimeoutError(task_timeout)
 
-            if process.exitcode == SIGTERM_EXIT_CODE:
-                raise TaskCancelledError()
-
-            if process.exitcode == SIGKILL_EXIT_CODE:
-                raise TaskKilledError()
-
-            if process.exitcode != 0:
-                assert process.exitcode is not None
-                raise TaskSubprocessFailedError(process.exitcode)
+            TaskExecutor._raise_for_exit_code(process)
 
-            pipe_reader.join(timeout=pipe_reader_timeout)
-
-            if pipe_reader.is_alive():
+            try:
+                await asyncio.wait_for(asyncio.shield(reading), pipe_reader_timeout)
+            except TimeoutError:
                 logger.warning(
                     LOG_PIPE_READER_TIMEOUT_TRIGGERED.format(
                         timeout=pipe_reader_timeout
                     )
                 )
-                try:
-                    read_conn.close()
-                except Exception:
-                    pass
+                pipe_reader.close()
+
+            TaskExecutor._record_usage(pipe_reader, stats)
+            return TaskExecutor._get_returned(pipe_reader)
 
-            if pipe_reader.error:
-                raise TaskResultReadError(pipe_reader.error)
+        except Exception as e:
+            if continue_on_fail:
+                return [{"json": {"error": str(e)}}], print_args, 0
+            raise
 
-            if pipe_reader.pipe_message is None:
-                raise TaskResultMissingError()
+        finally:
+            pipe_reader.close()
+            await reading
+
+    @staticmethod
+    async def execute_in_worker(
+        process: ForkServerProcess,
+        task_conn: PipeConnection,
+        read_conn: PipeConnection,
+        code: str,
+        node_mode: NodeMode,
+        items: Items | RawItems | SharedItems,
+        task_timeout: int,
+        continue_on_fail: bool,
+        compiled_code: bytes | None = None,
+        on_print: Callable[[list[str]], None] | None = None,
+        stats: TaskStats | None = None,
+        raw_result: bool = False,
+        max_payload_size: int = DEFAULT_MAX_PAYLOAD_SIZE,
+    ) -> tuple[Items | RawItems, PrintArgs, int]:
+        """Execute a Python code task on a pre-warmed worker subprocess.
+
+        Any failure other than an error raised by user code leaves the worker
+        in an unknown state, so the worker is stopped and must not be reused.
+        """
 
-            returned = pipe_reader.pipe_message
+        pipe_reader = PipeReader(
+            read_conn.fileno(),
+            read_conn,
+            close_on_exit=False,
+            on_print=on_print,
+            raw_result=raw_result,
+            max_size=max_payload_size,
+        )
+        reading = asyncio.create_task(pipe_reader.read())
 
-            if "error" in returned:
-                raise TaskRuntimeError(returned["error"])
+        try:
+            try:
+                task_code = code if compiled_code is None else compiled_code
+                # off the event loop, as sending pickles items for the worker
+                subprocess_items = TaskExecutor._to_subprocess_items(items)
+                await asyncio.to_thread(
+                    task_conn.send, (task_code, node_mode, subprocess_items)
+                )
+            except (OSError, EOFError) as e:
+                await asyncio.to_thread(TaskExecutor.stop_process, process)
+                raise TaskSubprocessFailedError(-1, e)
 
-            if "result" not in returned:
-                raise TaskResultMissingError()
+            try:
+                await asyncio.wait_for(asyncio.shield(reading), task_timeout)
+            except TimeoutError:
+                await asyncio.to_thread(TaskExecutor.stop_process, process)
+                raise TaskTimeoutError(task_timeout)
 
-            result = returned["result"]
-            print_args = returned.get("print_args", [])
-            assert pipe_reader.message_size is not None
-            result_size_bytes = pipe_reader.message_size
+            # worker exited without reporting, so its exit code tells why
+            if pipe_reader.pipe_message is None and await TaskExecutor._wait_for_exit(
+                process, timeout=1
+            ):
+                TaskExecutor._raise_for_exit_code(process)
 
-            return result, print_args, result_size_bytes
+            TaskExecutor._record_usage(pipe_reader, stats)
+            return TaskExecutor._get_returned(pipe_reader)
 
         except Exception as e:
+            if not isinstance(e, TaskRuntimeError):
+                await asyncio.to_thread(TaskExecutor.stop_process, process)
             if continue_on_fail:
-                return [{"json": {"error": str(e)}}], print_args, 0
+                return [{"json": {"error": str(e)}}], [], 0
             raise
 
+        finally:
+            pipe_reader.close()
+            await reading
+
+    @staticmethod
+    async def _wait_for_exit(process: ForkServerProcess, timeout: float) -> bool:
+        """Wait for a subprocess to exit, returning whether it did within `timeout`.
+
+        Forkserver subprocesses are not children of the runner, so they cannot be
+        awaited by pid. Instead, the sentinel becomes readable once the forkserver
+        reports the exit status.
+        """
+
+        loop = asyncio.get_running_loop()
+        exited = loop.create_future()
+        sentinel = process.sentinel
+
+        def on_exit():
+            if not exited.done():
+                exited.set_result(None)
+
+        loop.add_reader(sentinel, on_exit)
+        try:
+            await asyncio.wait_for(exited, timeout)
+        except TimeoutError:
+            return False
+        finally:
+            loop.remove_reader(sentinel)
+
+        # sentinel is readable, so this reads the exit status without blocking
+        process.join()
+        return True
+
+    @staticmethod
+    def _raise_for_exit_code(process: ForkServerProcess):
+        if process.exitcode == SIGTERM_EXIT_CODE:
+            raise TaskCancelledError()
+
+        if process.exitcode == SIGKILL_EXIT_CODE:
+            raise TaskKilledError()
+
+        if process.exitcode == SIGXCPU_EXIT_CODE:
+            raise TaskResourceLimitError("cpu_time")
+
+        if process.exitcode == MEMORY_LIMIT_EXIT_CODE:
+            raise TaskResourceLimitError("memory")
+
+        if process.exitcode != 0:
+            assert process.exitcode is not None
+            raise TaskSubprocessFailedError(process.exitcode)
+
+    @staticmethod
+    def _record_usage(pipe_reader: PipeReader, stats: TaskStats | None) -> None:
+        if stats is None or pipe_reader.pipe_message is None:
+            return
+
+        stats.transfer_duration = pipe_reader.transfer_duration
+
+        usage = pipe_reader.pipe_message.get("usage")
+        if usage is not None:
+            stats.peak_rss = usage["peak_rss"]
+            stats.cpu_user = usage["cpu_user"]
+            stats.cpu_system = usage["cpu_system"]
+            stats.exec_duration = usage["exec_duration"]
+            stats.serialize_duration = usage["serialize_duration"]
+            stats.import_duration = usage["import_duration"]
+
+    @staticmethod
+    def _get_returned(
+        pipe_reader: PipeReader,
+    ) -> tuple[Items | RawItems, PrintArgs, int]:
+        if pipe_reader.error:
+            raise TaskResultReadError(pipe_reader.error)
+
+        if pipe_reader.pipe_message is None:
+            raise TaskResultMissingError()
+
+        returned = pipe_reader.pipe_message
+
+        if "error" in returned:
+            raise TaskRuntimeError(returned["error"])
+
+        if "result" not in returned:
+            raise TaskResultMissingError()
+
+        result = returned["result"]
+        print_args = returned.get("print_args", [])
+        assert pipe_reader.message_size is not None
+        result_size_bytes = pipe_reader.message_size
+
+        return result, print_args, result_size_bytes
+
     @staticmethod
     def stop_process(process: ForkServerProcess | None):
         """Stop a running subprocess, gracefully else force-killing."""
@@ -182,143 +437,385 @@ class TaskExecutor:
 
     @staticmethod
     def _all_items(
-        raw_code: str,
-        items: Items,
+        code: TaskCode,
+        items: Items | bytes | SharedItems,
         write_conn,
         security_config: SecurityConfig,
     ):
         """Execute a Python code task in all-items mode."""
 
+        TaskExecutor._init_sandbox(security_config)
+        TaskExecutor._set_cpu_time_limit(security_config.max_cpu_time)
+
+        write_fd = write_conn.fileno()
+        try:
+            TaskExecutor._run_all_items(
+                code,
+                items,
+                write_fd,
+                TaskExecutor._filter_builtins(security_config),
+            )
+        finally:
+            TaskExecutor._close_fd(write_fd)
+
+    @staticmethod
+    def _per_item(
+        code: TaskCode,
+        items: Items | bytes | SharedItems,
+        write_conn,
+        security_config: SecurityConfig,
+    ):
+        """Execute a Python code task in per-item mode."""
+
+        TaskExecutor._init_sandbox(security_config)
+        TaskExecutor._set_cpu_time_limit(security_config.max_cpu_time)
+
+        write_fd = write_conn.fileno()
+        try:
+            TaskExecutor._run_per_item(
+                code,
+                items,
+                write_fd,
+                TaskExecutor._filter_builtins(security_config),
+            )
+        finally:
+            TaskExecutor._close_fd(write_fd)
+
+    @staticmethod
+    def _worker(
+        task_conn,
+        write_conn,
+        security_config: SecurityConfig,
+        max_tasks: int,
+    ):
+        """Sandbox the worker once, then execute tasks received over the task pipe."""
+
+        TaskExecutor._init_sandbox(security_config)
+
+        write_fd = write_conn.fileno()
+        filtered_builtins = TaskExecutor._filter_builtins(security_config)
+        modules_snapshot = TaskExecutor._snapshot_modules() if max_tasks > 1 else None
+
+        for task_index in range(max_tasks):
+            try:
+                code, node_mode, items = task_conn.recv()
+            except EOFError:
+                break  # runner retired this worker
+
+            run = (
+                TaskExecutor._run_all_items
+                if node_mode == "all_items"
+                else TaskExecutor._run_per_item
+            )
+
+            TaskExecutor._set_cpu_time_limit(
+                security_config.max_cpu_time, tasks_left=max_tasks - task_index
+            )
+
+            # copy so that no task can tamper with builtins seen by later tasks
+            run(code, items, write_fd, dict(filtered_builtins))
+
+            if modules_snapshot is not None:
+                TaskExecutor._restore_modules(modules_snapshot)
+
+    @staticmethod
+    def _init_sandbox(security_config: SecurityConfig):
         if security_config.runner_env_deny:
             os.environ.clear()
 
         TaskExecutor._sanitize_sys_modules(security_config)
 
-        print_args: PrintArgs = []
+        if security_config.max_memory:
+            # lowering the hard limit too keeps user code from raising it again
+            resource.setrlimit(
+                resource.RLIMIT_AS,
+                (security_config.max_memory, security_config.max_memory),
+            )
+
+    @staticmethod
+    def _set_cpu_time_limit(max_cpu_time: int, tasks_left: int = 1):
+        """Allow the next task `max_cpu_time` seconds of CPU time, after which it gets SIGXCPU.
+
+        The limit counts the CPU time of the whole process, so for a worker it is
+        moved past the time used by earlier tasks.
+
+        The hard limit, past which the process gets SIGKILL, is lowered too, so
+        that user code cannot raise the soft limit away. As it can never be
+        raised again, a worker keeps it at the CPU time of all tasks it has
+        left, which makes it one second past the soft limit on its last task.
+        """
+
+        if not max_cpu_time:
+            return
+
+        usage = resource.getrusage(resource.RUSAGE_SELF)
+        # rounded up, as the limit is in whole seconds and must not cut the task short
+        used = math.ceil(usage.ru_utime + usage.ru_stime)
+        soft = used + max_cpu_time
+        hard = used + max_cpu_time * tasks_left + 1
+        _, current_hard = resource.getrlimit(resource.RLIMIT_CPU)
+        if current_hard != resource.RLIM_INFINITY:
+            hard = min(hard, current_hard)
+            soft = min(soft, hard)
+        resource.setrlimit(resource.RLIMIT_CPU, (soft, hard))
+
+    @staticmethod
+    def _is_memory_limited() -> bool:
+        soft, _ = resource.getrlimit(resource.RLIMIT_AS)
+        return soft != resource.RLIM_INFINITY
+
+    @staticmethod
+    def _run_all_items(
+        code: TaskCode,
+        items: Items | bytes | SharedItems,
+        write_fd: int,
+        filtered_builtins: dict,
+    ):
         sys.stderr = stderr_capture = io.StringIO()
+        writer = PipeWriter(write_fd)
+        print_stream = PrintStream(writer, TaskExecutor._format_print_args)
+        meter = UsageMeter()
+        is_memory_limited = TaskExecutor._is_memory_limited()
 
         try:
-            wrapped_code = TaskExecutor._wrap_code(raw_code)
-            compiled_code = compile(wrapped_code, EXECUTOR_ALL_ITEMS_FILENAME, "exec")
+            compiled_code = TaskExecutor._load_code(code, "all_items")
 
             globals = {
-                "__builtins__": TaskExecutor._filter_builtins(security_config),
-                "_items": items,
-                "print": TaskExecutor._create_custom_print(print_args),
+                "__builtins__": filtered_builtins,
+                "_items": TaskExecutor._resolve_items(items),
+                "print": TaskExecutor._create_custom_print(print_stream),
             }
 
+            # code opts into columnar mode by using `_columns`
+            is_columnar = TaskExecutor._uses_name(compiled_code, EXECUTOR_COLUMNS_NAME)
+            if is_columnar:
+                array_module = import_array_module(filtered_builtins["__import__"])
+                globals[EXECUTOR_COLUMNS_NAME] = to_columns(
+                    globals["_items"], array_module
+                )
+
+            meter.start_exec()
             exec(compiled_code, globals)
+            meter.stop_exec()
 
-            result = globals[EXECUTOR_USER_OUTPUT_KEY]
-            TaskExecutor._put_result(write_conn.fileno(), result, print_args)
+            result: Any = globals[EXECUTOR_USER_OUTPUT_KEY]
+            if is_columnar and isinstance(result, Mapping):
+                result = from_columns(result)
+
+            print_stream.close()
+            TaskExecutor._put_result(writer, result, meter)
 
         except BaseException as e:
-            TaskExecutor._put_error(
-                write_conn.fileno(), e, stderr_capture.getvalue(), print_args
-            )
+            if isinstance(e, MemoryError) and is_memory_limited:
+                # nothing more can be relied on to allocate, so the exit code reports it
+                os._exit(MEMORY_LIMIT_EXIT_CODE)
+
+            print_stream.close()
+            TaskExecutor._put_error(writer, e, stderr_capture.getvalue(), meter)
 
     @staticmethod
-    def _per_item(
-        raw_code: str,
-        items: Items,
-        write_conn,
-        security_config: SecurityConfig,
+    def _run_per_item(
+        code: TaskCode,
+        items: Items | bytes | SharedItems,
+        write_fd: int,
+        filtered_builtins: dict,
     ):
-        """Execute a Python code task in per-item mode."""
-
-        if security_config.runner_env_deny:
-            os.environ.clear()
-
-        TaskExecutor._sanitize_sys_modules(security_config)
-
-        print_args: PrintArgs = []
         sys.stderr = stderr_capture = io.StringIO()
+        writer = PipeWriter(write_fd)
+        print_stream = PrintStream(writer, TaskExecutor._format_print_args)
+        meter = UsageMeter()
+        is_memory_limited = TaskExecutor._is_memory_limited()
 
         try:
-            wrapped_code = TaskExecutor._wrap_code(raw_code)
-            compiled_code = compile(wrapped_code, EXECUTOR_PER_ITEM_FILENAME, "exec")
+            # defined once and called per item, instead of re-executed per item
+            function_code = TaskExecutor._load_code(code, "per_item")
 
-            filtered_builtins = TaskExecutor._filter_builtins(security_config)
-            custom_print = TaskExecutor._create_custom_print(print_args)
-
-            result: Items = []
-            for index, item in enumerate(items):
-                globals = {
-                    "__builtins__": filtered_builtins,
-                    "_item": item,
-                    "print": custom_print,
-                }
+            globals: dict[str, Any] = {
+                "__builtins__": filtered_builtins,
+                "print": TaskExecutor._create_custom_print(print_stream),
+            }
 
-                exec(compiled_code, globals)
+            exec(function_code, globals)
+
+            user_function: types.FunctionType = globals[EXECUTOR_USER_FUNCTION_NAME]
+            isolate_globals = TaskExecutor._writes_globals(user_function.__code__)
+
+            for index, item in enumerate(TaskExecutor._resolve_items(items)):
+                if isolate_globals:
+                    # code writing globals must not leak state across items
+                    item_globals: dict[str, Any] = {
+                        **globals,
+                        "_item": item,
+                        "print": TaskExecutor._create_custom_print(print_stream),
+                    }
+                    user_function = types.FunctionType(
+                        user_function.__code__, item_globals
+                    )
+                    item_globals[EXECUTOR_USER_FUNCTION_NAME] = user_function
+                else:
+                    globals["_item"] = item
 
-                user_output = globals[EXECUTOR_USER_OUTPUT_KEY]
+                meter.start_exec()
+                user_output = user_function()
+                meter.stop_exec()
 
                 if user_output is None:
                     continue
 
-                json_data = TaskExecutor._extract_json_data_per_item(user_output)
+                if isinstance(user_output, dict):
+                    if "json" in user_output:
+                        json_data = user_output["json"]
+                    elif "binary" in user_output:
+                        json_data = {
+                            k: v for k, v in user_output.items() if k != "binary"
+                        }
+                    else:
+                        json_data = user_output
 
-                output_item = {"json": json_data, "pairedItem": {"item": index}}
+                    output_item = {"json": json_data, "pairedItem": {"item": index}}
 
-                if isinstance(user_output, dict) and "binary" in user_output:
-                    output_item["binary"] = user_output["binary"]
+                    if "binary" in user_output:
+                        output_item["binary"] = user_output["binary"]
+                else:
+                    output_item = {"json": user_output, "pairedItem": {"item": index}}
 
-                result.append(output_item)
+                # streamed as produced, so output items are never held in full
+                writer.write_item(output_item)
 
-            TaskExecutor._put_result(write_conn.fileno(), result, print_args)
+            print_stream.close()
+            writer.end_result([], meter.usage(writer))
 
         except BaseException as e:
-            TaskExecutor._put_error(
-                write_conn.fileno(), e, stderr_capture.getvalue(), print_args
+            if isinstance(e, MemoryError) and is_memory_limited:
+                # nothing more can be relied on to allocate, so the exit code reports it
+                os._exit(MEMORY_LIMIT_EXIT_CODE)
+
+            print_stream.close()
+            TaskExecutor._put_error(writer, e, stderr_capture.getvalue(), meter)
+
+    @staticmethod
+    def _to_subprocess_items(
+        items: Items | RawItems | SharedItems,
+    ) -> Items | bytes | SharedItems:
+        # raw items cross as JSON bytes, as a sandboxed worker cannot import `RawItems` to unpickle them
+        if isinstance(items, RawItems):
+            return b"".join(items.to_json_parts())
+
+        return items
+
+    @staticmethod
+    def _resolve_items(items: Items | bytes | SharedItems) -> Items:
+        if isinstance(items, SharedItems):
+            return load_items(items)
+
+        if isinstance(items, bytes):
+            return json_codec.loads(items)
+
+        return items
+
+    @staticmethod
+    def compile_code(raw_code: str, node_mode: NodeMode) -> types.CodeType:
+        """Compile user code the way a subprocess executes it in the given node mode."""
+
+        if node_mode == "all_items":
+            return compile(
+                TaskExecutor._wrap_code(raw_code), EXECUTOR_ALL_ITEMS_FILENAME, "exec"
             )
 
+        return compile(
+            TaskExecutor._wrap_function(raw_code), EXECUTOR_PER_ITEM_FILENAME, "exec"
+        )
+
+    @staticmethod
+    def _load_code(code: TaskCode, node_mode: NodeMode) -> types.CodeType:
+        if isinstance(code, bytes):
+            return marshal.loads(code)
+
+        return TaskExecutor.compile_code(code, node_mode)
+
     @staticmethod
     def _wrap_code(raw_code: str) -> str:
+        wrapped_function = TaskExecutor._wrap_function(raw_code)
+        return f"{wrapped_function}\n{EXECUTOR_USER_OUTPUT_KEY} = {EXECUTOR_USER_FUNCTION_NAME}()"
+
+    @staticmethod
+    def _wrap_function(raw_code: str) -> str:
         indented_code = textwrap.indent(raw_code, "    ")
-        return f"def _user_function():\n{indented_code}\n\n{EXECUTOR_USER_OUTPUT_KEY} = _user_function()"
+        return f"def {EXECUTOR_USER_FUNCTION_NAME}():\n{indented_code}\n"
 
     @staticmethod
-    def _extract_json_data_per_item(user_output):
-        if not isinstance(user_output, dict):
-            return user_output
+    def _writes_globals(code: types.CodeType) -> bool:
+        """Whether user code, including nested functions, may write to its globals.
 
-        if "json" in user_output:
-            return user_output["json"]
+        Setting an attribute anywhere in code that also uses a global shared by
+        all items, e.g. `_user_function.calls = 1`, counts as a write too.
+        """
 
-        if "binary" in user_output:
-            return {k: v for k, v in user_output.items() if k != "binary"}
+        codes = TaskExecutor._nested_codes(code)
+        if any(not GLOBALS_ACCESS_NAMES.isdisjoint(c.co_names) for c in codes):
+            return True
 
-        return user_output
+        instructions = [
+            instruction for c in codes for instruction in dis.get_instructions(c)
+        ]
+        if any(
+            instruction.opname in GLOBALS_WRITE_OPCODES for instruction in instructions
+        ):
+            return True
+
+        loaded_globals = {
+            instruction.argval
+            for instruction in instructions
+            if instruction.opname in GLOBALS_READ_OPCODES
+        }
+        sets_attributes = not loaded_globals.isdisjoint(ATTRIBUTE_WRITE_NAMES) or any(
+            instruction.opname in ATTRIBUTE_WRITE_OPCODES
+            for instruction in instructions
+        )
+        return sets_attributes and not loaded_globals.isdisjoint(SHARED_GLOBAL_NAMES)
 
     @staticmethod
-    def _put_result(write_fd: int, result: Items, print_args: PrintArgs):
-        message: PipeResultMessage = {
-            "result": result,
-            "print_args": TaskExecutor._truncate_print_args(print_args),
-        }
+    def _nested_codes(code: types.CodeType) -> list[types.CodeType]:
+        """The code object and those of its nested functions, at any depth."""
 
-        data = json.dumps(message, default=str, ensure_ascii=False).encode("utf-8")
-        length_bytes = len(data).to_bytes(PIPE_MSG_PREFIX_LENGTH, "big")
+        codes = [code]
+        for const in code.co_consts:
+            if isinstance(const, types.CodeType):
+                codes.extend(TaskExecutor._nested_codes(const))
+        return codes
 
-        try:
-            TaskExecutor._write_bytes(write_fd, length_bytes)
-            TaskExecutor._write_bytes(write_fd, data)
-        finally:
-            try:
-                os.close(write_fd)
-            except Exception:
-                pass
+    @staticmethod
+    def _uses_name(code: types.CodeType, name: str) -> bool:
+        """Whether user code, including nested functions, loads a global named `name`.
+
+        Attributes of the same name, e.g. `self._columns`, do not count.
+        """
+
+        if name in code.co_names and any(
+            instruction.opname in GLOBALS_READ_OPCODES and instruction.argval == name
+            for instruction in dis.get_instructions(code)
+        ):
+            return True
+
+        return any(
+            TaskExecutor._uses_name(const, name)
+            for const in code.co_consts
+            if isinstance(const, types.CodeType)
+        )
+
+    @staticmethod
+    def _put_result(writer: PipeWriter, result: Items, meter: UsageMeter):
+        writer.write_items(result)
+        # print() output was streamed as called
+        writer.end_result([], meter.usage(writer))
 
     @staticmethod
     def _put_error(
-        write_fd: int,
+        writer: PipeWriter,
         e: BaseException,
         stderr: str = "",
-        print_args: PrintArgs | None = None,
+        meter: UsageMeter | None = None,
     ):
-        if print_args is None:
-            print_args = []
-
         task_error_info: TaskErrorInfo = {
             "message": f"Process exited with code {e.code}"
             if isinstance(e, SystemExit)
@@ -330,44 +827,19 @@ class TaskExecutor:
 
         message: PipeErrorMessage = {
             "error": task_error_info,
-            "print_args": TaskExecutor._truncate_print_args(print_args),
+            "print_args": [],
         }
+        if meter is not None:
+            message["usage"] = meter.usage(writer)
 
-        data = json.dumps(message, default=str, ensure_ascii=False).encode("utf-8")
-        length_bytes = len(data).to_bytes(PIPE_MSG_PREFIX_LENGTH, "big")
-
-        try:
-            TaskExecutor._write_bytes(write_fd, length_bytes)
-            TaskExecutor._write_bytes(write_fd, data)
-        finally:
-            try:
-                os.close(write_fd)
-            except Exception:
-                pass
+        writer.write_error(message)
 
     # ========== print() ==========
 
     @staticmethod
-    def _create_custom_print(print_args: PrintArgs):
+    def _create_custom_print(print_stream: PrintStream):
         def custom_print(*args):
-            serializable_args = []
-
-            for arg in args:
-                try:
-                    json.dumps(arg, default=str, ensure_ascii=False)
-                    serializable_args.append(arg)
-                except Exception as _:
-                    # Ensure args are serializable so they are transmissible
-                    # through the multiprocessing queue and via websockets.
-                    serializable_args.append(
-                        {
-                            EXECUTOR_CIRCULAR_REFERENCE_KEY: repr(arg),
-                            "__type__": type(arg).__name__,
-                        }
-                    )
-
-            formatted = TaskExecutor._format_print_args(*serializable_args)
-            print_args.append(formatted)
+            print_stream.write(*args)
             print("[user code]", *args)
 
         return custom_print
@@ -378,7 +850,9 @@ class TaskExecutor:
         Takes the args passed to a `print()` call in user code and converts them
         to string representations suitable for display in a browser console.
 
-        Expects all args to be serializable.
+        Each arg is encoded at most once. Args that cannot be serialized, e.g.
+        due to circular references, are shown as a placeholder so that they
+        remain transmissible through the pipe and via websockets.
         """
 
         formatted = []
@@ -390,31 +864,77 @@ class TaskExecutor:
             elif arg is None or isinstance(arg, (int, float, bool)):
                 formatted.append(str(arg))
 
-            elif isinstance(arg, dict) and EXECUTOR_CIRCULAR_REFERENCE_KEY in arg:
-                formatted.append(f"[Circular {arg.get('__type__', 'Object')}]")
-
             else:
-                formatted.append(json.dumps(arg, default=str, ensure_ascii=False))
+                try:
+                    formatted.append(json_codec.dumps(arg).decode("utf-8"))
+                except (TypeError, ValueError, RecursionError):
+                    formatted.append(f"[Circular {type(arg).__name__}]")
 
         return formatted
 
+    # ========== security ==========
+
     @staticmethod
-    def _truncate_print_args(print_args: PrintArgs) -> PrintArgs:
-        """Truncate print_args to prevent pipe buffer overflow."""
+    def _snapshot_modules() -> ModulesSnapshot:
+        """Record `sys.modules` and the attributes of every module and of the classes it defines."""
+
+        namespaces: list[tuple[object, dict[str, Any]]] = []
+        for module_name, module in sys.modules.items():
+            module_vars = getattr(module, "__dict__", None)
+            if not isinstance(module_vars, dict):
+                continue
+
+            namespaces.append((module, dict(module_vars)))
+            namespaces.extend(
+                (value, dict(vars(value)))
+                for value in module_vars.values()
+                if isinstance(value, type) and value.__module__ == module_name
+            )
 
-        if not print_args or len(print_args) <= MAX_PRINT_ARGS_ALLOWED:
-            return print_args
+        return dict(sys.modules), namespaces
 
-        truncated = print_args[:MAX_PRINT_ARGS_ALLOWED]
-        truncated.append(
-            [
-                f"[Output truncated - {len(print_args) - MAX_PRINT_ARGS_ALLOWED} more print statements]"
-            ]
-        )
+    @staticmethod
+    def _restore_modules(snapshot: ModulesSnapshot):
+        """Undo changes a task made to modules, so that a worker's next task sees them as the first did.
+
+        Attributes rebound, added or deleted on modules and their classes are
+        restored, and modules imported by the task are dropped. Objects mutated
+        in place are not tracked.
+        """
 
-        return truncated
+        modules, namespaces = snapshot
 
-    # ========== security ==========
+        for module_name in [name for name in sys.modules if name not in modules]:
+            del sys.modules[module_name]
+        sys.modules.update(modules)
+
+        for namespace, saved in namespaces:
+            is_module = isinstance(namespace, types.ModuleType)
+            current = vars(namespace)
+
+            for name in [name for name in current if name not in saved]:
+                if is_module:
+                    del current[name]
+                else:
+                    TaskExecutor._restore_attribute(namespace, name, _MISSING)
+
+            for name, value in saved.items():
+                if current.get(name, _MISSING) is value:
+                    continue
+                if is_module:
+                    current[name] = value
+                else:
+                    TaskExecutor._restore_attribute(namespace, name, value)
+
+    @staticmethod
+    def _restore_attribute(namespace: object, name: str, value: object):
+        try:
+            if value is _MISSING:
+                delattr(namespace, name)
+            else:
+                setattr(namespace, name, value)
+        except (AttributeError, TypeError):
+            pass  # read-only, so the task could not have changed it either
 
     @staticmethod
     def _filter_builtins(security_config: SecurityConfig):
@@ -485,17 +1005,19 @@ class TaskExecutor:
                     description=error_msg,
                 )
 
-            return original_import(name, *args, **kwargs)
+            import_start = time.perf_counter()
+            try:
+                return original_import(name, *args, **kwargs)
+            finally:
+                UsageMeter.record_import(time.perf_counter() - import_start)
 
         return safe_import
 
     # ========== pipe I/O ==========
 
     @staticmethod
-    def _write_bytes(fd: int, data: bytes):
-        total_written = 0
-        while total_written < len(data):
-            written = os.write(fd, data[total_written:])
-            if written == 0:
-                raise OSError("Write failed")
-            total_written += written
+    def _close_fd(fd: int):
+        try:
+            os.close(fd)
+        except OSError:
+            pass
@@ -1,14 +1,16 @@
 import asyncio
+import heapq
 import logging
+import math
 import time
+from collections import Counter
+from functools import partial
 from typing import Callable, Awaitable
-from dataclasses import dataclass
-from urllib.parse import urlparse
+from dataclasses import asdict, dataclass
 import websockets
-from websockets.exceptions import InvalidStatus
-from websockets.asyncio.client import ClientConnection
+from websockets.exceptions import InvalidStatus, WebSocketException
 import random
-from src.errors import TaskCancelledError
+from src.errors import TaskCancelledError, TaskTimeoutError
 
 
 from src.config.task_runner_config import TaskRunnerConfig
@@ -17,24 +19,46 @@ from src.errors import (
     TaskMissingError,
     WebsocketConnectionError,
 )
-from src.message_types.broker import TaskSettings
+from src.message_types.broker import Items, TaskSettings
 from src.nanoid import nanoid
 
 from src.constants import (
     RUNNER_NAME,
     TASK_REJECTED_REASON_AT_CAPACITY,
     TASK_REJECTED_REASON_OFFER_EXPIRED,
+    TASK_REJECTED_REASON_SATURATED,
+    TASK_REJECTED_REASON_SHUTTING_DOWN,
     TASK_TYPE_PYTHON,
     OFFER_INTERVAL,
+    OFFER_MIN_INTERVAL,
+    OFFER_ACCEPT_LATENCY_SMOOTHING,
     OFFER_VALIDITY,
     OFFER_VALIDITY_MAX_JITTER,
     OFFER_VALIDITY_LATENCY_BUFFER,
-    TASK_BROKER_WS_PATH,
     RPC_BROWSER_CONSOLE_LOG_METHOD,
+    SEND_QUEUE_FLUSH_TIMEOUT,
     LOG_TASK_COMPLETE,
     LOG_TASK_CANCEL,
     LOG_TASK_CANCEL_UNKNOWN,
     LOG_TASK_CANCEL_WAITING,
+    LOG_TASK_CANCEL_QUEUED,
+    LOG_RESULTS_DROPPED,
+    LOG_RESULTS_REPLAYED,
+    LOG_TASK_QUEUE_TIMEOUT,
+    LOG_TASK_QUEUED,
+    LOG_SHARED_MEMORY_UNAVAILABLE,
+    LOG_MODULES_PRELOADED,
+    REJECTION_LABEL_AT_CAPACITY,
+    REJECTION_LABEL_OFFER_EXPIRED,
+    REJECTION_LABEL_SATURATED,
+    STOP_LABEL_CANCEL,
+    CACHE_LABEL_HIT,
+    CACHE_LABEL_MISS,
+    STOP_LABEL_SHUTDOWN,
+    TASK_OUTCOME_CANCELLED,
+    TASK_OUTCOME_ERROR,
+    TASK_OUTCOME_SUCCESS,
+    TASK_OUTCOME_TIMEOUT,
 )
 from src.message_types import (
     BrokerMessage,
@@ -54,9 +78,18 @@ from src.message_types import (
     RunnerRpcCall,
 )
 from src.message_serde import MessageSerde
+from src.broker_connection import BrokerConnection
+from src.metrics import Metrics
 from src.task_state import TaskState, TaskStatus
 from src.task_executor import TaskExecutor
-from src.task_analyzer import TaskAnalyzer
+from src.task_analyzer import TaskAnalyzer, validation_rules_fingerprint
+from src.code_cache import CodeCache
+from src.validation_cache import PersistentValidationCache
+from src.worker_pool import Worker, WorkerPool
+from src.workflow_scheduler import QueuedTask, WorkflowScheduler
+from src.concurrency_tuner import ConcurrencyTuner
+from src.shared_items import SharedItems, share_items
+from src.raw_items import RawItems
 from src.config.security_config import SecurityConfig
 
 
@@ -64,6 +97,8 @@ from src.config.security_config import SecurityConfig
 class TaskOffer:
     offer_id: str
     valid_until: float
+    sent_at: float
+    connection: BrokerConnection
 
     @property
     def has_expired(self) -> bool:
@@ -74,16 +109,36 @@ class TaskRunner:
     def __init__(
         self,
         config: TaskRunnerConfig,
+        metrics: Metrics | None = None,
     ):
         self.runner_id = nanoid()
         self.name = RUNNER_NAME
         self.config = config
 
-        self.websocket_connection: ClientConnection | None = None
+        self.connections = [
+            BrokerConnection(uri, self.runner_id) for uri in config.task_broker_uris
+        ]
         self.can_send_offers = False
 
         self.open_offers: dict[str, TaskOffer] = {}
+        self.offer_expiries: list[
+            tuple[float, str]
+        ] = []  # heap of (valid_until, offer_id)
+        self.offers_wakeup = asyncio.Event()
+        self.offer_accept_latency: float | None = None  # moving average, seconds
+        self.last_offers_round = 0.0
         self.running_tasks: dict[str, TaskState] = {}
+        self.scheduler = WorkflowScheduler(
+            max_per_workflow=config.workflow_max_concurrency,
+            max_queued=config.max_queued_tasks,
+            max_queued_bytes=config.max_queued_bytes,
+            weights=config.workflow_weights,
+        )
+        self.concurrency_tuner = (
+            ConcurrencyTuner(config.min_concurrency, config.max_concurrency)
+            if config.concurrency_auto
+            else None
+        )
 
         self.offers_coroutine: asyncio.Task | None = None
         self.serde = MessageSerde()
@@ -93,40 +148,112 @@ class TaskRunner:
             external_allow=config.external_allow,
             builtins_deny=config.builtins_deny,
             runner_env_deny=config.env_deny,
+            max_memory=config.task_max_memory,
+            max_cpu_time=config.task_max_cpu_time,
+        )
+        self.validation_cache = (
+            PersistentValidationCache(
+                config.validation_cache_path,
+                config.validation_cache_size,
+                validation_rules_fingerprint(),
+            )
+            if config.is_validation_cache_enabled
+            else None
+        )
+        self.analyzer = TaskAnalyzer(self.security_config, self.validation_cache)
+        self.code_cache = (
+            CodeCache(config.code_cache_size) if config.is_code_cache_enabled else None
         )
-        self.analyzer = TaskAnalyzer(self.security_config)
+        self.worker_pool = (
+            WorkerPool(
+                size=config.worker_pool_size,
+                max_tasks=config.worker_max_tasks,
+                max_memory_growth=config.worker_max_memory_growth,
+                security_config=self.security_config,
+            )
+            if config.is_worker_pool_enabled
+            else None
+        )
+        self.background_tasks: set[asyncio.Task] = set()
         self.logger = logging.getLogger(__name__)
 
+        self.metrics = metrics or Metrics()
+        self.metrics.running_tasks.set_function(lambda: self.running_tasks_count)
+        self.metrics.connected_brokers.set_function(
+            lambda: len(self.registered_connections)
+        )
+        self.metrics.max_concurrency.set_function(
+            lambda: (
+                self.concurrency_tuner.target
+                if self.concurrency_tuner
+                else self.config.max_concurrency
+            )
+        )
+        self.metrics.queued_tasks.set_function(lambda: self.scheduler.queued_count)
+        self.metrics.open_offers.set_function(lambda: len(self.open_offers))
+        self.metrics.offer_accept_latency.set_function(
+            lambda: self.offer_accept_latency or 0
+        )
+        if self.worker_pool:
+            worker_pool = self.worker_pool
+            self.metrics.idle_workers.set_function(lambda: worker_pool.idle_count)
+
         self.idle_coroutine: asyncio.Task | None = None
         self.on_idle_timeout: Callable[[], Awaitable[None]] | None = None
         self.last_activity_time = time.time()
         self.is_shutting_down = False
 
-        self.task_broker_uri = config.task_broker_uri
-        websocket_host = urlparse(config.task_broker_uri).netloc
-        self.websocket_url = (
-            f"ws://{websocket_host}{TASK_BROKER_WS_PATH}?id={self.runner_id}"
-        )
-
     @property
     def running_tasks_count(self) -> int:
-        return len(self.running_tasks)
+        # queued tasks give up their slot, so other workflows can use it
+        return len(self.running_tasks) - self.scheduler.queued_count
+
+    @property
+    def registered_connections(self) -> list[BrokerConnection]:
+        return [c for c in self.connections if c.is_registered]
 
     async def start(self) -> None:
         if self.config.is_auto_shutdown_enabled and not self.on_idle_timeout:
             raise NoIdleTimeoutHandlerError(self.config.auto_shutdown_timeout)
 
+        if self.config.preload_modules:
+            preloaded = self.executor.preload_modules(self.security_config)
+            if preloaded:
+                self.logger.info(
+                    LOG_MODULES_PRELOADED.format(modules=", ".join(preloaded))
+                )
+
+        if self.worker_pool:
+            await asyncio.to_thread(self.worker_pool.start)
+
+        connection_coroutines = [
+            asyncio.create_task(self._run_connection(connection))
+            for connection in self.connections
+        ]
+
+        try:
+            await asyncio.gather(*connection_coroutines)
+        finally:
+            for coroutine in connection_coroutines:
+                await self._cancel_coroutine(coroutine)
+
+    async def _run_connection(self, connection: BrokerConnection) -> None:
+        """Keep a connection to one broker open until shutdown, reconnecting with backoff."""
+
         headers = {"Authorization": f"Bearer {self.config.grant_token}"}
 
         while not self.is_shutting_down:
             try:
-                self.websocket_connection = await websockets.connect(
-                    self.websocket_url,
+                connection.websocket = await websockets.connect(
+                    connection.websocket_url,
                     additional_headers=headers,
                     max_size=self.config.max_payload_size,
                 )
-                self.logger.info("Connected to broker")
-                await self._listen_for_messages()
+                self.logger.info(f"Connected to broker at {connection.uri}")
+                connection.sender_coroutine = asyncio.create_task(
+                    self._send_queued_messages_loop(connection)
+                )
+                await self._listen_for_messages(connection)
 
             except InvalidStatus as e:
                 if e.response.status_code == 403:
@@ -134,16 +261,36 @@ class TaskRunner:
                         f"Authentication failed with status {e.response.status_code}: {e}"
                     )
                     raise
-                self.logger.warning(f"Failed to connect to broker: {e} - retrying...")
+                self.logger.warning(
+                    f"Failed to connect to broker at {connection.uri}: {e} - retrying..."
+                )
             except Exception as e:
-                self.logger.warning(f"Failed to connect to broker: {e} - retrying...")
+                self.logger.warning(
+                    f"Failed to connect to broker at {connection.uri}: {e} - retrying..."
+                )
 
             if not self.is_shutting_down:
-                self.websocket_connection = None
-                self.can_send_offers = False
-                await self._cancel_coroutine(self.offers_coroutine)
-                await self._cancel_coroutine(self.idle_coroutine)
-                await asyncio.sleep(5)
+                await self._handle_disconnect(connection)
+                await asyncio.sleep(connection.get_reconnect_delay())
+
+    async def _handle_disconnect(self, connection: BrokerConnection) -> None:
+        connection.websocket = None
+        connection.is_registered = False
+        await self._cancel_coroutine(connection.sender_coroutine)
+        self._clear_send_queue(connection)
+
+        # offers made through a closed connection can no longer be accepted
+        for offer_id, offer in list(self.open_offers.items()):
+            if offer.connection is connection:
+                del self.open_offers[offer_id]
+
+        if self.registered_connections:
+            self._wake_offers_loop()
+            return
+
+        self.can_send_offers = False
+        await self._cancel_coroutine(self.offers_coroutine)
+        await self._cancel_coroutine(self.idle_coroutine)
 
     async def _cancel_coroutine(self, coroutine: asyncio.Task | None) -> None:
         if coroutine and not coroutine.done():
@@ -162,15 +309,45 @@ class TaskRunner:
         await self._cancel_coroutine(self.offers_coroutine)
         await self._cancel_coroutine(self.idle_coroutine)
 
+        self._reject_queued_tasks()
         await self._wait_for_tasks()
         await self._terminate_tasks()
 
-        if self.websocket_connection:
-            await self.websocket_connection.close()
-            self.logger.info("Disconnected from broker")
+        if self.worker_pool:
+            await asyncio.to_thread(self.worker_pool.shutdown)
+
+        self.analyzer.shutdown()
+
+        if self.validation_cache:
+            self.validation_cache.close()
+
+        for connection in self.connections:
+            await self._flush_send_queue(connection)
+            await self._cancel_coroutine(connection.sender_coroutine)
+
+            if connection.pending_results:
+                self.logger.warning(
+                    f"Discarding {len(connection.pending_results)} task results not sent to broker at {connection.uri}"
+                )
+
+            if connection.websocket:
+                await connection.websocket.close()
+                self.logger.info(f"Disconnected from broker at {connection.uri}")
 
         self.logger.info("Runner stopped")
 
+    def _reject_queued_tasks(self) -> None:
+        for queued in self.scheduler.drain():
+            task_state = self.running_tasks.pop(queued.task_id, None)
+            if task_state:
+                task_state.stop_queue_timer()
+            connection = task_state.connection if task_state else None
+            if connection and connection.is_registered:
+                error = {"message": TASK_REJECTED_REASON_SHUTTING_DOWN}
+                self._queue_messages(
+                    [RunnerTaskError(task_id=queued.task_id, error=error)], connection
+                )
+
     async def _wait_for_tasks(self):
         if not self.running_tasks:
             return
@@ -202,37 +379,51 @@ class TaskRunner:
         ]
 
         if tasks_to_terminate:
+            self.metrics.subprocesses_stopped.inc(
+                STOP_LABEL_SHUTDOWN, amount=len(tasks_to_terminate)
+            )
             await asyncio.gather(*tasks_to_terminate, return_exceptions=True)
 
+        for task_state in self.running_tasks.values():
+            task_state.release_resources()
+
         self.running_tasks.clear()
 
         self.logger.warning("Terminated tasks")
 
     # ========== Messages ==========
 
-    async def _listen_for_messages(self) -> None:
-        if self.websocket_connection is None:
-            raise WebsocketConnectionError(self.task_broker_uri)
+    async def _listen_for_messages(self, connection: BrokerConnection) -> None:
+        if connection.websocket is None:
+            raise WebsocketConnectionError(connection.uri)
+
+        while True:
+            try:
+                # as bytes, so that task settings can be parsed without decoding all of it
+                raw_message = await connection.websocket.recv(decode=False)
+            except websockets.ConnectionClosedOK:
+                break
 
-        async for raw_message in self.websocket_connection:
             try:
                 message = self.serde.deserialize_broker_message(raw_message)
-                await self._handle_message(message)
+                await self._handle_message(message, connection, len(raw_message))
             except websockets.ConnectionClosedOK:
                 break
             except Exception as e:
                 self.logger.error(f"Error handling message: {e}")
 
-    async def _handle_message(self, message: BrokerMessage) -> None:
+    async def _handle_message(
+        self, message: BrokerMessage, connection: BrokerConnection, message_size: int
+    ) -> None:
         match message:
             case BrokerInfoRequest():
-                await self._handle_info_request()
+                await self._handle_info_request(connection)
             case BrokerRunnerRegistered():
-                await self._handle_runner_registered()
+                await self._handle_runner_registered(connection)
             case BrokerTaskOfferAccept():
-                await self._handle_task_offer_accept(message)
+                await self._handle_task_offer_accept(message, connection)
             case BrokerTaskSettings():
-                await self._handle_task_settings(message)
+                await self._handle_task_settings(message, message_size)
             case BrokerTaskCancel():
                 await self._handle_task_cancel(message)
             case BrokerRpcResponse():
@@ -240,46 +431,67 @@ class TaskRunner:
             case _:
                 self.logger.warning(f"Unhandled message type: {type(message)}")
 
-    async def _handle_info_request(self) -> None:
+    async def _handle_info_request(self, connection: BrokerConnection) -> None:
         response = RunnerInfo(name=self.name, types=[TASK_TYPE_PYTHON])
-        await self._send_message(response)
+        await self._send_message(response, connection)
+
+    async def _handle_runner_registered(self, connection: BrokerConnection) -> None:
+        connection.is_registered = True
+        connection.reconnect_attempts = 0
+        self.logger.info(f"Registered with broker at {connection.uri}")
+        self._replay_results(connection)
+
+        if self.offers_coroutine is None or self.offers_coroutine.done():
+            self.can_send_offers = True
+            self.offers_coroutine = asyncio.create_task(self._send_offers_loop())
+        else:
+            self._wake_offers_loop()
 
-    async def _handle_runner_registered(self) -> None:
-        self.can_send_offers = True
-        self.offers_coroutine = asyncio.create_task(self._send_offers_loop())
-        self.logger.info("Registered with broker")
         self._reset_idle_timer()
 
-    async def _handle_task_offer_accept(self, message: BrokerTaskOfferAccept) -> None:
+    async def _handle_task_offer_accept(
+        self, message: BrokerTaskOfferAccept, connection: BrokerConnection
+    ) -> None:
         offer = self.open_offers.get(message.offer_id)
 
-        if offer is None or offer.has_expired:
+        if offer is None or offer.has_expired or offer.connection is not connection:
             response = RunnerTaskRejected(
                 task_id=message.task_id,
                 reason=TASK_REJECTED_REASON_OFFER_EXPIRED,
             )
-            await self._send_message(response)
+            await self._send_message(response, connection)
+            self.metrics.tasks_rejected.inc(REJECTION_LABEL_OFFER_EXPIRED)
             return
 
-        if self.running_tasks_count >= self.config.max_concurrency:
+        if self.running_tasks_count >= self._get_max_concurrency():
             response = RunnerTaskRejected(
                 task_id=message.task_id,
                 reason=TASK_REJECTED_REASON_AT_CAPACITY,
             )
-            await self._send_message(response)
+            await self._send_message(response, connection)
+            self.metrics.tasks_rejected.inc(REJECTION_LABEL_AT_CAPACITY)
             return
 
         del self.open_offers[message.offer_id]
+        self.metrics.offers_accepted.inc()
+        self._record_accept_latency(time.time() - offer.sent_at)
 
         task_state = TaskState(message.task_id)
+        task_state.connection = connection
         self.running_tasks[message.task_id] = task_state
 
         response = RunnerTaskAccepted(task_id=message.task_id)
-        await self._send_message(response)
-        self.logger.info(f"Accepted task {message.task_id}")
+        await self._send_message(response, connection)
+        self.logger.info(
+            "Accepted task %s",
+            message.task_id,
+            extra=self._get_log_fields(message.task_id),
+        )
         self._reset_idle_timer()
 
-    async def _handle_task_settings(self, message: BrokerTaskSettings) -> None:
+    async def _handle_task_settings(
+        self, message: BrokerTaskSettings, message_size: int = 0
+    ) -> None:
         task_state = self.running_tasks.get(message.task_id)
         if task_state is None:
             raise TaskMissingError(message.task_id)
@@ -295,12 +507,98 @@ class TaskRunner:
         task_state.node_name = message.settings.node_name
         task_state.node_id = message.settings.node_id
 
+        self.logger.info(
+            "Received task %s",
+            message.task_id,
+            extra=self._get_log_fields(message.task_id, task_state),
+        )
+
+        if self.scheduler.can_start(task_state.workflow_id):
+            self._start_task(task_state, message.settings)
+        else:
+            self._queue_task(task_state, message.settings, message_size)
+
+    def _start_task(self, task_state: TaskState, task_settings: TaskSettings) -> None:
+        task_state.stop_queue_timer()
+        self.scheduler.started(task_state.workflow_id)
         task_state.status = TaskStatus.RUNNING
-        asyncio.create_task(self._execute_task(message.task_id, message.settings))
-        self.logger.info(f"Received task {message.task_id}")
+        asyncio.create_task(self._execute_task(task_state.task_id, task_settings))
+
+    def _queue_task(
+        self, task_state: TaskState, task_settings: TaskSettings, size: int
+    ) -> None:
+        task_id = task_state.task_id
+        queued = QueuedTask(task_id, task_settings, size)
+
+        if not self.scheduler.enqueue(task_state.workflow_id, queued):
+            error = {"message": TASK_REJECTED_REASON_SATURATED}
+            response = RunnerTaskError(task_id=task_id, error=error)
+            self._queue_task_messages(task_id, [response])
+            self.running_tasks.pop(task_id, None)
+            self.metrics.tasks_rejected.inc(REJECTION_LABEL_SATURATED)
+            self._wake_offers_loop()
+            return
+
+        task_state.status = TaskStatus.QUEUED
+        # the task timeout runs from here, so that a task cannot wait in the queue forever
+        task_state.queued_at = time.monotonic()
+        task_state.queue_timer = asyncio.get_running_loop().call_later(
+            self.config.task_timeout, self._expire_queued_task, task_id
+        )
+        self.logger.info(
+            LOG_TASK_QUEUED.format(
+                task_id=task_id,
+                running=self.config.workflow_max_concurrency,
+                **task_state.context(),
+            ),
+            extra=self._get_log_fields(task_id, task_state),
+        )
+        self._wake_offers_loop()
+
+    def _expire_queued_task(self, task_id: str) -> None:
+        task_state = self.running_tasks.get(task_id)
+        if task_state is None or not self.scheduler.remove(task_id):
+            return
+
+        task_state.queue_timer = None
+        self.logger.warning(
+            LOG_TASK_QUEUE_TIMEOUT.format(task_id=task_id),
+            extra=self._get_log_fields(task_id, task_state),
+        )
+        error = {"message": str(TaskTimeoutError(self.config.task_timeout))}
+        self._queue_task_messages(
+            task_id, [RunnerTaskError(task_id=task_id, error=error)]
+        )
+        self.running_tasks.pop(task_id, None)
+        self.metrics.tasks.inc(TASK_OUTCOME_TIMEOUT)
+        self._wake_offers_loop()
+
+    def _get_task_timeout(self, task_state: TaskState) -> int:
+        """Seconds left of the task timeout, which runs from when the task was queued."""
+
+        if task_state.queued_at is None:
+            return self.config.task_timeout
+
+        waited = time.monotonic() - task_state.queued_at
+        return max(math.ceil(self.config.task_timeout - waited), 1)
+
+    def _start_queued_tasks(self) -> None:
+        while (
+            not self.is_shutting_down
+            and self.running_tasks_count < self._get_max_concurrency()
+        ):
+            queued = self.scheduler.next_task()
+            if queued is None:
+                return
+
+            task_state = self.running_tasks.get(queued.task_id)
+            if task_state is not None:
+                self._start_task(task_state, queued.settings)
 
     async def _execute_task(self, task_id: str, task_settings: TaskSettings) -> None:
         start_time = time.time()
+        worker: Worker | None = None
+        outcome = TASK_OUTCOME_ERROR
 
         try:
             task_state = self.running_tasks.get(task_id)
@@ -308,67 +606,196 @@ class TaskRunner:
             if task_state is None:
                 raise TaskMissingError(task_id)
 
-            self.analyzer.validate(task_settings.code)
+            await self.analyzer.validate_async(task_settings.code)
 
-            process, read_conn, write_conn = self.executor.create_process(
-                code=task_settings.code,
-                node_mode=task_settings.node_mode,
-                items=task_settings.items,
-                security_config=self.security_config,
-            )
+            compiled_code = await self._get_compiled_code(task_settings)
 
-            task_state.process = process
+            items: Items | RawItems | SharedItems = task_settings.items
+            if self.config.shared_memory_items and items:
+                items = await self._share_items(task_state, items)
 
-            result, print_args, result_size_bytes = await asyncio.to_thread(
-                self.executor.execute_process,
-                process=process,
-                read_conn=read_conn,
-                write_conn=write_conn,
-                task_timeout=self.config.task_timeout,
-                pipe_reader_timeout=self.config.pipe_reader_timeout,
-                continue_on_fail=task_settings.continue_on_fail,
-            )
+            if self.worker_pool:
+                acquire_start = time.perf_counter()
+                worker = await asyncio.to_thread(
+                    self.worker_pool.acquire, task_state.workflow_id
+                )
+                task_state.stats.spawn_duration = time.perf_counter() - acquire_start
+                task_state.process = worker.process
+                self._run_in_background(self.worker_pool.replenish)
+
+                (
+                    result,
+                    print_args,
+                    result_size_bytes,
+                ) = await self.executor.execute_in_worker(
+                    process=worker.process,
+                    task_conn=worker.task_conn,
+                    read_conn=worker.read_conn,
+                    code=task_settings.code,
+                    node_mode=task_settings.node_mode,
+                    items=items,
+                    task_timeout=self._get_task_timeout(task_state),
+                    continue_on_fail=task_settings.continue_on_fail,
+                    compiled_code=compiled_code,
+                    on_print=partial(self._forward_print, task_id),
+                    stats=task_state.stats,
+                    raw_result=self.config.raw_results,
+                    max_payload_size=self.config.max_payload_size,
+                )
+            else:
+                process, read_conn, write_conn = self.executor.create_process(
+                    code=task_settings.code,
+                    node_mode=task_settings.node_mode,
+                    items=items,
+                    security_config=self.security_config,
+                    compiled_code=compiled_code,
+                )
 
-            for print_args_per_call in print_args:
-                await self._send_rpc_message(
-                    task_id, RPC_BROWSER_CONSOLE_LOG_METHOD, print_args_per_call
+                task_state.process = process
+
+                (
+                    result,
+                    print_args,
+                    result_size_bytes,
+                ) = await self.executor.execute_process(
+                    process=process,
+                    read_conn=read_conn,
+                    write_conn=write_conn,
+                    task_timeout=self._get_task_timeout(task_state),
+                    pipe_reader_timeout=self.config.pipe_reader_timeout,
+                    continue_on_fail=task_settings.continue_on_fail,
+                    stats=task_state.stats,
+                    on_print=partial(self._forward_print, task_id),
+                    raw_result=self.config.raw_results,
+                    max_payload_size=self.config.max_payload_size,
                 )
 
-            response = RunnerTaskDone(task_id=task_id, data={"result": result})
-            await self._send_message(response)
+            if task_state.stats.spawn_duration is not None:
+                self.metrics.subprocess_spawn.observe(task_state.stats.spawn_duration)
 
-            self.logger.info(
-                LOG_TASK_COMPLETE.format(
-                    task_id=task_id,
-                    duration=self._get_duration(start_time),
-                    result_size=self._get_result_size(result_size_bytes),
-                    **task_state.context(),
+            if task_state.stats.import_duration is not None:
+                self.metrics.task_imports.observe(task_state.stats.import_duration)
+
+            rpc_calls = [
+                self._create_rpc_call(
+                    task_id, RPC_BROWSER_CONSOLE_LOG_METHOD, print_args_per_call
+                )
+                for print_args_per_call in print_args
+            ]
+            response = RunnerTaskDone(task_id=task_id, data={"result": result})
+            self._queue_task_messages(task_id, [*rpc_calls, response])
+
+            outcome = TASK_OUTCOME_SUCCESS
+            self.metrics.task_duration.observe(time.time() - start_time)
+            self.metrics.task_result_size.observe(result_size_bytes)
+
+            if self.logger.isEnabledFor(logging.INFO):
+                self.logger.info(
+                    LOG_TASK_COMPLETE.format(
+                        task_id=task_id,
+                        duration=self._get_duration(start_time),
+                        result_size=self._get_result_size(result_size_bytes),
+                        peak_rss=self._get_peak_rss(task_state.stats.peak_rss),
+                        **task_state.context(),
+                    ),
+                    extra={
+                        **self._get_log_fields(task_id, task_state),
+                        "duration_ms": int((time.time() - start_time) * 1000),
+                        "result_bytes": result_size_bytes,
+                        "task_stats": asdict(task_state.stats),
+                    },
                 )
-            )
 
         except TaskCancelledError as e:
+            outcome = TASK_OUTCOME_CANCELLED
             response = RunnerTaskError(task_id=task_id, error={"message": str(e)})
-            await self._send_message(response)
+            self._queue_task_messages(task_id, [response])
 
         except SyntaxError as e:
-            self.logger.warning(f"Task {task_id} failed syntax validation")
+            self.logger.warning(
+                "Task %s failed syntax validation",
+                task_id,
+                extra=self._get_log_fields(task_id, self.running_tasks.get(task_id)),
+            )
             error = {"message": str(e)}
             response = RunnerTaskError(task_id=task_id, error=error)
-            await self._send_message(response)
+            self._queue_task_messages(task_id, [response])
 
         except Exception as e:
-            self.logger.error(f"Task {task_id} failed", exc_info=True)
+            if isinstance(e, TaskTimeoutError):
+                outcome = TASK_OUTCOME_TIMEOUT
+            self.logger.error(
+                "Task %s failed",
+                task_id,
+                exc_info=True,
+                extra=self._get_log_fields(task_id, self.running_tasks.get(task_id)),
+            )
             error = {
                 "message": getattr(e, "message", str(e)),
                 "description": getattr(e, "description", ""),
             }
             response = RunnerTaskError(task_id=task_id, error=error)
-            await self._send_message(response)
+            self._queue_task_messages(task_id, [response])
 
         finally:
-            self.running_tasks.pop(task_id, None)
+            self.metrics.tasks.inc(outcome)
+
+            task_state = self.running_tasks.pop(task_id, None)
+            if task_state:
+                task_state.release_resources()
+                self.metrics.recent_tasks.add(
+                    task_state, outcome, time.time() - start_time
+                )
+                self.scheduler.finished(task_state.workflow_id)
+                if self.concurrency_tuner:
+                    self.concurrency_tuner.record(
+                        task_state.stats, time.time() - start_time
+                    )
+            self._start_queued_tasks()
+            self._wake_offers_loop()
             self._reset_idle_timer()
 
+            if self.worker_pool and worker:
+                await asyncio.to_thread(self.worker_pool.release, worker)
+
+    async def _get_compiled_code(self, task_settings: TaskSettings) -> bytes | None:
+        if self.code_cache is None:
+            return None
+
+        cache_key = CodeCache.to_cache_key(task_settings.code, task_settings.node_mode)
+        compiled_code = self.code_cache.get(cache_key)
+
+        if compiled_code is not None:
+            self.metrics.code_cache_lookups.inc(CACHE_LABEL_HIT)
+            return compiled_code
+
+        self.metrics.code_cache_lookups.inc(CACHE_LABEL_MISS)
+
+        compiled_code = await asyncio.to_thread(
+            CodeCache.compile, task_settings.code, task_settings.node_mode
+        )
+        if compiled_code is not None:
+            self.code_cache.put(cache_key, compiled_code)
+
+        return compiled_code
+
+    async def _share_items(
+        self, task_state: TaskState, items: Items | RawItems
+    ) -> Items | RawItems | SharedItems:
+        try:
+            task_state.shared_memory, shared_items = await asyncio.to_thread(
+                share_items, items
+            )
+            return shared_items
+        except OSError as e:
+            self.logger.warning(LOG_SHARED_MEMORY_UNAVAILABLE.format(error=e))
+            return items
+
+    def _run_in_background(self, fn: Callable[[], None]) -> None:
+        task = asyncio.create_task(asyncio.to_thread(fn))
+        self.background_tasks.add(task)
+        task.add_done_callback(self.background_tasks.discard)
+
     async def _handle_task_cancel(self, message: BrokerTaskCancel) -> None:
         task_id = message.task_id
         task_state = self.running_tasks.get(task_id)
@@ -379,30 +806,158 @@ class TaskRunner:
 
         if task_state.status == TaskStatus.WAITING_FOR_SETTINGS:
             self.running_tasks.pop(task_id, None)
-            self.logger.info(LOG_TASK_CANCEL_WAITING.format(task_id=task_id))
-            await self._send_offers()
+            self.logger.info(
+                LOG_TASK_CANCEL_WAITING.format(task_id=task_id),
+                extra=self._get_log_fields(task_id),
+            )
+            self._wake_offers_loop()
+            return
+
+        if task_state.status == TaskStatus.QUEUED:
+            task_state.stop_queue_timer()
+            self.scheduler.remove(task_id)
+            self.running_tasks.pop(task_id, None)
+            self.logger.info(
+                LOG_TASK_CANCEL_QUEUED.format(task_id=task_id),
+                extra=self._get_log_fields(task_id, task_state),
+            )
+            self._wake_offers_loop()
             return
 
         if task_state.status == TaskStatus.RUNNING:
             task_state.status = TaskStatus.ABORTING
             await asyncio.to_thread(self.executor.stop_process, task_state.process)
+            self.metrics.subprocesses_stopped.inc(STOP_LABEL_CANCEL)
             self.logger.info(
-                LOG_TASK_CANCEL.format(task_id=task_id, **task_state.context())
+                LOG_TASK_CANCEL.format(task_id=task_id, **task_state.context()),
+                extra=self._get_log_fields(task_id, task_state),
             )
 
-    async def _send_rpc_message(self, task_id: str, method_name: str, params: list):
-        message = RunnerRpcCall(
+    def _create_rpc_call(
+        self, task_id: str, method_name: str, params: list
+    ) -> RunnerRpcCall:
+        return RunnerRpcCall(
             call_id=nanoid(), task_id=task_id, name=method_name, params=params
         )
 
-        await self._send_message(message)
+    def _forward_print(self, task_id: str, print_args: list[str]) -> None:
+        """Send the args of a print() call to the browser while the task is still running."""
+
+        task_state = self.running_tasks.get(task_id)
+        if task_state is None or task_state.connection is None:
+            return
 
-    async def _send_message(self, message: RunnerMessage) -> None:
-        if self.websocket_connection is None:
-            raise WebsocketConnectionError(self.task_broker_uri)
+        self._queue_messages(
+            [
+                self._create_rpc_call(
+                    task_id, RPC_BROWSER_CONSOLE_LOG_METHOD, print_args
+                )
+            ],
+            task_state.connection,
+        )
+
+    async def _send_message(
+        self, message: RunnerMessage, connection: BrokerConnection
+    ) -> None:
+        if connection.websocket is None:
+            raise WebsocketConnectionError(connection.uri)
 
         serialized = self.serde.serialize_runner_message(message)
-        await self.websocket_connection.send(serialized)
+        # UTF-8 bytes sent as a text frame as they are, without decoding to str
+        await connection.websocket.send(serialized, text=True)
+
+    def _queue_messages(
+        self, messages: list[RunnerMessage], connection: BrokerConnection
+    ) -> None:
+        """Queue task output for the connection's `sender_coroutine`, which sends it in order without the task waiting.
+
+        While the runner is not registered with the broker, task results are
+        held until it is, and other output is dropped.
+        """
+
+        for message in messages:
+            is_result = isinstance(message, (RunnerTaskDone, RunnerTaskError))
+            if not connection.is_registered and not is_result:
+                continue
+
+            serialized = self.serde.serialize_runner_message(message)
+            if connection.is_registered:
+                connection.send_queue.put_nowait((serialized, is_result))
+            else:
+                self._buffer_result(connection, serialized)
+
+    def _queue_task_messages(self, task_id: str, messages: list[RunnerMessage]) -> None:
+        """Queue task output for the broker that sent the task."""
+
+        task_state = self.running_tasks.get(task_id)
+        if task_state is None or task_state.connection is None:
+            # terminated on shutdown, so there is no broker left to tell
+            self.logger.warning(f"Discarding output of unknown task {task_id}")
+            return
+
+        self._queue_messages(messages, task_state.connection)
+
+    async def _send_queued_messages_loop(self, connection: BrokerConnection) -> None:
+        while True:
+            serialized, is_result = await connection.send_queue.get()
+            try:
+                if connection.websocket is None:
+                    raise WebsocketConnectionError(connection.uri)
+                await connection.websocket.send(serialized, text=True)
+            except asyncio.CancelledError:
+                if is_result:
+                    self._buffer_result(connection, serialized)
+                raise
+            except (WebSocketException, OSError) as e:
+                self.logger.error(f"Failed to send message: {e}")
+                if is_result:
+                    self._buffer_result(connection, serialized)
+            finally:
+                connection.send_queue.task_done()
+
+    async def _flush_send_queue(self, connection: BrokerConnection) -> None:
+        if connection.sender_coroutine is None or connection.sender_coroutine.done():
+            return
+
+        try:
+            await asyncio.wait_for(
+                connection.send_queue.join(), SEND_QUEUE_FLUSH_TIMEOUT
+            )
+        except TimeoutError:
+            self.logger.warning(
+                f"Timed out sending {connection.send_queue.qsize()} queued messages to {connection.uri}"
+            )
+
+    def _clear_send_queue(self, connection: BrokerConnection) -> None:
+        # results are held for the next connection, other output is stale by then
+        while not connection.send_queue.empty():
+            serialized, is_result = connection.send_queue.get_nowait()
+            if is_result:
+                self._buffer_result(connection, serialized)
+            connection.send_queue.task_done()
+
+    def _buffer_result(self, connection: BrokerConnection, serialized: bytes) -> None:
+        dropped = connection.buffer_result(serialized, self.config.result_buffer_size)
+        if dropped:
+            self.metrics.results_dropped.inc(amount=dropped)
+            self.logger.warning(
+                LOG_RESULTS_DROPPED.format(
+                    count=dropped,
+                    uri=connection.uri,
+                    size=self.config.result_buffer_size,
+                )
+            )
+
+    def _replay_results(self, connection: BrokerConnection) -> None:
+        results = connection.take_pending_results()
+        if not results:
+            return
+
+        self.logger.info(
+            LOG_RESULTS_REPLAYED.format(count=len(results), uri=connection.uri)
+        )
+        for serialized in results:
+            connection.send_queue.put_nowait((serialized, True))
 
     # ========== Formatting ==========
 
@@ -425,51 +980,132 @@ class TaskRunner:
         else:
             return f"{size_bytes / (1024 * 1024):.1f} MB"
 
+    def _get_log_fields(
+        self, task_id: str, task_state: TaskState | None = None
+    ) -> dict:
+        """Fields of a task log record, as keys of its JSON form."""
+
+        if task_state is None:
+            return {"task_id": task_id}
+
+        return {"task_id": task_id, **task_state.context()}
+
+    def _get_peak_rss(self, peak_rss: int | None) -> str:
+        return "unknown" if peak_rss is None else self._get_result_size(peak_rss)
+
     # ========== Offers ==========
 
     async def _send_offers_loop(self) -> None:
         while self.can_send_offers:
+            self.offers_wakeup.clear()
+
             try:
                 await self._send_offers()
-                await asyncio.sleep(OFFER_INTERVAL)
             except asyncio.CancelledError:
                 break
             except Exception as e:
                 self.logger.error(f"Error sending offers: {e}")
 
+            try:
+                await self._wait_for_offers_wakeup()
+            except asyncio.CancelledError:
+                break
+
+    def _wake_offers_loop(self) -> None:
+        """Re-offer right away when a slot frees up, instead of on the next offer expiry."""
+
+        self.offers_wakeup.set()
+
+    async def _wait_for_offers_wakeup(self) -> None:
+        """Sleep until a slot frees up or the earliest open offer expires.
+
+        Rounds are spaced by at least the broker's recent offer acceptance
+        latency, clamped to `OFFER_MIN_INTERVAL`..`OFFER_INTERVAL`, so that a
+        busy broker gets slots back quickly while bursts of freed slots on a
+        quiet one are coalesced into a single round.
+        """
+
+        timeout = (
+            self.offer_expiries[0][0] - time.time() if self.offer_expiries else None
+        )
+
+        try:
+            await asyncio.wait_for(self.offers_wakeup.wait(), timeout)
+        except TimeoutError:
+            pass
+
+        delay = self.last_offers_round + self._get_min_offer_interval()
+        delay -= time.monotonic()
+        if delay > 0:
+            await asyncio.sleep(delay)
+
+    def _get_min_offer_interval(self) -> float:
+        if self.offer_accept_latency is None:
+            return OFFER_MIN_INTERVAL
+
+        return min(max(self.offer_accept_latency, OFFER_MIN_INTERVAL), OFFER_INTERVAL)
+
+    def _get_max_concurrency(self) -> int:
+        if self.concurrency_tuner is None:
+            return self.config.max_concurrency
+
+        return self.concurrency_tuner.limit(self.running_tasks_count)
+
+    def _record_accept_latency(self, latency: float) -> None:
+        if self.offer_accept_latency is None:
+            self.offer_accept_latency = latency
+            return
+
+        self.offer_accept_latency += OFFER_ACCEPT_LATENCY_SMOOTHING * (
+            latency - self.offer_accept_latency
+        )
+
     async def _send_offers(self) -> None:
-        if not self.can_send_offers:
+        """Offer free slots, shared by all brokers, to the brokers holding the fewest open offers."""
+
+        connections = self.registered_connections
+        if not self.can_send_offers or not connections:
             return
 
-        expired_offer_ids = [
-            offer_id
-            for offer_id, offer in self.open_offers.items()
-            if offer.has_expired
-        ]
+        self.last_offers_round = time.monotonic()
 
-        for offer_id in expired_offer_ids:
+        # accepted offers leave stale heap entries, dropped here once past expiry
+        now = time.time()
+        while self.offer_expiries and self.offer_expiries[0][0] < now:
+            _, offer_id = heapq.heappop(self.offer_expiries)
             self.open_offers.pop(offer_id, None)
 
-        offers_to_send = self.config.max_concurrency - (
+        offers_to_send = self._get_max_concurrency() - (
             len(self.open_offers) + self.running_tasks_count
         )
 
+        open_offers_per_connection = Counter(
+            offer.connection for offer in self.open_offers.values()
+        )
+
         for _ in range(offers_to_send):
+            connection = min(connections, key=open_offers_per_connection.__getitem__)
+            open_offers_per_connection[connection] += 1
             offer_id = nanoid()
 
             valid_for_ms = OFFER_VALIDITY + random.randint(0, OFFER_VALIDITY_MAX_JITTER)
 
+            sent_at = time.time()
             valid_until = (
-                time.time() + (valid_for_ms / 1000) + OFFER_VALIDITY_LATENCY_BUFFER
+                sent_at + (valid_for_ms / 1000) + OFFER_VALIDITY_LATENCY_BUFFER
             )
 
-            self.open_offers[offer_id] = TaskOffer(offer_id, valid_until)
+            self.open_offers[offer_id] = TaskOffer(
+                offer_id, valid_until, sent_at, connection
+            )
+            heapq.heappush(self.offer_expiries, (valid_until, offer_id))
 
             message = RunnerTaskOffer(
                 offer_id=offer_id, task_type=TASK_TYPE_PYTHON, valid_for=valid_for_ms
             )
 
-            await self._send_message(message)
+            await self._send_message(message, connection)
+            self.metrics.offers_sent.inc()
 
     # ========== Inactivity ==========
 
@@ -1,32 +1,62 @@
+import asyncio
 from enum import Enum
-from dataclasses import dataclass
+from dataclasses import dataclass, field
 from multiprocessing.context import ForkServerProcess
+from multiprocessing.shared_memory import SharedMemory
+
+from src.broker_connection import BrokerConnection
+from src.shared_items import release_items
 
 
 class TaskStatus(Enum):
     WAITING_FOR_SETTINGS = "waiting_for_settings"
+    QUEUED = "queued"  # waiting for its workflow to be below its concurrency cap
     RUNNING = "running"
     ABORTING = "aborting"
 
 
+@dataclass
+class TaskStats:
+    """Measurements of a task, filled in as it runs."""
+
+    spawn_duration: float | None = None  # seconds to start or acquire a subprocess
+    exec_duration: float | None = None  # seconds in user code
+    import_duration: float | None = None  # seconds of it importing modules
+    serialize_duration: float | None = None  # seconds encoding the result
+    transfer_duration: float | None = None  # seconds from first result byte to last
+    peak_rss: int | None = None  # bytes, as reported by the subprocess
+    cpu_user: float | None = None  # seconds
+    cpu_system: float | None = None  # seconds
+
+
 @dataclass
 class TaskState:
     task_id: str
     status: TaskStatus
     process: ForkServerProcess | None = None
+    shared_memory: SharedMemory | None = None
+    stats: TaskStats = field(default_factory=TaskStats)
     workflow_name: str | None = None
     workflow_id: str | None = None
     node_name: str | None = None
     node_id: str | None = None
+    connection: BrokerConnection | None = None  # broker that sent the task
+    queued_at: float | None = None  # monotonic time the task was queued
+    queue_timer: asyncio.TimerHandle | None = None  # times out the task while queued
 
     def __init__(self, task_id: str):
         self.task_id = task_id
         self.status = TaskStatus.WAITING_FOR_SETTINGS
         self.process = None
+        self.shared_memory = None
+        self.stats = TaskStats()
         self.workflow_name = None
         self.workflow_id = None
         self.node_name = None
         self.node_id = None
+        self.connection = None
+        self.queued_at = None
+        self.queue_timer = None
 
     def context(self):
         return {
@@ -35,3 +65,13 @@ class TaskState:
             "workflow_name": self.workflow_name,
             "workflow_id": self.workflow_id,
         }
+
+    def stop_queue_timer(self):
+        if self.queue_timer is not None:
+            self.queue_timer.cancel()
+            self.queue_timer = None
+
+    def release_resources(self):
+        if self.shared_memory is not None:
+            release_items(self.shared_memory)
+            self.shared_memory = None
@@ -0,0 +1,47 @@
+import resource
+import time
+
+from src.message_types.pipe import TaskUsage
+from src.pipe_writer import PipeWriter
+
+
+class UsageMeter:
+    """Measures a task run from inside its subprocess, for the runner to report.
+
+    CPU time and import time count from when the meter is created, so a worker
+    reports only the task at hand. Peak RSS is that of the whole subprocess.
+    """
+
+    # seconds user code has spent importing modules in this subprocess
+    import_total = 0.0
+
+    def __init__(self):
+        self.exec_duration = 0.0  # seconds spent in user code
+        self._rusage_start = resource.getrusage(resource.RUSAGE_SELF)
+        self._import_start = UsageMeter.import_total
+        self._exec_start: float | None = None
+
+    @staticmethod
+    def record_import(duration: float) -> None:
+        UsageMeter.import_total += duration
+
+    def start_exec(self) -> None:
+        self._exec_start = time.perf_counter()
+
+    def stop_exec(self) -> None:
+        if self._exec_start is not None:
+            self.exec_duration += time.perf_counter() - self._exec_start
+            self._exec_start = None
+
+    def usage(self, writer: PipeWriter) -> TaskUsage:
+        self.stop_exec()  # user code raised, if still running
+        rusage = resource.getrusage(resource.RUSAGE_SELF)
+
+        return {
+            "peak_rss": rusage.ru_maxrss * 1024,  # kilobytes on Linux
+            "cpu_user": rusage.ru_utime - self._rusage_start.ru_utime,
+            "cpu_system": rusage.ru_stime - self._rusage_start.ru_stime,
+            "exec_duration": self.exec_duration,
+            "serialize_duration": writer.encode_duration,
+            "import_duration": UsageMeter.import_total - self._import_start,
+        }
@@ -0,0 +1,213 @@
+import json
+import logging
+import os
+import sqlite3
+import stat
+import threading
+import time
+
+from src.constants import (
+    LOG_VALIDATION_CACHE_ERROR,
+    VALIDATION_CACHE_BUSY_TIMEOUT,
+    VALIDATION_CACHE_TOUCH_INTERVAL,
+    VALIDATION_CACHE_TRIM_FRACTION,
+)
+
+CacheKey = tuple[str, tuple]  # (code_hash, allowlists_tuple)
+CachedViolations = list[str]
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS validations (
+    code_hash TEXT NOT NULL,
+    allowlists TEXT NOT NULL,
+    rules TEXT NOT NULL,
+    violations TEXT NOT NULL,
+    last_used REAL NOT NULL,
+    PRIMARY KEY (code_hash, allowlists, rules)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS validations_last_used ON validations (last_used);
+"""
+
+
+class PersistentValidationCache:
+    """Validation results stored in a local SQLite file, shared by all runners on a host.
+
+    Entries are evicted least recently used first once `max_size` is exceeded.
+    To keep hits read-only, a hit records its use only if the last one is over
+    `VALIDATION_CACHE_TOUCH_INTERVAL` old, and eviction runs once every so many
+    inserts, so the cache may briefly hold up to 10% more than `max_size`.
+
+    Results are keyed by `rules`, a fingerprint of the validation rules, so that
+    runners of another version neither see nor serve each other's results.
+
+    As anyone who can write to the file can mark any code as safe, the file is
+    created readable and writable by the runner's user only, its directory if
+    missing too, and a file or directory that other users can write to is not
+    used. SQLite creates its WAL files with the permissions of the file.
+
+    Any database error is logged and treated as a cache miss, so a broken
+    cache file only costs re-validation.
+
+    Each thread uses its own connection, so lookups can run on a thread pool.
+    """
+
+    def __init__(self, path: str, max_size: int, rules: str):
+        self.path = path
+        self.max_size = max_size
+        self.rules = rules
+        self.logger = logging.getLogger(__name__)
+        self._local = threading.local()
+        self._connections: set[sqlite3.Connection] = set()
+        self._connections_lock = threading.Lock()
+        self._inserts_until_trim = 0  # trims on the first insert
+
+    def get(self, cache_key: CacheKey) -> CachedViolations | None:
+        code_hash, allowlists = cache_key
+        key = (code_hash, json.dumps(allowlists), self.rules)
+
+        try:
+            connection = self._connect()
+            row = connection.execute(
+                "SELECT violations, last_used FROM validations "
+                "WHERE code_hash = ? AND allowlists = ? AND rules = ?",
+                key,
+            ).fetchone()
+
+            if row is None:
+                return None
+
+            now = time.time()
+            if now - row[1] >= VALIDATION_CACHE_TOUCH_INTERVAL:
+                with connection:
+                    connection.execute(
+                        "UPDATE validations SET last_used = ? "
+                        "WHERE code_hash = ? AND allowlists = ? AND rules = ?",
+                        (now, *key),
+                    )
+        except (sqlite3.Error, OSError) as e:
+            self._on_error(e)
+            return None
+
+        return json.loads(row[0])
+
+    def put(self, cache_key: CacheKey, violations: CachedViolations) -> None:
+        code_hash, allowlists = cache_key
+
+        try:
+            connection = self._connect()
+            with connection:
+                connection.execute(
+                    "INSERT OR REPLACE INTO validations VALUES (?, ?, ?, ?, ?)",
+                    (
+                        code_hash,
+                        json.dumps(allowlists),
+                        self.rules,
+                        json.dumps(violations),
+                        time.time(),
+                    ),
+                )
+
+                self._inserts_until_trim -= 1
+                if self._inserts_until_trim <= 0:
+                    self._trim(connection)
+        except (sqlite3.Error, OSError) as e:
+            self._on_error(e)
+
+    def _trim(self, connection: sqlite3.Connection) -> None:
+        """Evict least recently used entries over `max_size`, inserted by any runner."""
+
+        self._inserts_until_trim = max(
+            int(self.max_size * VALIDATION_CACHE_TRIM_FRACTION), 1
+        )
+
+        (size,) = connection.execute("SELECT COUNT(*) FROM validations").fetchone()
+        if size > self.max_size:
+            connection.execute(
+                "DELETE FROM validations WHERE (code_hash, allowlists, rules) IN ("
+                "SELECT code_hash, allowlists, rules FROM validations "
+                "ORDER BY last_used LIMIT ?)",
+                (size - self.max_size,),
+            )
+
+    def close(self) -> None:
+        """Close the connections of all threads."""
+
+        with self._connections_lock:
+            connections, self._connections = self._connections, set()
+            self._local = threading.local()
+
+        for connection in connections:
+            connection.close()
+
+    def _connect(self) -> sqlite3.Connection:
+        connection: sqlite3.Connection | None = getattr(self._local, "connection", None)
+
+        if connection is None:
+            self._create_private_file()
+
+            # only used by this thread, but may be closed by `close` from another one
+            connection = sqlite3.connect(
+                self.path,
+                timeout=VALIDATION_CACHE_BUSY_TIMEOUT,
+                check_same_thread=False,
+            )
+            try:
+                # WAL lets runners read while another one writes
+                connection.execute("PRAGMA journal_mode=WAL")
+                connection.execute("PRAGMA synchronous=NORMAL")
+                connection.executescript(SCHEMA)
+            except sqlite3.Error:
+                connection.close()
+                raise
+            with self._connections_lock:
+                self._connections.add(connection)
+                self._local.connection = connection
+
+        return connection
+
+    def _create_private_file(self) -> None:
+        """Create the file, and its directory, accessible to this user only.
+
+        Raises `PermissionError` if another user can write to an existing one.
+        """
+
+        directory = os.path.dirname(os.path.abspath(self.path))
+        os.makedirs(directory, mode=0o700, exist_ok=True)
+
+        fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o600)
+        try:
+            file_stat = os.fstat(fd)
+        finally:
+            os.close(fd)
+
+        directory_stat = os.stat(directory)
+        # others may write to a sticky directory, e.g. /tmp, but not replace our files
+        is_sticky = bool(directory_stat.st_mode & stat.S_ISVTX)
+
+        if not _is_private(file_stat) or not (is_sticky or _is_private(directory_stat)):
+            raise PermissionError(
+                f"Other users can write to the file or its directory: {self.path}"
+            )
+
+    def _on_error(self, e: sqlite3.Error | OSError) -> None:
+        self.logger.warning(LOG_VALIDATION_CACHE_ERROR.format(path=self.path, error=e))
+        self._disconnect()
+
+    def _disconnect(self) -> None:
+        """Close the connection of this thread, to reconnect on next use."""
+
+        with self._connections_lock:
+            connection = getattr(self._local, "connection", None)
+            if connection is None:
+                return
+            self._connections.discard(connection)
+            self._local.connection = None
+
+        connection.close()
+
+
+def _is_private(path_stat: os.stat_result) -> bool:
+    """Whether only this user, or root, can write to a file or directory."""
+
+    is_own = path_stat.st_uid in (os.geteuid(), 0)
+    return is_own and not path_stat.st_mode & (stat.S_IWGRP | stat.S_IWOTH)
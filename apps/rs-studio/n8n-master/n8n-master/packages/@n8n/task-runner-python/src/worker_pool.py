@@ -0,0 +1,220 @@
+import logging
+import os
+import threading
+from collections import deque
+from dataclasses import dataclass
+from multiprocessing.connection import Connection
+from multiprocessing.context import ForkServerProcess
+
+from src.config.security_config import SecurityConfig
+from src.constants import LOG_WORKER_RECYCLED, LOG_WORKER_SPAWN_FAILED
+from src.task_executor import TaskExecutor
+
+type PipeConnection = Connection
+
+PAGE_SIZE = os.sysconf("SC_PAGE_SIZE")
+
+
+@dataclass
+class Worker:
+    process: ForkServerProcess
+    task_conn: PipeConnection  # runner writes tasks
+    read_conn: PipeConnection  # runner reads results
+    tasks_run: int = 0
+    baseline_rss: int | None = None  # bytes
+    owner: str | None = None  # workflow of the tasks run, None while fresh
+
+
+class WorkerPool:
+    """Keeps a number of pre-forked, already-sandboxed subprocesses ready to execute tasks.
+
+    Workers are recycled after `max_tasks` tasks or once their memory grows by
+    more than `max_memory_growth` bytes. With `max_tasks=1` every task still runs
+    in a fresh subprocess, so isolation between tasks is the same as without the
+    pool, only the spawn cost is moved off the critical path.
+
+    With `max_tasks > 1`, a worker only runs further tasks of the workflow of its
+    first one, as isolation between them is weaker: module attributes are put back
+    after each task, but threads it started, objects it changed in place and
+    anything else left in the process carry over to the next task. Up to `size`
+    such used workers are kept idle, besides `size` fresh ones.
+    """
+
+    def __init__(
+        self,
+        size: int,
+        max_tasks: int,
+        max_memory_growth: int,
+        security_config: SecurityConfig,
+    ):
+        self.size = size
+        self.max_tasks = max_tasks
+        self.max_memory_growth = max_memory_growth
+        self.security_config = security_config
+        self.logger = logging.getLogger(__name__)
+
+        self._idle: deque[Worker] = deque()
+        self._spawning = 0
+        self._is_closed = False
+        self._lock = threading.Lock()
+
+    @property
+    def idle_count(self) -> int:
+        return len(self._idle)
+
+    def start(self) -> None:
+        self.replenish()
+
+    def acquire(self, owner: str | None) -> Worker:
+        """Take an idle worker that last ran a task of workflow `owner`, else a fresh
+        one, else spawn one on demand."""
+
+        while True:
+            with self._lock:
+                worker = self._take_idle(owner)
+
+            if worker is None:
+                worker = self._spawn()
+                worker.owner = owner
+                return worker
+
+            if worker.process.is_alive():
+                if worker.baseline_rss is None:
+                    worker.baseline_rss = self._get_rss(worker)
+                worker.owner = owner
+                return worker
+
+            self._retire(worker)
+
+    def release(self, worker: Worker) -> None:
+        """Return a worker after a task, recycling it if it is spent."""
+
+        worker.tasks_run += 1
+        evicted: list[Worker] = []
+
+        with self._lock:
+            is_reusable = (
+                not self._is_closed
+                and worker.owner is not None
+                and not self._is_spent(worker)
+            )
+            if is_reusable:
+                self._idle.append(worker)
+                evicted = self._evict_used()
+
+        if not is_reusable:
+            self._retire(worker)
+
+        for used_worker in evicted:
+            self._retire(used_worker)
+
+        self.replenish()
+
+    def replenish(self) -> None:
+        """Spawn workers until `size` workers are idle."""
+
+        while True:
+            with self._lock:
+                if self._is_closed or self._fresh_count + self._spawning >= self.size:
+                    return
+                self._spawning += 1
+
+            try:
+                worker = self._spawn()
+            except (OSError, EOFError) as e:
+                self.logger.warning(LOG_WORKER_SPAWN_FAILED.format(error=e))
+                return
+            finally:
+                with self._lock:
+                    self._spawning -= 1
+
+            with self._lock:
+                if not self._is_closed:
+                    self._idle.append(worker)
+                    continue
+
+            self._retire(worker)
+            return
+
+    def shutdown(self) -> None:
+        with self._lock:
+            self._is_closed = True
+            workers = list(self._idle)
+            self._idle.clear()
+
+        for worker in workers:
+            self._retire(worker)
+
+    @property
+    def _fresh_count(self) -> int:
+        return sum(worker.owner is None for worker in self._idle)
+
+    def _take_idle(self, owner: str | None) -> Worker | None:
+        """Under the lock, remove and return the idle worker to run a task of `owner`."""
+
+        fresh = None
+        for worker in reversed(self._idle):  # most recently used first
+            if owner is not None and worker.owner == owner:
+                self._idle.remove(worker)
+                return worker
+            if worker.owner is None and fresh is None:
+                fresh = worker
+
+        if fresh is not None:
+            self._idle.remove(fresh)
+        return fresh
+
+    def _evict_used(self) -> list[Worker]:
+        """Under the lock, remove the least recently used workers over `size` of those
+        bound to a workflow, for the caller to retire."""
+
+        used = [worker for worker in self._idle if worker.owner is not None]
+        evicted = used[: max(len(used) - self.size, 0)]
+        for worker in evicted:
+            self._idle.remove(worker)
+        return evicted
+
+    def _spawn(self) -> Worker:
+        process, task_conn, read_conn = TaskExecutor.create_worker(
+            self.security_config, self.max_tasks
+        )
+        return Worker(process, task_conn, read_conn)
+
+    def _is_spent(self, worker: Worker) -> bool:
+        if not worker.process.is_alive() or worker.tasks_run >= self.max_tasks:
+            return True
+
+        if self.max_memory_growth == 0 or worker.baseline_rss is None:
+            return False
+
+        rss = self._get_rss(worker)
+
+        return rss is not None and rss - worker.baseline_rss > self.max_memory_growth
+
+    def _retire(self, worker: Worker) -> None:
+        if worker.tasks_run > 0:
+            self.logger.debug(
+                LOG_WORKER_RECYCLED.format(
+                    pid=worker.process.pid, tasks_run=worker.tasks_run
+                )
+            )
+
+        for conn in (worker.task_conn, worker.read_conn):
+            try:
+                conn.close()
+            except OSError:
+                pass
+
+        # closed task pipe makes the worker exit on its own
+        worker.process.join(timeout=1)
+        TaskExecutor.stop_process(worker.process)
+
+    @staticmethod
+    def _get_rss(worker: Worker) -> int | None:
+        """Current resident set size of a worker in bytes, where `/proc` is available."""
+
+        try:
+            with open(f"/proc/{worker.process.pid}/statm") as f:
+                return int(f.read().split()[1]) * PAGE_SIZE
+        except (OSError, IndexError, ValueError):
+            return None
@@ -0,0 +1,138 @@
+from collections import Counter, deque
+from dataclasses import dataclass
+
+from src.message_types.broker import TaskSettings
+
+DEFAULT_WORKFLOW = ""  # tasks sent without a workflow ID share one queue
+
+
+@dataclass
+class QueuedTask:
+    task_id: str
+    settings: TaskSettings
+    size: int = 0  # bytes of the task settings message
+
+
+class WorkflowScheduler:
+    """Decides which accepted tasks may run, so that no workflow can take every slot.
+
+    A task whose workflow is at `max_per_workflow` running tasks waits in a
+    FIFO queue for that workflow. When a slot frees up, the waiting workflow
+    with the lowest pass runs next, and each task started advances the pass
+    of its workflow by `1 / weight` (stride scheduling), so under load
+    workflows get slots in proportion to their weights.
+
+    Queued tasks hold their input items in memory, so the queue, shared by all
+    workflows, holds at most `max_queued` tasks and `max_queued_bytes` bytes.
+    """
+
+    def __init__(
+        self,
+        max_per_workflow: int,
+        max_queued: int,
+        max_queued_bytes: int = 0,
+        weights: dict[str, int] | None = None,
+    ):
+        self.max_per_workflow = max_per_workflow  # 0 for no cap
+        self.max_queued = max_queued
+        self.max_queued_bytes = max_queued_bytes  # 0 for no cap
+        self.weights = weights or {}
+
+        self._running: Counter[str] = Counter()
+        self._queues: dict[str, deque[QueuedTask]] = {}
+        self._passes: dict[str, float] = {}
+        self._min_pass = 0.0  # pass of the last workflow started
+        self.queued_count = 0
+        self.queued_bytes = 0
+
+    @property
+    def is_saturated(self) -> bool:
+        return self.queued_count >= self.max_queued or bool(
+            self.max_queued_bytes and self.queued_bytes >= self.max_queued_bytes
+        )
+
+    def can_start(self, workflow_id: str | None) -> bool:
+        workflow_id = workflow_id or DEFAULT_WORKFLOW
+        return (
+            self.max_per_workflow == 0
+            or self._running[workflow_id] < self.max_per_workflow
+        )
+
+    def started(self, workflow_id: str | None) -> None:
+        workflow_id = workflow_id or DEFAULT_WORKFLOW
+        self._running[workflow_id] += 1
+
+        # a workflow idle for a while starts from the current pass, so it cannot bank slots
+        current = max(self._passes.get(workflow_id, 0.0), self._min_pass)
+        self._min_pass = current
+        self._passes[workflow_id] = current + 1 / self.weights.get(workflow_id, 1)
+
+    def finished(self, workflow_id: str | None) -> None:
+        workflow_id = workflow_id or DEFAULT_WORKFLOW
+        self._running[workflow_id] -= 1
+        if self._running[workflow_id] <= 0:
+            del self._running[workflow_id]
+            if workflow_id not in self._queues:
+                self._passes.pop(workflow_id, None)
+
+    def enqueue(self, workflow_id: str | None, task: QueuedTask) -> bool:
+        """Queue a task until its workflow is below its cap, returning False if the queue is full.
+
+        A task larger than `max_queued_bytes` is still queued if the queue is empty.
+        """
+
+        if self.is_saturated or (
+            self.max_queued_bytes
+            and self.queued_count
+            and self.queued_bytes + task.size > self.max_queued_bytes
+        ):
+            return False
+
+        self._queues.setdefault(workflow_id or DEFAULT_WORKFLOW, deque()).append(task)
+        self.queued_count += 1
+        self.queued_bytes += task.size
+        return True
+
+    def remove(self, task_id: str) -> bool:
+        for workflow_id, queue in self._queues.items():
+            for task in queue:
+                if task.task_id == task_id:
+                    queue.remove(task)
+                    self._drop_if_empty(workflow_id)
+                    self.queued_count -= 1
+                    self.queued_bytes -= task.size
+                    return True
+
+        return False
+
+    def next_task(self) -> QueuedTask | None:
+        """Take the next queued task allowed to run, from the workflow with the lowest pass."""
+
+        startable = [
+            workflow_id for workflow_id in self._queues if self.can_start(workflow_id)
+        ]
+        if not startable:
+            return None
+
+        workflow_id = min(
+            startable,
+            key=lambda w: max(self._passes.get(w, 0.0), self._min_pass),
+        )
+        task = self._queues[workflow_id].popleft()
+        self._drop_if_empty(workflow_id)
+        self.queued_count -= 1
+        self.queued_bytes -= task.size
+        return task
+
+    def drain(self) -> list[QueuedTask]:
+        """Remove and return all queued tasks, e.g. on shutdown."""
+
+        tasks = [task for queue in self._queues.values() for task in queue]
+        self._queues.clear()
+        self.queued_count = 0
+        self.queued_bytes = 0
+        return tasks
+
+    def _drop_if_empty(self, workflow_id: str) -> None:
+        if not self._queues[workflow_id]:
+            del self._queues[workflow_id]
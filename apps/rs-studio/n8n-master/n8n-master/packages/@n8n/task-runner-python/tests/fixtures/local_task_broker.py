@@ -23,7 +23,8 @@ class ActiveTask:
 
 
 class LocalTaskBroker:
-    def __init__(self):
+    def __init__(self, max_msg_size: int = 4 * 1024 * 1024):
+        self.max_msg_size = max_msg_size  # 0 for unlimited
         self.port: int | None = None
         self.app = web.Application()
         self.runner: web.AppRunner | None = None
@@ -34,6 +35,7 @@ class LocalTaskBroker:
         self.active_tasks: dict[TaskId, ActiveTask] = {}
         self.task_settings: dict[TaskId, TaskSettings] = {}
         self.rpc_messages: dict[TaskId, list[dict]] = {}
+        self.used_offer_ids: set[str] = set()
         self.app.router.add_get(LOCAL_TASK_BROKER_WS_PATH, self.websocket_handler)
 
     async def start(self) -> None:
@@ -61,7 +63,7 @@ class LocalTaskBroker:
 
     async def websocket_handler(self, request: web.Request) -> web_ws.WebSocketResponse:
         print(f"WebSocket connection request from {request.remote}")
-        ws = web_ws.WebSocketResponse()
+        ws = web_ws.WebSocketResponse(max_msg_size=self.max_msg_size)
         await ws.prepare(request)
         connection_id = nanoid()
         self.connections[connection_id] = ws
@@ -142,9 +144,14 @@ class LocalTaskBroker:
         self.active_tasks[task_id] = ActiveTask(task_settings)
         self.task_settings[task_id] = task_settings
 
-        offer = await self.wait_for_msg("runner:taskoffer", timeout=2.0)
+        offer = await self.wait_for_msg(
+            "runner:taskoffer",
+            timeout=2.0,
+            predicate=lambda msg: msg.get("offerId") not in self.used_offer_ids,
+        )
 
         if offer:
+            self.used_offer_ids.add(offer["offerId"])
             accept = {
                 "type": "broker:taskofferaccept",
                 "taskId": task_id,
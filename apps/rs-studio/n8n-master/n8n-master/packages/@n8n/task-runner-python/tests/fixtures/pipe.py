@@ -0,0 +1,41 @@
+import asyncio
+import os
+from collections.abc import Callable
+from unittest.mock import MagicMock
+
+from src.constants import DEFAULT_MAX_PAYLOAD_SIZE
+from src.pipe_reader import PipeReader
+
+
+async def read_back(
+    write: Callable[[int], None],
+    on_print: Callable[[list[str]], None] | None = None,
+    raw_result: bool = False,
+    max_size: int = DEFAULT_MAX_PAYLOAD_SIZE,
+) -> PipeReader:
+    """Read what `write` sends through a pipe, writing from a thread as a subprocess would."""
+
+    read_fd, write_fd = os.pipe()
+    pipe_reader = PipeReader(
+        read_fd,
+        MagicMock(),
+        on_print=on_print,
+        raw_result=raw_result,
+        max_size=max_size,
+    )
+
+    def write_and_close():
+        try:
+            write(write_fd)
+        finally:
+            os.close(write_fd)
+
+    try:
+        await asyncio.wait_for(
+            asyncio.gather(pipe_reader.read(), asyncio.to_thread(write_and_close)),
+            timeout=5,
+        )
+    finally:
+        os.close(read_fd)
+
+    return pipe_reader
@@ -185,6 +185,42 @@ async def test_per_item_with_continue_on_fail(broker, manager):
     assert "division by zero" in done_msg["data"]["result"][0]["json"]["error"]
 
 
+# ========== shared memory ==========
+
+
+@pytest.mark.asyncio
+async def test_all_items_with_shared_memory_items(
+    broker, manager_with_shared_memory_items
+):
+    task_id = nanoid()
+    items = [{"json": {"name": "Ana", "value": i}} for i in range(100)]
+    code = "return [{'total': sum(item['json']['value'] for item in _items)}]"
+    task_settings = create_task_settings(code=code, node_mode="all_items", items=items)
+    await broker.send_task(task_id=task_id, task_settings=task_settings)
+
+    done_msg = await wait_for_task_done(broker, task_id)
+
+    assert done_msg["data"]["result"] == [{"total": 4950}]
+
+
+@pytest.mark.asyncio
+async def test_per_item_with_shared_memory_items(
+    broker, manager_with_shared_memory_items
+):
+    task_id = nanoid()
+    items = [{"json": {"value": 10}}, {"json": {"value": 20}}]
+    code = "return {'doubled': _item['json']['value'] * 2}"
+    task_settings = create_task_settings(code=code, node_mode="per_item", items=items)
+    await broker.send_task(task_id=task_id, task_settings=task_settings)
+
+    done_msg = await wait_for_task_done(broker, task_id)
+
+    assert done_msg["data"]["result"] == [
+        {"json": {"doubled": 20}, "pairedItem": {"item": 0}},
+        {"json": {"doubled": 40}, "pairedItem": {"item": 1}},
+    ]
+
+
 # ========== Security ===========
 
 
@@ -5,7 +5,7 @@ import aiohttp
 import pytest
 from src.nanoid import nanoid
 
-from tests.integration.conftest import create_task_settings
+from tests.integration.conftest import create_task_settings, wait_for_task_done
 
 
 @pytest.mark.asyncio
@@ -38,3 +38,51 @@ async def test_health_check_server_ressponds_mid_execution(broker, manager):
         response = await session.get(manager.get_health_check_url())
         assert response.status == 200
         assert await response.text() == "OK"
+
+
+@pytest.mark.asyncio
+async def test_metrics_endpoint_reports_completed_task(broker, manager):
+    task_id = nanoid()
+    task_settings = create_task_settings(code="return []", node_mode="all_items")
+    await broker.send_task(task_id=task_id, task_settings=task_settings)
+    await wait_for_task_done(broker, task_id)
+
+    async with aiohttp.ClientSession() as session:
+        response = await session.get(f"{manager.get_health_check_url()}/metrics")
+        assert response.status == 200
+        metrics = await response.text()
+
+    assert 'n8n_runner_tasks_total{outcome="success"} 1' in metrics
+    assert "n8n_runner_offers_accepted_total 1" in metrics
+    assert "n8n_runner_task_duration_seconds_count 1" in metrics
+    assert "n8n_runner_subprocess_spawn_seconds_count 1" in metrics
+
+
+@pytest.mark.asyncio
+async def test_tasks_endpoint_reports_task_stats(broker, manager):
+    task_id = nanoid()
+    task_settings = create_task_settings(
+        code="print('hi')\nreturn [{'n': 1}]", node_mode="all_items"
+    )
+    await broker.send_task(task_id=task_id, task_settings=task_settings)
+    await wait_for_task_done(broker, task_id)
+
+    async with aiohttp.ClientSession() as session:
+        response = await session.get(f"{manager.get_health_check_url()}/tasks")
+        assert response.status == 200
+        tasks = await response.json()
+
+    [task] = tasks
+    assert task["task_id"] == task_id
+    assert task["outcome"] == "success"
+    for stat in (
+        "spawn_duration",
+        "exec_duration",
+        "serialize_duration",
+        "import_duration",
+        "transfer_duration",
+        "peak_rss",
+        "cpu_user",
+        "cpu_system",
+    ):
+        assert task[stat] is not None, stat
@@ -0,0 +1,109 @@
+import asyncio
+import textwrap
+
+import pytest
+
+from src.nanoid import nanoid
+from tests.fixtures.test_constants import TASK_TIMEOUT
+from tests.integration.conftest import (
+    create_task_settings,
+    wait_for_task_done,
+    wait_for_task_error,
+)
+
+
+@pytest.mark.asyncio
+async def test_all_items_on_worker_pool(broker, manager_with_worker_pool):
+    task_id = nanoid()
+    items = [{"json": {"value": 1}}, {"json": {"value": 2}}]
+    code = "return [{'total': sum(item['json']['value'] for item in _items)}]"
+    task_settings = create_task_settings(code=code, node_mode="all_items", items=items)
+    await broker.send_task(task_id=task_id, task_settings=task_settings)
+
+    done_msg = await wait_for_task_done(broker, task_id)
+
+    assert done_msg["data"]["result"] == [{"total": 3}]
+
+
+@pytest.mark.asyncio
+async def test_per_item_on_worker_pool(broker, manager_with_worker_pool):
+    task_id = nanoid()
+    items = [{"json": {"value": 10}}, {"json": {"value": 20}}]
+    code = "return {'doubled': _item['json']['value'] * 2}"
+    task_settings = create_task_settings(code=code, node_mode="per_item", items=items)
+    await broker.send_task(task_id=task_id, task_settings=task_settings)
+
+    done_msg = await wait_for_task_done(broker, task_id)
+
+    assert done_msg["data"]["result"] == [
+        {"json": {"doubled": 20}, "pairedItem": {"item": 0}},
+        {"json": {"doubled": 40}, "pairedItem": {"item": 1}},
+    ]
+
+
+@pytest.mark.asyncio
+async def test_consecutive_tasks_on_worker_pool(broker, manager_with_worker_pool):
+    for i in range(5):
+        task_id = nanoid()
+        code = f"return [{{'run': {i}}}]"
+        task_settings = create_task_settings(code=code, node_mode="all_items")
+        await broker.send_task(task_id=task_id, task_settings=task_settings)
+
+        done_msg = await wait_for_task_done(broker, task_id)
+
+        assert done_msg["data"]["result"] == [{"run": i}]
+
+
+@pytest.mark.asyncio
+async def test_error_does_not_break_worker(broker, manager_with_worker_pool):
+    task_id = nanoid()
+    code = "raise ValueError('Intentional error')"
+    task_settings = create_task_settings(code=code, node_mode="all_items")
+    await broker.send_task(task_id=task_id, task_settings=task_settings)
+
+    error_msg = await wait_for_task_error(broker, task_id)
+    assert "Intentional error" in str(error_msg["error"]["message"])
+
+    task_id = nanoid()
+    task_settings = create_task_settings(
+        code="return [{'ok': True}]", node_mode="all_items"
+    )
+    await broker.send_task(task_id=task_id, task_settings=task_settings)
+
+    done_msg = await wait_for_task_done(broker, task_id)
+    assert done_msg["data"]["result"] == [{"ok": True}]
+
+
+@pytest.mark.asyncio
+async def test_timeout_on_worker_pool(broker, manager_with_worker_pool):
+    task_id = nanoid()
+    code = textwrap.dedent("""
+        while True:
+            pass
+    """)
+    task_settings = create_task_settings(code=code, node_mode="all_items")
+    await broker.send_task(task_id=task_id, task_settings=task_settings)
+
+    error_msg = await wait_for_task_error(broker, task_id, timeout=TASK_TIMEOUT + 1.5)
+
+    assert "timed out" in error_msg["error"]["message"].lower()
+
+
+@pytest.mark.asyncio
+async def test_cancel_on_worker_pool(broker, manager_with_worker_pool):
+    task_id = nanoid()
+    code = textwrap.dedent("""
+        import time
+        for i in range(20):
+            time.sleep(0.05)
+        return [{"completed": "should not reach here"}]
+    """)
+    task_settings = create_task_settings(code=code, node_mode="all_items")
+    await broker.send_task(task_id=task_id, task_settings=task_settings)
+    await asyncio.sleep(0.3)
+    await broker.cancel_task(task_id, reason="Cancelled during execution")
+
+    error_msg = await wait_for_task_error(broker, task_id)
+
+    assert error_msg["taskId"] == task_id
+    assert "error" in error_msg
@@ -0,0 +1,32 @@
+from src.broker_connection import BrokerConnection
+from src.constants import BROKER_RECONNECT_BASE_DELAY, BROKER_RECONNECT_MAX_DELAY
+
+
+class TestBrokerConnection:
+    def test_websocket_url_includes_runner_id(self):
+        connection = BrokerConnection("http://127.0.0.1:5679", "runner-1")
+
+        assert connection.websocket_url == "ws://127.0.0.1:5679/runners/_ws?id=runner-1"
+
+    def test_reconnect_delay_backs_off_with_jitter_up_to_max(self):
+        connection = BrokerConnection("http://127.0.0.1:5679", "runner-1")
+
+        delays = [connection.get_reconnect_delay() for _ in range(20)]
+
+        for attempt, delay in enumerate(delays):
+            ceiling = min(
+                BROKER_RECONNECT_BASE_DELAY * 2**attempt, BROKER_RECONNECT_MAX_DELAY
+            )
+            assert ceiling / 2 <= delay <= ceiling
+        assert delays[-1] >= BROKER_RECONNECT_MAX_DELAY / 2
+
+    def test_result_buffer_drops_oldest_results_beyond_max_size(self):
+        connection = BrokerConnection("http://127.0.0.1:5679", "runner-1")
+
+        assert connection.buffer_result(b"a" * 40, max_size=100) == 0
+        assert connection.buffer_result(b"b" * 40, max_size=100) == 0
+        assert connection.buffer_result(b"c" * 40, max_size=100) == 1
+        assert connection.buffer_result(b"d" * 200, max_size=100) == 1
+
+        assert connection.take_pending_results() == [b"b" * 40, b"c" * 40]
+        assert connection.pending_results_size == 0
@@ -0,0 +1,74 @@
+import sys
+
+import pytest
+
+from src.code_cache import CodeCache
+from src.task_executor import TaskExecutor
+from tests.fixtures.pipe import read_back
+
+
+class TestCodeCache:
+    def test_counts_hits_and_misses(self):
+        cache = CodeCache(max_size=10)
+        cache_key = CodeCache.to_cache_key("return []", "all_items")
+
+        assert cache.get(cache_key) is None
+        cache.put(cache_key, b"compiled")
+        assert cache.get(cache_key) == b"compiled"
+
+        assert (cache.hits, cache.misses) == (1, 1)
+
+    def test_key_includes_node_mode(self):
+        assert CodeCache.to_cache_key("return []", "all_items") != (
+            CodeCache.to_cache_key("return []", "per_item")
+        )
+
+    def test_evicts_least_recently_used(self):
+        cache = CodeCache(max_size=2)
+        a, b, c = (CodeCache.to_cache_key(code, "all_items") for code in "abc")
+
+        cache.put(a, b"a")
+        cache.put(b, b"b")
+        cache.get(a)
+        cache.put(c, b"c")
+
+        assert len(cache) == 2
+        assert cache.get(b) is None
+        assert cache.get(a) == b"a"
+
+    def test_code_that_does_not_compile_is_not_cached(self):
+        assert CodeCache.compile("return [", "all_items") is None
+
+
+class TestCompiledCodeExecution:
+    @pytest.mark.parametrize(
+        "node_mode,code,expected",
+        [
+            ("all_items", "return [{'json': {'n': len(_items)}}]", [{"n": 2}]),
+            ("per_item", "return {'n': _item['json']['n'] * 2}", [{"n": 2}, {"n": 4}]),
+        ],
+    )
+    @pytest.mark.asyncio
+    async def test_subprocess_runs_marshalled_code(
+        self, node_mode, code, expected, monkeypatch
+    ):
+        monkeypatch.setattr(sys, "stderr", sys.stderr)  # restored after the run
+        compiled_code = CodeCache.compile(code, node_mode)
+        assert compiled_code is not None
+
+        run = (
+            TaskExecutor._run_all_items
+            if node_mode == "all_items"
+            else TaskExecutor._run_per_item
+        )
+        pipe_reader = await read_back(
+            lambda write_fd: run(
+                compiled_code,
+                [{"json": {"n": 1}}, {"json": {"n": 2}}],
+                write_fd,
+                dict(__builtins__),
+            )
+        )
+
+        assert pipe_reader.error is None
+        assert [item["json"] for item in pipe_reader.pipe_message["result"]] == expected
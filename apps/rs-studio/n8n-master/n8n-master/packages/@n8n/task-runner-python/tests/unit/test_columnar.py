@@ -0,0 +1,120 @@
+import pytest
+
+from src.columnar import from_columns, import_array_module, to_columns
+from src.errors import SecurityViolationError
+
+ITEMS = [
+    {"json": {"name": "a", "price": 1.5}},
+    {"json": {"name": "b", "price": 2.5, "tags": ["x"]}},
+]
+
+
+class TestToColumns:
+    def test_fields_become_columns_in_first_seen_order(self):
+        columns = to_columns(ITEMS, None)
+
+        assert columns == {
+            "name": ["a", "b"],
+            "price": [1.5, 2.5],
+            "tags": [None, ["x"]],
+        }
+
+    def test_no_items_gives_no_columns(self):
+        assert to_columns([], None) == {}
+
+    def test_numpy_arrays_when_available(self):
+        numpy = pytest.importorskip("numpy")
+
+        columns = to_columns(ITEMS, numpy)
+
+        assert isinstance(columns["price"], numpy.ndarray)
+        assert columns["price"].sum() == 4.0
+
+    @pytest.mark.parametrize(
+        "values",
+        [
+            [1, "a"],
+            [True, 2],
+            [1, 2.5],
+            [1, None],
+            [None, None],
+            [[1, 2], [3, 4]],
+            [{"a": 1}, {"a": 2}],
+        ],
+    )
+    def test_numpy_keeps_columns_it_would_coerce_as_lists(self, values):
+        numpy = pytest.importorskip("numpy")
+
+        columns = to_columns([{"json": {"v": value}} for value in values], numpy)
+
+        assert columns["v"] == values
+
+    @pytest.mark.parametrize(
+        ("values", "dtype_kind"),
+        [([True, False], "b"), ([1, 2], "i"), ([1.5, 2.0], "f"), (["a", "b"], "U")],
+    )
+    def test_numpy_arrays_keep_value_type(self, values, dtype_kind):
+        numpy = pytest.importorskip("numpy")
+
+        columns = to_columns([{"json": {"v": value}} for value in values], numpy)
+
+        assert columns["v"].dtype.kind == dtype_kind
+        assert columns["v"].tolist() == values
+
+
+class TestFromColumns:
+    def test_columns_become_items(self):
+        assert from_columns({"name": ("a", "b"), "total": [1, 2]}) == [
+            {"json": {"name": "a", "total": 1}},
+            {"json": {"name": "b", "total": 2}},
+        ]
+
+    def test_numpy_scalars_in_lists_become_python_values(self):
+        numpy = pytest.importorskip("numpy")
+
+        prices = numpy.asarray([1.5, 2.5])
+        items = from_columns({"double": [price * 2 for price in prices]})
+
+        assert items == [{"json": {"double": 3.0}}, {"json": {"double": 5.0}}]
+        assert type(items[0]["json"]["double"]) is float
+
+    def test_round_trip(self):
+        assert from_columns(to_columns(ITEMS, None)) == [
+            {"json": {"name": "a", "price": 1.5, "tags": None}},
+            {"json": {"name": "b", "price": 2.5, "tags": ["x"]}},
+        ]
+
+    def test_arrays_are_converted_to_python_values(self):
+        class Array:
+            def tolist(self):
+                return [1, 2]
+
+        assert from_columns({"n": Array()}) == [{"json": {"n": 1}}, {"json": {"n": 2}}]
+
+    def test_rejects_columns_of_different_lengths(self):
+        with pytest.raises(ValueError, match="different lengths"):
+            from_columns({"a": [1, 2], "b": [1]})
+
+    def test_rejects_scalar_columns(self):
+        with pytest.raises(ValueError, match="must be a list or array"):
+            from_columns({"total": 3})
+
+
+class TestImportArrayModule:
+    def test_none_when_not_allowlisted(self):
+        def deny_import(name, *args, **kwargs):
+            raise SecurityViolationError(message="Security violation detected")
+
+        assert import_array_module(deny_import) is None
+
+    def test_prefers_first_allowed_module(self):
+        imported = []
+
+        def fake_import(name, *args, **kwargs):
+            imported.append(name)
+            if name == "numpy":
+                raise ImportError(name)
+            return name
+
+        assert import_array_module(fake_import) == "pyarrow"
+        assert imported == ["numpy", "pyarrow"]
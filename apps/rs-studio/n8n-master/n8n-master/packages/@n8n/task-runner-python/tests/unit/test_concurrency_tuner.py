@@ -0,0 +1,68 @@
+from unittest.mock import patch
+
+import pytest
+
+from src.concurrency_tuner import ConcurrencyTuner
+from src.task_state import TaskStats
+
+GiB = 1024**3
+
+
+@pytest.fixture
+def getloadavg():
+    with (
+        patch("src.concurrency_tuner.os.process_cpu_count", return_value=8),
+        patch.object(ConcurrencyTuner, "_get_available_memory", return_value=16 * GiB),
+        patch(
+            "src.concurrency_tuner.os.getloadavg", return_value=(0.0, 0.0, 0.0)
+        ) as getloadavg,
+    ):
+        yield getloadavg
+
+
+def tuned(tuner: ConcurrencyTuner, running: int = 0) -> int:
+    tuner._tuned_at = None
+    return tuner.limit(running)
+
+
+class TestConcurrencyTuner:
+    def test_assumes_cpu_bound_tasks_until_measured(self, getloadavg):
+        tuner = ConcurrencyTuner(min_concurrency=1, max_concurrency=50)
+
+        assert tuned(tuner) == 8
+
+    def test_io_bound_tasks_overlap(self, getloadavg):
+        tuner = ConcurrencyTuner(min_concurrency=1, max_concurrency=50)
+        tuner.record(TaskStats(cpu_user=0.2, cpu_system=0.05), duration=1.0)
+
+        assert tuned(tuner) == 32
+
+    def test_outside_load_reduces_limit(self, getloadavg):
+        getloadavg.return_value = (6.0, 0.0, 0.0)
+        tuner = ConcurrencyTuner(min_concurrency=1, max_concurrency=50)
+
+        assert tuned(tuner) == 2
+        # load from our own running tasks is not counted against us
+        assert tuned(tuner, running=6) == 8
+
+    def test_limited_by_available_memory(self, getloadavg):
+        tuner = ConcurrencyTuner(min_concurrency=1, max_concurrency=50)
+        tuner.record(TaskStats(cpu_user=0.1, cpu_system=0.0, peak_rss=4 * GiB), 1.0)
+
+        assert tuned(tuner) == 3
+        assert tuned(tuner, running=2) == 5
+
+    def test_stays_within_bounds(self, getloadavg):
+        tuner = ConcurrencyTuner(min_concurrency=2, max_concurrency=4)
+
+        assert tuned(tuner) == 4
+
+        getloadavg.return_value = (100.0, 0.0, 0.0)
+        assert tuned(tuner) == 2
+
+    def test_limit_is_recomputed_at_most_once_per_interval(self, getloadavg):
+        tuner = ConcurrencyTuner(min_concurrency=1, max_concurrency=50)
+        assert tuner.limit(0) == 8
+
+        getloadavg.return_value = (6.0, 0.0, 0.0)
+        assert tuner.limit(0) == 8
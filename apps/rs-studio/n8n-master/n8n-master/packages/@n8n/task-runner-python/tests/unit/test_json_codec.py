@@ -0,0 +1,117 @@
+import json
+from dataclasses import dataclass
+from datetime import datetime
+from enum import Enum
+
+import pytest
+
+from src.config.task_runner_config import TaskRunnerConfig
+from src.constants import ENV_GRANT_TOKEN, ENV_JSON_CODEC
+from src.errors import ConfigurationError
+from src.json_codec import AVAILABLE_CODECS, JsonCodec, _codec_from_env, get_codec
+
+
+@dataclass
+class Point:
+    x: int
+    y: int
+
+
+class Color(Enum):
+    RED = "red"
+    BLUE = 2
+
+
+@pytest.fixture(params=sorted(AVAILABLE_CODECS))
+def codec(request) -> JsonCodec:
+    return AVAILABLE_CODECS[request.param]
+
+
+def stdlib_dumps(value) -> bytes:
+    return json.dumps(value, default=str, ensure_ascii=False).encode("utf-8")
+
+
+class TestJsonCodec:
+    def test_keeps_non_ascii_characters(self, codec: JsonCodec):
+        encoded = codec.dumps({"name": "João 🚀"}).decode("utf-8")
+
+        assert "João 🚀" in encoded
+        assert "\\u" not in encoded
+
+    def test_stringifies_unsupported_types_like_stdlib(self, codec: JsonCodec):
+        value = {
+            "when": datetime(2024, 1, 2, 3, 4, 5),
+            "point": Point(1, 2),
+            "tags": {"a"},
+        }
+
+        assert json.loads(codec.dumps(value)) == json.loads(stdlib_dumps(value))
+
+    def test_encodes_non_string_keys_like_stdlib(self, codec: JsonCodec):
+        value = {1: "one", 2.5: "two and a half"}
+
+        assert json.loads(codec.dumps(value)) == json.loads(stdlib_dumps(value))
+
+    def test_encodes_big_integers(self, codec: JsonCodec):
+        value = {"big": 2**70}
+
+        assert json.loads(codec.dumps(value)) == value
+
+    def test_encodes_non_finite_floats_as_null(self, codec: JsonCodec):
+        value = {"nan": float("nan"), "values": [1.5, float("inf"), -float("inf")]}
+
+        assert json.loads(codec.dumps(value)) == {
+            "nan": None,
+            "values": [1.5, None, None],
+        }
+
+    def test_encodes_enums_by_value(self, codec: JsonCodec):
+        value = {"color": Color.RED, "colors": [Color.BLUE]}
+
+        assert json.loads(codec.dumps(value)) == {"color": "red", "colors": [2]}
+
+    def test_raises_on_circular_reference(self, codec: JsonCodec):
+        value: dict = {}
+        value["self"] = value
+
+        with pytest.raises((ValueError, TypeError)):
+            codec.dumps(value)
+
+    @pytest.mark.parametrize(
+        "wrap", [bytes, bytearray, memoryview, lambda b: b.decode()]
+    )
+    def test_loads_all_input_types(self, codec: JsonCodec, wrap):
+        data = '{"items": [{"json": {"name": "Zoë"}}]}'.encode()
+
+        assert codec.loads(wrap(data)) == {"items": [{"json": {"name": "Zoë"}}]}
+
+    def test_loads_nan_literals(self, codec: JsonCodec):
+        assert codec.loads(b'{"value": NaN}')["value"] != 0
+
+
+class TestGetCodec:
+    def test_auto_prefers_fastest_installed_codec(self):
+        assert get_codec().name == next(
+            name for name in ("orjson", "msgspec", "stdlib") if name in AVAILABLE_CODECS
+        )
+
+    def test_unknown_codec_raises(self):
+        with pytest.raises(ValueError):
+            get_codec("unknown")
+
+    def test_env_forces_codec(self, monkeypatch):
+        monkeypatch.setenv(ENV_JSON_CODEC, "stdlib")
+
+        assert _codec_from_env().name == "stdlib"
+
+    def test_env_with_unknown_codec_uses_auto(self, monkeypatch):
+        monkeypatch.setenv(ENV_JSON_CODEC, "unknown")
+
+        assert _codec_from_env() is get_codec()
+
+    def test_config_rejects_unknown_codec(self, monkeypatch):
+        monkeypatch.setenv(ENV_GRANT_TOKEN, "token")
+        monkeypatch.setenv(ENV_JSON_CODEC, "unknown")
+
+        with pytest.raises(ConfigurationError, match="unknown"):
+            TaskRunnerConfig.from_env()
@@ -0,0 +1,56 @@
+import json
+import logging
+import sys
+
+from src.logs import JsonFormatter, LogQueueHandler
+
+
+def make_record(msg: str, *args, exc_info=None, **extra) -> logging.LogRecord:
+    return logging.getLogger("src.task_runner").makeRecord(
+        "src.task_runner", logging.INFO, __file__, 1, msg, args, exc_info, extra=extra
+    )
+
+
+class TestJsonFormatter:
+    def test_extra_fields_are_top_level_keys(self):
+        record = make_record(
+            "Completed task %s", "abc", task_id="abc", duration_ms=12, result_bytes=34
+        )
+
+        entry = json.loads(JsonFormatter().format(record))
+
+        assert entry["message"] == "Completed task abc"
+        assert entry["level"] == "INFO"
+        assert entry["logger"] == "src.task_runner"
+        assert entry["task_id"] == "abc"
+        assert entry["duration_ms"] == 12
+        assert entry["result_bytes"] == 34
+        assert "msg" not in entry and "args" not in entry
+
+    def test_exception_is_included(self):
+        try:
+            raise ValueError("boom")
+        except ValueError:
+            record = make_record("Task failed", exc_info=sys.exc_info())
+
+        entry = json.loads(JsonFormatter().format(record))
+
+        assert "ValueError: boom" in entry["exception"]
+
+
+class TestLogQueueHandler:
+    def test_prepared_record_keeps_message_extras_and_traceback(self):
+        try:
+            raise ValueError("boom")
+        except ValueError:
+            record = make_record(
+                "Task %s failed", "abc", exc_info=sys.exc_info(), task_id="abc"
+            )
+
+        prepared = LogQueueHandler(None).prepare(record)  # type: ignore[arg-type]
+
+        assert prepared.getMessage() == "Task abc failed"
+        assert prepared.exc_info is None
+        entry = json.loads(JsonFormatter().format(prepared))
+        assert entry["task_id"] == "abc"
+        assert "ValueError: boom" in entry["exception"]
@@ -0,0 +1,84 @@
+import json
+
+import pytest
+
+try:
+    import msgspec
+except ImportError:
+    msgspec = None
+
+from src.message_serde import MessageSerde
+from src.message_types.broker import BrokerTaskSettings
+from src.raw_items import RawItems
+
+ITEMS = [{"json": {"name": "João 🚀", "n": 1}}, {"json": {"nested": {"a": [1, 2]}}}]
+
+
+def task_settings_message(**settings) -> bytes:
+    return json.dumps(
+        {
+            "type": "broker:tasksettings",
+            "taskId": "task-id",
+            "settings": {
+                "code": "return _items",
+                "nodeMode": "runOnceForAllItems",
+                "items": ITEMS,
+                **settings,
+            },
+        }
+    ).encode()
+
+
+def items_of(message: BrokerTaskSettings):
+    items = message.settings.items
+    return items.to_items() if isinstance(items, RawItems) else items
+
+
+class TestDeserializeTaskSettings:
+    @pytest.mark.skipif(msgspec is None, reason="msgspec is not installed")
+    def test_keeps_input_items_encoded(self):
+        message = MessageSerde.deserialize_broker_message(task_settings_message())
+
+        assert isinstance(message, BrokerTaskSettings)
+        assert isinstance(message.settings.items, RawItems)
+        assert message.settings.items.to_items() == ITEMS
+
+    def test_parses_other_settings(self):
+        message = MessageSerde.deserialize_broker_message(
+            task_settings_message(
+                nodeMode="runOnceForEachItem",
+                continueOnFail=True,
+                workflowId="workflow-id",
+                nodeName="Code",
+            )
+        )
+
+        assert isinstance(message, BrokerTaskSettings)
+        assert message.task_id == "task-id"
+        assert message.settings.node_mode == "per_item"
+        assert message.settings.continue_on_fail is True
+        assert message.settings.workflow_id == "workflow-id"
+        assert message.settings.workflow_name == "Unknown"
+        assert message.settings.node_name == "Code"
+
+    def test_accepts_text_frames(self):
+        message = MessageSerde.deserialize_broker_message(
+            task_settings_message().decode()
+        )
+
+        assert isinstance(message, BrokerTaskSettings)
+        assert items_of(message) == ITEMS
+
+    def test_rejects_missing_fields(self):
+        data = json.dumps(
+            {"type": "broker:tasksettings", "taskId": "task-id", "settings": {}}
+        )
+
+        with pytest.raises(ValueError, match="Missing field"):
+            MessageSerde.deserialize_broker_message(data)
+
+    def test_rejects_unknown_node_mode(self):
+        with pytest.raises(ValueError):
+            MessageSerde.deserialize_broker_message(
+                task_settings_message(nodeMode="some_items")
+            )
@@ -0,0 +1,115 @@
+import asyncio
+import json
+
+import pytest
+
+from src.health_check_server import HealthCheckServer
+from src.metrics import Counter, Histogram, Metrics
+from src.recent_tasks import RecentTasks
+from src.task_state import TaskState
+
+
+class TestMetrics:
+    def test_counter_with_labels(self):
+        counter = Counter("tasks_total", "Tasks", label_names=("outcome",))
+
+        counter.inc("success")
+        counter.inc("success")
+        counter.inc("error", amount=3)
+
+        assert counter.samples() == [
+            'n8n_runner_tasks_total{outcome="success"} 2',
+            'n8n_runner_tasks_total{outcome="error"} 3',
+        ]
+
+    def test_counter_without_labels_starts_at_zero(self):
+        assert Counter("offers_total", "Offers").samples() == [
+            "n8n_runner_offers_total 0"
+        ]
+
+    def test_histogram_buckets_are_cumulative_and_inclusive(self):
+        histogram = Histogram("duration_seconds", "Duration", (0.1, 1.0))
+
+        for value in (0.05, 0.1, 0.5, 2.0):
+            histogram.observe(value)
+
+        assert histogram.samples() == [
+            'n8n_runner_duration_seconds_bucket{le="0.1"} 2',
+            'n8n_runner_duration_seconds_bucket{le="1"} 3',
+            'n8n_runner_duration_seconds_bucket{le="+Inf"} 4',
+            "n8n_runner_duration_seconds_sum 2.65",
+            "n8n_runner_duration_seconds_count 4",
+        ]
+
+    def test_render_includes_help_type_and_gauges(self):
+        metrics = Metrics()
+        metrics.running_tasks.set_function(lambda: 2)
+
+        rendered = metrics.render()
+
+        assert "# TYPE n8n_runner_tasks_total counter" in rendered
+        assert "# TYPE n8n_runner_task_duration_seconds histogram" in rendered
+        assert (
+            "# HELP n8n_runner_running_tasks Tasks accepted and not finished"
+            in rendered
+        )
+        assert "n8n_runner_running_tasks 2\n" in rendered
+
+
+class TestMetricsEndpoint:
+    async def request(self, server: HealthCheckServer, path: str) -> bytes:
+        reader = asyncio.StreamReader()
+        reader.feed_data(f"GET {path} HTTP/1.1\r\nHost: localhost\r\n\r\n".encode())
+
+        written = bytearray()
+
+        class Writer:
+            def write(self, data):
+                written.extend(data)
+
+            async def drain(self):
+                pass
+
+            def close(self):
+                pass
+
+            async def wait_closed(self):
+                pass
+
+        await server._handle_request(reader, Writer())  # type: ignore[arg-type]
+        return bytes(written)
+
+    @pytest.mark.asyncio
+    async def test_metrics_path_serves_metrics(self):
+        metrics = Metrics()
+        metrics.offers_sent.inc()
+
+        response = await self.request(HealthCheckServer(metrics), "/metrics")
+
+        assert response.startswith(b"HTTP/1.1 200 OK")
+        assert b"text/plain; version=0.0.4" in response
+        assert b"n8n_runner_offers_sent_total 1" in response
+
+    @pytest.mark.asyncio
+    async def test_other_paths_serve_health_check(self):
+        response = await self.request(HealthCheckServer(Metrics()), "/healthz")
+
+        assert response.endswith(b"\r\n\r\nOK")
+
+    @pytest.mark.asyncio
+    async def test_tasks_path_serves_recent_tasks(self):
+        metrics = Metrics()
+        metrics.recent_tasks = RecentTasks(max_size=2)
+        for task_id in ("a", "b", "c"):
+            task_state = TaskState(task_id)
+            task_state.stats.exec_duration = 0.5
+            metrics.recent_tasks.add(task_state, "success", 1.0)
+
+        response = await self.request(HealthCheckServer(metrics), "/tasks")
+
+        headers, body = response.split(b"\r\n\r\n", 1)
+        assert b"application/json" in headers
+        tasks = json.loads(body)
+        assert [task["task_id"] for task in tasks] == ["b", "c"]
+        assert tasks[0]["exec_duration"] == 0.5
+        assert tasks[0]["outcome"] == "success"
@@ -0,0 +1,65 @@
+import pytest
+
+from src.pipe_writer import PipeWriter
+from src.print_stream import PrintStream
+from src.task_executor import TaskExecutor
+from tests.fixtures.pipe import read_back
+
+
+def print_and_end(calls: list[tuple], **limits):
+    def write(write_fd: int):
+        writer = PipeWriter(write_fd)
+        print_stream = PrintStream(writer, TaskExecutor._format_print_args, **limits)
+        for args in calls:
+            print_stream.write(*args)
+        print_stream.close()
+        writer.write_result([{"json": {}}], [])
+
+    return write
+
+
+class TestPrintStream:
+    @pytest.mark.asyncio
+    async def test_prints_are_collected_without_callback(self):
+        pipe_reader = await read_back(print_and_end([("a", 1), ({"b": None},)]))
+
+        assert pipe_reader.error is None
+        assert pipe_reader.pipe_message == {
+            "result": [{"json": {}}],
+            "print_args": [["'a'", "1"], ['{"b":null}']],
+        }
+
+    @pytest.mark.asyncio
+    async def test_prints_are_passed_to_callback_as_they_arrive(self):
+        received = []
+
+        pipe_reader = await read_back(
+            print_and_end([("first",), ("second",)]), on_print=received.append
+        )
+
+        assert received == [["'first'"], ["'second'"]]
+        assert pipe_reader.pipe_message["print_args"] == []
+
+    @pytest.mark.asyncio
+    async def test_calls_beyond_burst_are_dropped_and_counted(self):
+        pipe_reader = await read_back(
+            print_and_end([(i,) for i in range(5)], burst=2, rate=0)
+        )
+
+        assert pipe_reader.pipe_message["print_args"] == [
+            ["0"],
+            ["1"],
+            ["[Output truncated - 3 more print statements]"],
+        ]
+
+    @pytest.mark.asyncio
+    async def test_calls_past_byte_budget_are_dropped(self):
+        pipe_reader = await read_back(
+            print_and_end([("x" * 10,), ("y" * 100,), ("z",)], max_bytes=30)
+        )
+
+        assert pipe_reader.pipe_message["print_args"] == [
+            [f"'{'x' * 10}'"],
+            ["'z'"],
+            ["[Output truncated - 1 more print statements]"],
+        ]
@@ -0,0 +1,31 @@
+from multiprocessing.shared_memory import SharedMemory
+
+import pytest
+
+from src.shared_items import load_items, release_items, share_items
+
+
+class TestSharedItems:
+    def test_items_round_trip(self):
+        items = [{"json": {"name": "José", "tags": ["a", "b"], "n": 1.5}}]
+        shm, shared_items = share_items(items)
+
+        try:
+            assert shared_items.size <= shm.size
+            assert load_items(shared_items) == items
+        finally:
+            release_items(shm)
+
+    def test_release_unlinks_segment(self):
+        shm, shared_items = share_items([{"json": {}}])
+
+        release_items(shm)
+
+        with pytest.raises(FileNotFoundError):
+            SharedMemory(name=shared_items.name, track=False)
+
+    def test_release_is_idempotent(self):
+        shm, _ = share_items([])
+
+        release_items(shm)
+        release_items(shm)
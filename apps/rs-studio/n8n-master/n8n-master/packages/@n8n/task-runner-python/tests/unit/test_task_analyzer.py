@@ -1,3 +1,7 @@
+import asyncio
+import threading
+import uuid
+
 import pytest
 
 from src.errors.security_violation_error import SecurityViolationError
@@ -195,3 +199,109 @@ class TestAllowAll(TestTaskAnalyzer):
 
         for code in unsafe_allowed_code:
             analyzer.validate(code)
+
+
+class TestValidateAsync(TestTaskAnalyzer):
+    @pytest.fixture
+    def release(self) -> threading.Event:
+        return threading.Event()
+
+    @pytest.fixture
+    def analyses(self, analyzer: TaskAnalyzer, release: threading.Event):
+        """Codes analyzed, with each analysis held until `release` is set."""
+
+        analyzed: list[str] = []
+        analyze = analyzer._analyze
+
+        def counting_analyze(code: str):
+            analyzed.append(code)
+            release.wait(timeout=5)
+            return analyze(code)
+
+        analyzer._analyze = counting_analyze  # type: ignore[method-assign]
+        yield analyzed
+        release.set()
+        analyzer.shutdown()
+
+    @staticmethod
+    def unique_code(code: str) -> str:
+        # the in-memory cache is shared by all analyzers
+        return f"{code}  # {uuid.uuid4()}"
+
+    @pytest.mark.asyncio
+    async def test_raises_on_violations(self, analyzer: TaskAnalyzer) -> None:
+        with pytest.raises(SecurityViolationError):
+            await analyzer.validate_async(self.unique_code("import os"))
+
+    @pytest.mark.asyncio
+    async def test_shares_analysis_of_same_code(
+        self,
+        analyzer: TaskAnalyzer,
+        analyses: list[str],
+        release: threading.Event,
+    ) -> None:
+        code = self.unique_code("import json")
+
+        validations = [
+            asyncio.create_task(analyzer.validate_async(code)) for _ in range(3)
+        ]
+        await asyncio.sleep(0.05)
+        release.set()
+        await asyncio.gather(*validations)
+
+        assert analyses == [code]
+
+    @pytest.mark.asyncio
+    async def test_caches_result(
+        self,
+        analyzer: TaskAnalyzer,
+        analyses: list[str],
+        release: threading.Event,
+    ) -> None:
+        code = self.unique_code("import os")
+        release.set()
+
+        for _ in range(2):
+            with pytest.raises(SecurityViolationError):
+                await analyzer.validate_async(code)
+
+        with pytest.raises(SecurityViolationError):
+            analyzer.validate(code)
+
+        assert analyses == [code]
+
+    @pytest.mark.asyncio
+    async def test_cancelled_caller_does_not_cancel_shared_analysis(
+        self,
+        analyzer: TaskAnalyzer,
+        analyses: list[str],
+        release: threading.Event,
+    ) -> None:
+        code = self.unique_code("import os")
+
+        cancelled = asyncio.create_task(analyzer.validate_async(code))
+        waiting = asyncio.create_task(analyzer.validate_async(code))
+        await asyncio.sleep(0.05)
+        cancelled.cancel()
+        release.set()
+
+        with pytest.raises(SecurityViolationError):
+            await waiting
+
+        assert analyses == [code]
+
+    @pytest.mark.asyncio
+    async def test_does_not_cache_syntax_errors(
+        self,
+        analyzer: TaskAnalyzer,
+        analyses: list[str],
+        release: threading.Event,
+    ) -> None:
+        code = self.unique_code("def broken(:")
+        release.set()
+
+        for _ in range(2):
+            with pytest.raises(SyntaxError):
+                await analyzer.validate_async(code)
+
+        assert analyses == [code, code]
@@ -1,135 +1,156 @@
 import pytest
 import json
+import os
+import sys
+import time
 from unittest.mock import MagicMock, patch
 
+from src.config.security_config import SecurityConfig
 from src.task_executor import TaskExecutor
+from src.task_state import TaskStats
+from src.task_usage import UsageMeter
 from src.pipe_reader import PipeReader
-from src.errors import TaskCancelledError, TaskKilledError, TaskSubprocessFailedError
-from src.constants import SIGTERM_EXIT_CODE, SIGKILL_EXIT_CODE, PIPE_MSG_PREFIX_LENGTH
+from src.errors import (
+    InvalidPipeMsgContentError,
+    InvalidPipeMsgLengthError,
+    TaskCancelledError,
+    TaskKilledError,
+    TaskResourceLimitError,
+    TaskSubprocessFailedError,
+)
+from src.pipe_writer import PipeWriter
+from src.message_serde import MessageSerde
+from src.message_types.runner import RunnerTaskDone
+from src.raw_items import RawItems
+from tests.fixtures.pipe import read_back
+from src.constants import (
+    SIGTERM_EXIT_CODE,
+    SIGKILL_EXIT_CODE,
+    SIGXCPU_EXIT_CODE,
+    MEMORY_LIMIT_EXIT_CODE,
+    PIPE_FRAME_ERROR,
+    PIPE_FRAME_ITEMS,
+    PIPE_FRAME_RESULT_END,
+    PIPE_MAX_FRAME_SIZE,
+    PIPE_MSG_PREFIX_LENGTH,
+)
 from src.message_types.pipe import (
-    PipeResultMessage,
     PipeErrorMessage,
     TaskErrorInfo,
 )
 
 
-class TestTaskExecutorProcessExitHandling:
-    def test_sigterm_raises_task_cancelled_error(self):
-        process = MagicMock()
-        process.is_alive.return_value = False
-        process.exitcode = SIGTERM_EXIT_CODE
+def frame(frame_type: int, payload: bytes) -> list[bytes]:
+    header = bytes([frame_type]) + len(payload).to_bytes(PIPE_MSG_PREFIX_LENGTH, "big")
+    return [header, payload]
 
-        read_conn = MagicMock()
-        write_conn = MagicMock()
-        read_conn.fileno.return_value = 999
 
-        with pytest.raises(TaskCancelledError):
-            TaskExecutor.execute_process(
-                process=process,
-                read_conn=read_conn,
-                write_conn=write_conn,
-                task_timeout=60,
-                pipe_reader_timeout=3.0,
-                continue_on_fail=False,
-            )
+@pytest.fixture
+def closed_pipe():
+    """Returns the read end of a pipe holding `data`, with its write end closed."""
 
-    def test_sigkill_raises_task_killed_error(self):
-        process = MagicMock()
-        process.is_alive.return_value = False
-        process.exitcode = SIGKILL_EXIT_CODE
+    read_fds = []
 
-        read_conn = MagicMock()
-        write_conn = MagicMock()
-        read_conn.fileno.return_value = 999
+    def create(data: bytes = b"") -> int:
+        read_fd, write_fd = os.pipe()
+        os.write(write_fd, data)
+        os.close(write_fd)
+        read_fds.append(read_fd)
+        return read_fd
 
-        with pytest.raises(TaskKilledError):
-            TaskExecutor.execute_process(
-                process=process,
-                read_conn=read_conn,
-                write_conn=write_conn,
-                task_timeout=60,
-                pipe_reader_timeout=3.0,
-                continue_on_fail=False,
-            )
+    yield create
+
+    for read_fd in read_fds:
+        os.close(read_fd)
 
-    def test_other_non_zero_exit_code_raises_task_subprocess_failed_error(self):
+
+@pytest.fixture
+def execute(closed_pipe):
+    async def run(exitcode: int, data: bytes = b""):
         process = MagicMock()
-        process.is_alive.return_value = False
-        process.exitcode = -1  # Some other error code
+        process.exitcode = exitcode
+        process.sentinel = closed_pipe()  # readable, as for an exited subprocess
 
         read_conn = MagicMock()
-        write_conn = MagicMock()
-        read_conn.fileno.return_value = 999
+        read_conn.fileno.return_value = closed_pipe(data)
+
+        return await TaskExecutor.execute_process(
+            process=process,
+            read_conn=read_conn,
+            write_conn=MagicMock(),
+            task_timeout=60,
+            pipe_reader_timeout=3.0,
+            continue_on_fail=False,
+        )
+
+    return run
 
+
+class TestTaskExecutorProcessExitHandling:
+    @pytest.mark.asyncio
+    async def test_sigterm_raises_task_cancelled_error(self, execute):
+        with pytest.raises(TaskCancelledError):
+            await execute(SIGTERM_EXIT_CODE)
+
+    @pytest.mark.asyncio
+    async def test_sigkill_raises_task_killed_error(self, execute):
+        with pytest.raises(TaskKilledError):
+            await execute(SIGKILL_EXIT_CODE)
+
+    @pytest.mark.asyncio
+    @pytest.mark.parametrize(
+        "exitcode,resource",
+        [(SIGXCPU_EXIT_CODE, "cpu_time"), (MEMORY_LIMIT_EXIT_CODE, "memory")],
+    )
+    async def test_resource_limit_exit_raises_resource_limit_error(
+        self, execute, exitcode, resource
+    ):
+        with pytest.raises(TaskResourceLimitError) as exc_info:
+            await execute(exitcode)
+
+        assert exc_info.value.resource == resource
+
+    @pytest.mark.asyncio
+    async def test_other_non_zero_exit_code_raises_task_subprocess_failed_error(
+        self, execute
+    ):
         with pytest.raises(TaskSubprocessFailedError) as exc_info:
-            TaskExecutor.execute_process(
-                process=process,
-                read_conn=read_conn,
-                write_conn=write_conn,
-                task_timeout=60,
-                pipe_reader_timeout=3.0,
-                continue_on_fail=False,
-            )
+            await execute(-1)  # Some other error code
 
         assert exc_info.value.exit_code == -1
 
-    def test_zero_exit_code_with_empty_pipe_raises_task_result_read_error(self):
+    @pytest.mark.asyncio
+    async def test_zero_exit_code_with_empty_pipe_raises_task_result_read_error(
+        self, execute
+    ):
         from src.errors import TaskResultReadError
 
-        process = MagicMock()
-        process.is_alive.return_value = False
-        process.exitcode = 0
-
-        read_conn = MagicMock()
-        write_conn = MagicMock()
-        read_conn.fileno.return_value = 999
-
         with pytest.raises(TaskResultReadError):
-            TaskExecutor.execute_process(
-                process=process,
-                read_conn=read_conn,
-                write_conn=write_conn,
-                task_timeout=60,
-                pipe_reader_timeout=3.0,
-                continue_on_fail=False,
-            )
+            await execute(0)
 
 
 class TestTaskExecutorPipeCommunication:
-    @patch("os.read")
-    def test_successful_result_communication(self, mock_os_read):
-        result_data: PipeResultMessage = {
-            "result": [{"json": {"foo": "bar"}}],
-            "print_args": [],
-        }
-        result_json = json.dumps(result_data).encode("utf-8")
-        result_length = len(result_json).to_bytes(PIPE_MSG_PREFIX_LENGTH, "big")
-
-        mock_os_read.side_effect = [result_length, result_json]
-
-        process = MagicMock()
-        process.is_alive.return_value = False
-        process.exitcode = 0
-
-        read_conn = MagicMock()
-        write_conn = MagicMock()
-        read_conn.fileno.return_value = 999
-
-        result, print_args, size = TaskExecutor.execute_process(
-            process=process,
-            read_conn=read_conn,
-            write_conn=write_conn,
-            task_timeout=60,
-            pipe_reader_timeout=3.0,
-            continue_on_fail=False,
+    @pytest.mark.asyncio
+    async def test_successful_result_communication(self, execute):
+        items_json = json.dumps([{"json": {"foo": "bar"}}]).encode("utf-8")
+        end_json = json.dumps({"print_args": []}).encode("utf-8")
+
+        result, print_args, size = await execute(
+            0,
+            b"".join(
+                [
+                    *frame(PIPE_FRAME_ITEMS, items_json),
+                    *frame(PIPE_FRAME_RESULT_END, end_json),
+                ]
+            ),
         )
 
         assert result == [{"json": {"foo": "bar"}}]
         assert print_args == []
-        assert size == len(result_json)
+        assert size == len(items_json) + len(end_json)
 
-    @patch("os.read")
-    def test_successful_error_communication(self, mock_os_read):
+    @pytest.mark.asyncio
+    async def test_successful_error_communication(self, execute):
         from src.errors import TaskRuntimeError
 
         error_info: TaskErrorInfo = {
@@ -143,62 +164,500 @@ class TestTaskExecutorPipeCommunication:
             "print_args": [],
         }
         error_json = json.dumps(error_data).encode("utf-8")
-        error_length = len(error_json).to_bytes(PIPE_MSG_PREFIX_LENGTH, "big")
-
-        mock_os_read.side_effect = [error_length, error_json]
-
-        process = MagicMock()
-        process.is_alive.return_value = False
-        process.exitcode = 0
-
-        read_conn = MagicMock()
-        write_conn = MagicMock()
-        read_conn.fileno.return_value = 999
 
         with pytest.raises(TaskRuntimeError) as exc_info:
-            TaskExecutor.execute_process(
-                process=process,
-                read_conn=read_conn,
-                write_conn=write_conn,
-                task_timeout=60,
-                pipe_reader_timeout=3.0,
-                continue_on_fail=False,
-            )
+            await execute(0, b"".join(frame(PIPE_FRAME_ERROR, error_json)))
 
         assert str(exc_info.value) == "Test error"
         assert exc_info.value.stack_trace == "traceback..."
 
 
 class TestTaskExecutorLowLevelIO:
-    @patch("os.read")
-    def test_read_exact_bytes_single_read(self, mock_os_read):
-        data = b"test data"
-        mock_os_read.return_value = data
-
-        result = PipeReader._read_exact_bytes(999, len(data))
+    @pytest.mark.asyncio
+    async def test_reads_frames_split_across_writes(self):
+        end_json = json.dumps({"print_args": []}).encode("utf-8")
+        data = b"".join(
+            [
+                *frame(PIPE_FRAME_ITEMS, b'[{"json": {}}]'),
+                *frame(PIPE_FRAME_RESULT_END, end_json),
+            ]
+        )
 
-        assert result == data
-        mock_os_read.assert_called_once_with(999, len(data))
+        def write(write_fd: int):
+            for i in range(0, len(data), 3):
+                os.write(write_fd, data[i : i + 3])
+                time.sleep(0.001)
 
-    @patch("os.read")
-    def test_read_exact_bytes_multiple_reads(self, mock_os_read):
-        mock_os_read.side_effect = [b"test", b" ", b"data"]
+        pipe_reader = await read_back(write)
 
-        result = PipeReader._read_exact_bytes(999, 9)
+        assert pipe_reader.error is None
+        assert pipe_reader.pipe_message == {"result": [{"json": {}}], "print_args": []}
 
-        assert result == b"test data"
-        assert mock_os_read.call_count == 3
+    @pytest.mark.asyncio
+    async def test_pipe_closed_mid_frame_sets_eof_error(self):
+        def write(write_fd: int):
+            os.write(write_fd, frame(PIPE_FRAME_ITEMS, b"[1, 2, 3]")[0] + b"[1,")
 
-    @patch("os.read")
-    def test_read_exact_bytes_eof_error(self, mock_os_read):
-        mock_os_read.side_effect = [b"test", b""]  # empty for EOF
+        pipe_reader = await read_back(write)
 
-        with pytest.raises(EOFError, match="Pipe closed before reading all data"):
-            PipeReader._read_exact_bytes(999, 10)
+        assert isinstance(pipe_reader.error, EOFError)
+        assert str(pipe_reader.error) == "Pipe closed before reading all data"
 
     @patch("os.write")
     def test_write_bytes_write_failure(self, mock_os_write):
         mock_os_write.return_value = 0
 
         with pytest.raises(OSError, match="Write failed"):
-            TaskExecutor._write_bytes(999, b"test data")
+            PipeWriter._write_bytes(999, b"test data")
+
+
+class TestPipeStreaming:
+    @pytest.mark.asyncio
+    async def test_items_are_sent_in_chunks(self):
+        items = [{"json": {"index": i, "text": "ação"}} for i in range(100)]
+        frame_types = []
+
+        def write(write_fd: int):
+            writer = PipeWriter(write_fd, chunk_size=64)
+            original = writer._write_frame
+
+            def record(frame_type, payload):
+                frame_types.append(frame_type)
+                original(frame_type, payload)
+
+            writer._write_frame = record
+            writer.write_result(items, [["'done'"]])
+
+        pipe_reader = await read_back(write)
+
+        assert pipe_reader.error is None
+        assert pipe_reader.pipe_message == {
+            "result": items,
+            "print_args": [["'done'"]],
+        }
+        assert frame_types.count(PIPE_FRAME_ITEMS) > 1
+        assert frame_types[-1] == PIPE_FRAME_RESULT_END
+
+    @pytest.mark.asyncio
+    async def test_error_discards_streamed_items(self):
+        error: PipeErrorMessage = {
+            "error": {"message": "boom", "description": "", "stack": "", "stderr": ""},
+            "print_args": [],
+        }
+
+        def write(write_fd: int):
+            writer = PipeWriter(write_fd, chunk_size=64)
+            for i in range(10):
+                writer.write_item({"json": {"index": i}})
+            writer.write_error(error)
+
+        pipe_reader = await read_back(write)
+
+        assert pipe_reader.pipe_message == error
+
+    @pytest.mark.asyncio
+    async def test_non_list_result_is_rejected(self):
+        pipe_reader = await read_back(
+            lambda write_fd: PipeWriter(write_fd).write_result({"not": "a list"}, [])
+        )
+
+        assert isinstance(pipe_reader.error, InvalidPipeMsgContentError)
+
+    @pytest.mark.asyncio
+    @pytest.mark.parametrize("raw_result", [False, True])
+    async def test_item_larger_than_a_frame_is_sent_in_parts(self, raw_result):
+        items = [{"json": {"text": "a" * (2 * PIPE_MAX_FRAME_SIZE)}}, {"json": {}}]
+
+        pipe_reader = await read_back(
+            lambda write_fd: PipeWriter(write_fd).write_result(items, [["'done'"]]),
+            raw_result=raw_result,
+        )
+
+        assert pipe_reader.error is None
+        assert pipe_reader.pipe_message is not None
+        result = pipe_reader.pipe_message["result"]
+        assert (result.to_items() if isinstance(result, RawItems) else result) == items
+
+    @pytest.mark.asyncio
+    async def test_frame_over_max_frame_size_is_rejected(self):
+        def write(write_fd: int):
+            header = bytes([PIPE_FRAME_ITEMS]) + (PIPE_MAX_FRAME_SIZE + 1).to_bytes(
+                PIPE_MSG_PREFIX_LENGTH, "big"
+            )
+            os.write(write_fd, header)
+
+        pipe_reader = await read_back(write)
+
+        assert isinstance(pipe_reader.error, InvalidPipeMsgLengthError)
+
+    @pytest.mark.asyncio
+    async def test_frames_over_max_size_are_rejected(self):
+        items = [{"json": {"index": i}} for i in range(100)]
+
+        pipe_reader = await read_back(
+            lambda write_fd: PipeWriter(write_fd, chunk_size=64).write_result(
+                items, []
+            ),
+            max_size=500,
+        )
+
+        assert isinstance(pipe_reader.error, InvalidPipeMsgLengthError)
+
+    @pytest.mark.asyncio
+    async def test_raw_result_is_spliced_into_task_done_message(self):
+        items = [{"json": {"index": i, "text": "ação"}} for i in range(100)]
+
+        pipe_reader = await read_back(
+            lambda write_fd: PipeWriter(write_fd, chunk_size=64).write_result(
+                items, []
+            ),
+            raw_result=True,
+        )
+
+        assert pipe_reader.error is None
+        assert pipe_reader.pipe_message is not None
+        result = pipe_reader.pipe_message["result"]
+        assert isinstance(result, RawItems)
+        assert len(result.chunks) > 1
+
+        serialized = MessageSerde.serialize_runner_message(
+            RunnerTaskDone(task_id="t1", data={"result": result})
+        )
+        assert json.loads(serialized) == {
+            "type": "runner:taskdone",
+            "taskId": "t1",
+            "data": {"result": items},
+        }
+
+    @pytest.mark.asyncio
+    async def test_raw_empty_result_is_an_empty_list(self):
+        pipe_reader = await read_back(
+            lambda write_fd: PipeWriter(write_fd).write_result([], []),
+            raw_result=True,
+        )
+
+        assert pipe_reader.pipe_message is not None
+        serialized = MessageSerde.serialize_runner_message(
+            RunnerTaskDone(
+                task_id="t1", data={"result": pipe_reader.pipe_message["result"]}
+            )
+        )
+        assert json.loads(serialized)["data"] == {"result": []}
+
+    @pytest.mark.asyncio
+    async def test_raw_non_list_result_is_rejected(self):
+        pipe_reader = await read_back(
+            lambda write_fd: PipeWriter(write_fd).write_result({"not": "a list"}, []),
+            raw_result=True,
+        )
+
+        assert isinstance(pipe_reader.error, InvalidPipeMsgContentError)
+
+    @pytest.mark.asyncio
+    async def test_raw_nan_literals_are_sent_as_null(self):
+        def write(write_fd: int):
+            writer = PipeWriter(write_fd)
+            writer._write_frame(PIPE_FRAME_ITEMS, b'[{"json": {"v": NaN}}]')
+            writer.end_result([])
+
+        pipe_reader = await read_back(write, raw_result=True)
+
+        assert pipe_reader.pipe_message is not None
+        serialized = MessageSerde.serialize_runner_message(
+            RunnerTaskDone(
+                task_id="t1", data={"result": pipe_reader.pipe_message["result"]}
+            )
+        )
+
+        def reject(name):
+            raise ValueError(name)
+
+        assert json.loads(serialized, parse_constant=reject)["data"] == {
+            "result": [{"json": {"v": None}}]
+        }
+
+    @pytest.mark.asyncio
+    @pytest.mark.parametrize("payload", [b"[1,", b"[}]", b'[1]{"a": 2}', b"[1]]"])
+    async def test_raw_malformed_items_are_rejected(self, payload):
+        def write(write_fd: int):
+            writer = PipeWriter(write_fd)
+            writer._write_frame(PIPE_FRAME_ITEMS, payload)
+            writer.end_result([])
+
+        pipe_reader = await read_back(write, raw_result=True)
+
+        assert isinstance(pipe_reader.error, InvalidPipeMsgContentError)
+
+
+class TestPerItemExecution:
+    async def run_per_item(self, code: str, items, monkeypatch) -> PipeReader:
+        monkeypatch.setattr(sys, "stderr", sys.stderr)  # restored after the run
+
+        return await read_back(
+            lambda write_fd: TaskExecutor._run_per_item(
+                code, items, write_fd, dict(__builtins__)
+            )
+        )
+
+    @pytest.mark.asyncio
+    async def test_output_items_and_paired_items(self, monkeypatch):
+        code = (
+            "if _item['json']['skip']:\n"
+            "    return None\n"
+            "if _item['json']['binary']:\n"
+            "    return {'binary': {'data': 'abc'}, 'index': _item['json']['index']}\n"
+            "return {'index': _item['json']['index']}"
+        )
+        items = [
+            {"json": {"index": i, "skip": i == 1, "binary": i == 2}} for i in range(4)
+        ]
+
+        pipe_reader = await self.run_per_item(code, items, monkeypatch)
+
+        assert pipe_reader.error is None
+        assert pipe_reader.pipe_message["result"] == [
+            {"json": {"index": 0}, "pairedItem": {"item": 0}},
+            {
+                "json": {"index": 2},
+                "pairedItem": {"item": 2},
+                "binary": {"data": "abc"},
+            },
+            {"json": {"index": 3}, "pairedItem": {"item": 3}},
+        ]
+
+    @pytest.mark.asyncio
+    async def test_globals_written_by_code_do_not_leak_across_items(self, monkeypatch):
+        code = (
+            "global counter\n"
+            "try:\n"
+            "    counter += 1\n"
+            "except NameError:\n"
+            "    counter = 1\n"
+            "return {'counter': counter}"
+        )
+        items = [{"json": {}} for _ in range(3)]
+
+        pipe_reader = await self.run_per_item(code, items, monkeypatch)
+
+        assert [item["json"] for item in pipe_reader.pipe_message["result"]] == [
+            {"counter": 1}
+        ] * 3
+
+    @pytest.mark.asyncio
+    async def test_function_attributes_do_not_leak_across_items(self, monkeypatch):
+        code = (
+            "calls = getattr(_user_function, 'calls', 0) + 1\n"
+            "_user_function.calls = calls\n"
+            "return {'calls': calls}"
+        )
+        items = [{"json": {}} for _ in range(3)]
+
+        pipe_reader = await self.run_per_item(code, items, monkeypatch)
+
+        assert [item["json"] for item in pipe_reader.pipe_message["result"]] == [
+            {"calls": 1}
+        ] * 3
+
+    def test_writes_globals_detects_attributes_of_shared_globals(self):
+        def compiled(code: str):
+            return compile(TaskExecutor._wrap_function(code), "<test>", "exec")
+
+        assert TaskExecutor._writes_globals(compiled("_user_function.x = 1"))
+        assert TaskExecutor._writes_globals(compiled("setattr(print, 'x', 1)"))
+        assert not TaskExecutor._writes_globals(
+            compiled("item = _item\nitem.x = 1\nreturn item")
+        )
+
+    def test_writes_globals_detects_nested_functions(self):
+        def compiled(code: str):
+            return compile(TaskExecutor._wrap_function(code), "<test>", "exec")
+
+        assert not TaskExecutor._writes_globals(compiled("return {'a': _item}"))
+        assert TaskExecutor._writes_globals(
+            compiled("def inner():\n    global x\n    x = 1\nreturn inner()")
+        )
+        assert TaskExecutor._writes_globals(compiled("return globals()"))
+
+
+class TestColumnarExecution:
+    async def run_all_items(self, code: str, items, monkeypatch) -> PipeReader:
+        monkeypatch.setattr(sys, "stderr", sys.stderr)  # restored after the run
+
+        return await read_back(
+            lambda write_fd: TaskExecutor._run_all_items(
+                code, items, write_fd, dict(__builtins__)
+            )
+        )
+
+    @pytest.mark.asyncio
+    async def test_code_using_columns_gets_and_returns_columns(self, monkeypatch):
+        items = [{"json": {"price": 2, "qty": 3}}, {"json": {"price": 5, "qty": 1}}]
+        code = (
+            "totals = [p * q for p, q in zip(_columns['price'], _columns['qty'])]\n"
+            "return {'total': totals}"
+        )
+
+        pipe_reader = await self.run_all_items(code, items, monkeypatch)
+
+        assert pipe_reader.pipe_message is not None
+        assert pipe_reader.pipe_message["result"] == [
+            {"json": {"total": 6}},
+            {"json": {"total": 5}},
+        ]
+
+    @pytest.mark.asyncio
+    async def test_code_using_columns_may_return_items(self, monkeypatch):
+        code = "return [{'json': {'count': len(_columns['n'])}}]"
+
+        pipe_reader = await self.run_all_items(
+            code, [{"json": {"n": 1}}, {"json": {"n": 2}}], monkeypatch
+        )
+
+        assert pipe_reader.pipe_message is not None
+        assert pipe_reader.pipe_message["result"] == [{"json": {"count": 2}}]
+
+    def test_uses_name_detects_nested_functions(self):
+        code = TaskExecutor.compile_code(
+            "def total():\n    return sum(_columns['n'])\nreturn []", "all_items"
+        )
+
+        assert TaskExecutor._uses_name(code, "_columns")
+        assert not TaskExecutor._uses_name(
+            TaskExecutor.compile_code("return _items", "all_items"), "_columns"
+        )
+
+    @pytest.mark.asyncio
+    async def test_attribute_of_same_name_does_not_use_columns(self, monkeypatch):
+        code = (
+            "class Table:\n"
+            "    def __init__(self):\n"
+            "        self._columns = {'n': [1]}\n"
+            "return [{'json': {'n': len(Table()._columns['n'])}}]"
+        )
+
+        assert not TaskExecutor._uses_name(
+            TaskExecutor.compile_code(code, "all_items"), "_columns"
+        )
+
+        pipe_reader = await self.run_all_items(
+            code, [{"json": {"n": 1}}, {"json": {"n": 2}}], monkeypatch
+        )
+
+        assert pipe_reader.pipe_message is not None
+        assert pipe_reader.pipe_message["result"] == [{"json": {"n": 1}}]
+
+
+class TestResourceLimits:
+    async def execute(self, code: str, stats=None, stdlib_allow=None, **limits):
+        security_config = SecurityConfig(
+            stdlib_allow=stdlib_allow or set(),
+            external_allow=set(),
+            builtins_deny=set(),
+            runner_env_deny=True,
+            **limits,
+        )
+        process, read_conn, write_conn = TaskExecutor.create_process(
+            code, "all_items", [], security_config
+        )
+        return await TaskExecutor.execute_process(
+            process=process,
+            read_conn=read_conn,
+            write_conn=write_conn,
+            task_timeout=30,
+            pipe_reader_timeout=3.0,
+            continue_on_fail=False,
+            stats=stats,
+        )
+
+    @pytest.mark.asyncio
+    async def test_memory_limit_raises_resource_limit_error(self):
+        with pytest.raises(TaskResourceLimitError) as exc_info:
+            await self.execute(
+                "data = bytearray(2 * 1024 ** 3)\nreturn []",
+                max_memory=1024**3,
+            )
+
+        assert exc_info.value.resource == "memory"
+
+    @pytest.mark.asyncio
+    async def test_cpu_time_limit_raises_resource_limit_error(self):
+        with pytest.raises(TaskResourceLimitError) as exc_info:
+            await self.execute("while True:\n    pass", max_cpu_time=1)
+
+        assert exc_info.value.resource == "cpu_time"
+
+    @pytest.mark.asyncio
+    async def test_cpu_time_hard_limit_is_lowered(self):
+        code = (
+            "import resource\n"
+            "return [{'limits': list(resource.getrlimit(resource.RLIMIT_CPU))}]"
+        )
+
+        result, _, _ = await self.execute(
+            code, stdlib_allow={"resource"}, max_cpu_time=2
+        )
+
+        soft, hard = result[0]["limits"]
+        assert hard == soft + 1
+
+    @pytest.mark.asyncio
+    async def test_memory_error_without_limit_is_a_task_error(self):
+        from src.errors import TaskRuntimeError
+
+        with pytest.raises(TaskRuntimeError) as exc_info:
+            await self.execute("raise MemoryError('out of cache')")
+
+        assert "out of cache" in str(exc_info.value)
+
+    @pytest.mark.asyncio
+    async def test_usage_is_reported(self):
+        stats = TaskStats()
+
+        result, _, _ = await self.execute("return [{'n': 1}]", stats)
+
+        assert result == [{"n": 1}]
+        assert stats.peak_rss is not None and stats.peak_rss > 0
+        for duration in (
+            stats.exec_duration,
+            stats.serialize_duration,
+            stats.import_duration,
+            stats.transfer_duration,
+            stats.cpu_user,
+            stats.cpu_system,
+        ):
+            assert duration is not None and duration >= 0
+
+
+class TestModulePreload:
+    def test_preloads_installed_allowlisted_modules(self, monkeypatch):
+        preloaded = MagicMock()
+        monkeypatch.setattr(
+            "src.task_executor.MULTIPROCESSING_CONTEXT.set_forkserver_preload",
+            preloaded,
+        )
+        security_config = SecurityConfig(
+            stdlib_allow={"json", "math"},
+            external_allow={"*", "websockets", "not_installed_module", "os"},
+            builtins_deny=set(),
+            runner_env_deny=True,
+        )
+
+        modules = TaskExecutor.preload_modules(security_config)
+
+        assert modules == ["json", "math", "websockets"]
+        preloaded.assert_called_once_with(["__main__", "json", "math", "websockets"])
+
+    def test_import_time_is_reported(self):
+        security_config = SecurityConfig(
+            stdlib_allow={"json"},
+            external_allow=set(),
+            builtins_deny=set(),
+            runner_env_deny=True,
+        )
+        safe_import = TaskExecutor._create_safe_import(security_config)
+        meter = UsageMeter()
+
+        safe_import("json")
+
+        usage = meter.usage(MagicMock(encode_duration=0.0))
+        assert usage["import_duration"] > 0
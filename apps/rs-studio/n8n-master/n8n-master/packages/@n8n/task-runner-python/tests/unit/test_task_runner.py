@@ -1,9 +1,31 @@
+import asyncio
+import json
+import time
+
 import pytest
-from unittest.mock import patch, Mock
+from unittest.mock import AsyncMock, patch, Mock
 from websockets.exceptions import InvalidStatus
 
 from src.task_runner import TaskRunner
 from src.config.task_runner_config import TaskRunnerConfig
+from src.constants import OFFER_INTERVAL, OFFER_MIN_INTERVAL
+from src.constants import (
+    TASK_REJECTED_REASON_AT_CAPACITY,
+    TASK_REJECTED_REASON_SATURATED,
+)
+from src.message_types.broker import (
+    BrokerTaskOfferAccept,
+    BrokerTaskSettings,
+    TaskSettings,
+)
+from src.message_types.runner import (
+    RunnerTaskAccepted,
+    RunnerTaskDone,
+    RunnerTaskError,
+    RunnerTaskOffer,
+    RunnerTaskRejected,
+)
+from src.task_state import TaskState, TaskStatus
 
 
 class TestTaskRunnerConnectionRetry:
@@ -68,3 +90,391 @@ class TestTaskRunnerConnectionRetry:
             assert "Authentication failed with status 403" in args
 
             assert mock_connect.call_count == 1
+
+
+class TestTaskRunnerOfferScheduling:
+    @pytest.fixture
+    def runner(self):
+        config = TaskRunnerConfig(
+            grant_token="test-token",
+            task_broker_uri="http://127.0.0.1:5679",
+            max_concurrency=3,
+            max_payload_size=1024 * 1024,
+            task_timeout=60,
+            auto_shutdown_timeout=0,
+            graceful_shutdown_timeout=10,
+            stdlib_allow=set(),
+            external_allow=set(),
+            builtins_deny=set(),
+            env_deny=False,
+            pipe_reader_timeout=3.0,
+        )
+        runner = TaskRunner(config)
+        runner.can_send_offers = True
+        runner.connections[0].is_registered = True
+        runner._send_message = AsyncMock()
+        return runner
+
+    def sent_offers(self, runner: TaskRunner) -> list[RunnerTaskOffer]:
+        return [
+            call.args[0]
+            for call in runner._send_message.call_args_list
+            if isinstance(call.args[0], RunnerTaskOffer)
+        ]
+
+    @pytest.mark.asyncio
+    async def test_expired_offers_are_replaced(self, runner):
+        await runner._send_offers()
+        first_round = {offer.offer_id for offer in self.sent_offers(runner)}
+
+        with patch("src.task_runner.time.time", return_value=time.time() + 60):
+            await runner._send_offers()
+
+        assert len(self.sent_offers(runner)) == 6
+        assert len(runner.open_offers) == 3
+        assert first_round.isdisjoint(runner.open_offers)
+
+    @pytest.mark.asyncio
+    async def test_freed_slot_is_re_offered_without_waiting_for_expiry(self, runner):
+        loop_task = asyncio.create_task(runner._send_offers_loop())
+        await asyncio.sleep(0.05)
+        assert len(self.sent_offers(runner)) == 3
+
+        accepted_offer_id = next(iter(runner.open_offers))
+        del runner.open_offers[accepted_offer_id]
+        runner._wake_offers_loop()
+        await asyncio.sleep(0.05)
+
+        runner.can_send_offers = False
+        loop_task.cancel()
+        await asyncio.gather(loop_task, return_exceptions=True)
+
+        assert len(self.sent_offers(runner)) == 4
+        assert len(runner.open_offers) == 3
+
+    @pytest.mark.asyncio
+    async def test_offer_over_tuned_limit_is_rejected(self, runner):
+        await runner._send_offers()
+        runner.concurrency_tuner = Mock(limit=Mock(return_value=1))
+        first, second, _ = runner.open_offers
+
+        await runner._handle_task_offer_accept(
+            BrokerTaskOfferAccept(task_id="t1", offer_id=first), runner.connections[0]
+        )
+        assert isinstance(runner._send_message.call_args.args[0], RunnerTaskAccepted)
+
+        await runner._handle_task_offer_accept(
+            BrokerTaskOfferAccept(task_id="t2", offer_id=second), runner.connections[0]
+        )
+        response = runner._send_message.call_args.args[0]
+        assert isinstance(response, RunnerTaskRejected)
+        assert response.reason == TASK_REJECTED_REASON_AT_CAPACITY
+
+    def test_min_offer_interval_follows_accept_latency(self, runner):
+        assert runner._get_min_offer_interval() == OFFER_MIN_INTERVAL
+
+        runner._record_accept_latency(0.1)
+        assert runner._get_min_offer_interval() == pytest.approx(0.1)
+
+        for _ in range(50):
+            runner._record_accept_latency(30.0)
+        assert runner._get_min_offer_interval() == OFFER_INTERVAL
+
+
+class TestTaskRunnerSendQueue:
+    @pytest.fixture
+    def runner(self):
+        config = TaskRunnerConfig(
+            grant_token="test-token",
+            task_broker_uri="http://127.0.0.1:5679",
+            max_concurrency=2,
+            max_payload_size=1024 * 1024,
+            task_timeout=60,
+            auto_shutdown_timeout=0,
+            graceful_shutdown_timeout=10,
+            stdlib_allow=set(),
+            external_allow=set(),
+            builtins_deny=set(),
+            env_deny=False,
+            pipe_reader_timeout=3.0,
+        )
+        runner = TaskRunner(config)
+        runner.connections[0].websocket = AsyncMock()
+        runner.connections[0].is_registered = True
+        return runner
+
+    @pytest.mark.asyncio
+    async def test_task_output_is_sent_in_queued_order(self, runner):
+        async def slow_send(*_args, **_kwargs):
+            await asyncio.sleep(0.001)
+
+        connection = runner.connections[0]
+        connection.websocket.send.side_effect = slow_send
+        connection.sender_coroutine = asyncio.create_task(
+            runner._send_queued_messages_loop(connection)
+        )
+
+        for task_id in ("a", "b"):
+            runner._queue_messages(
+                [
+                    *(
+                        runner._create_rpc_call(task_id, "logNodeOutput", [f"'{i}'"])
+                        for i in range(3)
+                    ),
+                    RunnerTaskDone(task_id=task_id, data={"result": []}),
+                ],
+                connection,
+            )
+
+        await runner._flush_send_queue(connection)
+        await runner._cancel_coroutine(connection.sender_coroutine)
+
+        sent = [
+            json.loads(call.args[0])
+            for call in connection.websocket.send.call_args_list
+        ]
+        assert [(m["type"], m["taskId"]) for m in sent] == [
+            ("runner:rpc", "a"),
+            ("runner:rpc", "a"),
+            ("runner:rpc", "a"),
+            ("runner:taskdone", "a"),
+            ("runner:rpc", "b"),
+            ("runner:rpc", "b"),
+            ("runner:rpc", "b"),
+            ("runner:taskdone", "b"),
+        ]
+        assert [m["params"] for m in sent[:3]] == [["'0'"], ["'1'"], ["'2'"]]
+
+    @pytest.mark.asyncio
+    async def test_results_are_held_across_reconnect(self, runner):
+        connection = runner.connections[0]
+        old_websocket = connection.websocket
+        connection.sender_coroutine = asyncio.create_task(
+            runner._send_queued_messages_loop(connection)
+        )
+        await runner._handle_disconnect(connection)
+
+        runner._queue_messages(
+            [
+                runner._create_rpc_call("a", "logNodeOutput", ["'lost'"]),
+                RunnerTaskDone(task_id="a", data={"result": []}),
+                RunnerTaskError(task_id="b", error={"message": "boom"}),
+            ],
+            connection,
+        )
+        assert len(connection.pending_results) == 2
+
+        connection.websocket = AsyncMock()
+        connection.sender_coroutine = asyncio.create_task(
+            runner._send_queued_messages_loop(connection)
+        )
+        await runner._handle_runner_registered(connection)
+        await runner._flush_send_queue(connection)
+        runner.can_send_offers = False
+        await runner._cancel_coroutine(runner.offers_coroutine)
+        await runner._cancel_coroutine(connection.sender_coroutine)
+
+        sent = [
+            json.loads(call.args[0])
+            for call in connection.websocket.send.call_args_list
+        ]
+        results = [(m["type"], m["taskId"]) for m in sent if "taskId" in m]
+        assert results == [("runner:taskdone", "a"), ("runner:taskerror", "b")]
+        old_websocket.send.assert_not_called()
+        assert not connection.pending_results
+
+
+class TestTaskRunnerWorkflowScheduling:
+    @pytest.fixture
+    def runner(self):
+        config = TaskRunnerConfig(
+            grant_token="test-token",
+            task_broker_uri="http://127.0.0.1:5679",
+            max_concurrency=3,
+            max_payload_size=1024 * 1024,
+            task_timeout=60,
+            auto_shutdown_timeout=0,
+            graceful_shutdown_timeout=10,
+            stdlib_allow=set(),
+            external_allow=set(),
+            builtins_deny=set(),
+            env_deny=False,
+            pipe_reader_timeout=3.0,
+            workflow_max_concurrency=1,
+            max_queued_tasks=1,
+        )
+        runner = TaskRunner(config)
+        runner._send_message = AsyncMock()
+        runner._execute_task = AsyncMock()
+        return runner
+
+    async def receive_settings(
+        self, runner: TaskRunner, task_id: str, workflow_id: str, size: int = 0
+    ):
+        task_state = TaskState(task_id)
+        task_state.connection = runner.connections[0]
+        runner.running_tasks[task_id] = task_state
+        settings = TaskSettings(
+            code="return []",
+            node_mode="all_items",
+            continue_on_fail=False,
+            items=[],
+            workflow_name="Workflow",
+            workflow_id=workflow_id,
+            node_name="Code",
+            node_id="node",
+        )
+        await runner._handle_task_settings(BrokerTaskSettings(task_id, settings), size)
+
+    @pytest.mark.asyncio
+    async def test_task_over_workflow_cap_is_queued_and_frees_its_slot(self, runner):
+        await self.receive_settings(runner, "t1", "noisy")
+        await self.receive_settings(runner, "t2", "noisy")
+
+        assert runner.running_tasks["t1"].status == TaskStatus.RUNNING
+        assert runner.running_tasks["t2"].status == TaskStatus.QUEUED
+        assert runner.running_tasks_count == 1
+
+        await self.receive_settings(runner, "t3", "other")
+        assert runner.running_tasks["t3"].status == TaskStatus.RUNNING
+
+        del runner.running_tasks["t1"]
+        runner.scheduler.finished("noisy")
+        runner._start_queued_tasks()
+
+        assert runner.running_tasks["t2"].status == TaskStatus.RUNNING
+        assert runner.scheduler.queued_count == 0
+
+    @pytest.mark.asyncio
+    async def test_task_is_rejected_when_queue_is_full(self, runner):
+        connection = runner.connections[0]
+        connection.is_registered = True
+
+        for task_id in ("t1", "t2", "t3"):
+            await self.receive_settings(runner, task_id, "noisy")
+
+        assert "t3" not in runner.running_tasks
+        serialized, is_result = connection.send_queue.get_nowait()
+        assert is_result
+        assert json.loads(serialized) == {
+            "type": "runner:taskerror",
+            "taskId": "t3",
+            "error": {"message": TASK_REJECTED_REASON_SATURATED},
+        }
+
+    @pytest.mark.asyncio
+    async def test_task_is_rejected_when_queued_bytes_are_full(self, runner):
+        runner.config.max_queued_tasks = 10
+        runner.scheduler.max_queued = 10
+        runner.scheduler.max_queued_bytes = 100
+        await self.receive_settings(runner, "t1", "noisy")
+        await self.receive_settings(runner, "t2", "noisy", size=80)
+        await self.receive_settings(runner, "t3", "noisy", size=80)
+
+        assert runner.running_tasks["t2"].status == TaskStatus.QUEUED
+        assert "t3" not in runner.running_tasks
+
+    @pytest.mark.asyncio
+    async def test_queued_task_times_out(self, runner):
+        connection = runner.connections[0]
+        connection.is_registered = True
+        runner.config.task_timeout = 0.05
+        await self.receive_settings(runner, "t1", "noisy")
+        await self.receive_settings(runner, "t2", "noisy")
+
+        await asyncio.sleep(0.1)
+
+        assert "t2" not in runner.running_tasks
+        assert runner.scheduler.queued_count == 0
+        serialized, _ = connection.send_queue.get_nowait()
+        message = json.loads(serialized)
+        assert message["taskId"] == "t2"
+        assert "timed out" in message["error"]["message"]
+
+    @pytest.mark.asyncio
+    async def test_started_task_gets_timeout_left_after_queueing(self, runner):
+        await self.receive_settings(runner, "t1", "noisy")
+        await self.receive_settings(runner, "t2", "noisy")
+        task_state = runner.running_tasks["t2"]
+        task_state.queued_at = time.monotonic() - 45
+
+        del runner.running_tasks["t1"]
+        runner.scheduler.finished("noisy")
+        runner._start_queued_tasks()
+
+        assert task_state.queue_timer is None
+        assert runner._get_task_timeout(task_state) == 15
+
+
+class TestTaskRunnerMultipleBrokers:
+    @pytest.fixture
+    def runner(self):
+        config = TaskRunnerConfig(
+            grant_token="test-token",
+            task_broker_uri="http://127.0.0.1:5679, http://127.0.0.2:5679",
+            max_concurrency=4,
+            max_payload_size=1024 * 1024,
+            task_timeout=60,
+            auto_shutdown_timeout=0,
+            graceful_shutdown_timeout=10,
+            stdlib_allow=set(),
+            external_allow=set(),
+            builtins_deny=set(),
+            env_deny=False,
+            pipe_reader_timeout=3.0,
+        )
+        runner = TaskRunner(config)
+        runner.can_send_offers = True
+        for connection in runner.connections:
+            connection.is_registered = True
+        runner._send_message = AsyncMock()
+        return runner
+
+    def offers_by_connection(self, runner: TaskRunner) -> dict[str, list[str]]:
+        offers: dict[str, list[str]] = {c.uri: [] for c in runner.connections}
+        for call in runner._send_message.call_args_list:
+            message, connection = call.args
+            if isinstance(message, RunnerTaskOffer):
+                offers[connection.uri].append(message.offer_id)
+        return offers
+
+    @pytest.mark.asyncio
+    async def test_slots_are_shared_and_spread_across_brokers(self, runner):
+        await runner._send_offers()
+
+        offers = self.offers_by_connection(runner)
+        assert [len(ids) for ids in offers.values()] == [2, 2]
+        assert len(runner.open_offers) == 4
+
+    @pytest.mark.asyncio
+    async def test_offer_can_only_be_accepted_by_its_broker(self, runner):
+        await runner._send_offers()
+        first, second = runner.connections
+        offer_id = self.offers_by_connection(runner)[first.uri][0]
+
+        await runner._handle_task_offer_accept(
+            BrokerTaskOfferAccept(task_id="t1", offer_id=offer_id), second
+        )
+        assert isinstance(runner._send_message.call_args.args[0], RunnerTaskRejected)
+
+        await runner._handle_task_offer_accept(
+            BrokerTaskOfferAccept(task_id="t1", offer_id=offer_id), first
+        )
+        response, connection = runner._send_message.call_args.args
+        assert isinstance(response, RunnerTaskAccepted)
+        assert connection is first
+        assert runner.running_tasks["t1"].connection is first
+
+    @pytest.mark.asyncio
+    async def test_slots_offered_to_disconnected_broker_go_to_the_others(self, runner):
+        await runner._send_offers()
+        first, second = runner.connections
+
+        await runner._handle_disconnect(first)
+        await runner._send_offers()
+
+        offers = self.offers_by_connection(runner)
+        assert len(offers[first.uri]) == 2
+        assert len(offers[second.uri]) == 4
+        assert all(o.connection is second for o in runner.open_offers.values())
+        assert runner.can_send_offers
@@ -0,0 +1,216 @@
+import itertools
+import os
+import sqlite3
+import stat
+import threading
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from unittest.mock import patch
+
+import pytest
+
+from src.config.security_config import SecurityConfig
+from src.errors.security_violation_error import SecurityViolationError
+from src.task_analyzer import TaskAnalyzer, validation_rules_fingerprint
+from src.validation_cache import PersistentValidationCache
+
+ALLOWLISTS = (("json",), ())
+RULES = "rules"
+
+
+class TestPersistentValidationCache:
+    @pytest.fixture
+    def path(self, tmp_path) -> str:
+        return str(tmp_path / "validation-cache.db")
+
+    def test_round_trip(self, path):
+        cache = PersistentValidationCache(path, max_size=10, rules=RULES)
+
+        cache.put(("hash", ALLOWLISTS), ["Line 1: violation"])
+
+        assert cache.get(("hash", ALLOWLISTS)) == ["Line 1: violation"]
+        assert cache.get(("hash", (("os",), ()))) is None
+        assert cache.get(("other", ALLOWLISTS)) is None
+
+    def test_shared_between_instances(self, path):
+        PersistentValidationCache(path, max_size=10, rules=RULES).put(
+            ("hash", ALLOWLISTS), []
+        )
+
+        assert (
+            PersistentValidationCache(path, max_size=10, rules=RULES).get(
+                ("hash", ALLOWLISTS)
+            )
+            == []
+        )
+
+    def test_evicts_least_recently_used(self, path):
+        cache = PersistentValidationCache(path, max_size=2, rules=RULES)
+
+        # an hour between calls, so every hit records its use
+        hours = itertools.count(0, 3600)
+        with patch("src.validation_cache.time.time", side_effect=hours):
+            cache.put(("a", ALLOWLISTS), [])
+            cache.put(("b", ALLOWLISTS), [])
+            cache.get(("a", ALLOWLISTS))
+            cache.put(("c", ALLOWLISTS), [])
+
+            assert cache.get(("a", ALLOWLISTS)) == []
+            assert cache.get(("b", ALLOWLISTS)) is None
+            assert cache.get(("c", ALLOWLISTS)) == []
+
+    def test_recent_hit_does_not_write(self, path):
+        cache = PersistentValidationCache(path, max_size=10, rules=RULES)
+
+        with patch("src.validation_cache.time.time", side_effect=[100.0, 130.0, 200.0]):
+            cache.put(("hash", ALLOWLISTS), [])
+            assert cache.get(("hash", ALLOWLISTS)) == []  # 30s later, not recorded
+            assert cache.get(("hash", ALLOWLISTS)) == []  # 100s later, recorded
+
+        [(last_used,)] = sqlite3.connect(path).execute(
+            "SELECT last_used FROM validations"
+        )
+        assert last_used == 200.0
+
+    def test_evicts_in_batches(self, path):
+        cache = PersistentValidationCache(path, max_size=20, rules=RULES)
+
+        for i in range(22):
+            cache.put((str(i), ALLOWLISTS), [])
+
+        # trimmed on the 1st insert, then every 2 inserts: last on the 21st
+        [(size,)] = sqlite3.connect(path).execute("SELECT COUNT(*) FROM validations")
+        assert size == 21
+
+    def test_connection_per_thread(self, path):
+        cache = PersistentValidationCache(path, max_size=10, rules=RULES)
+        cache.put(("hash", ALLOWLISTS), [])
+
+        with ThreadPoolExecutor(max_workers=2) as pool:
+            hits = list(pool.map(cache.get, [("hash", ALLOWLISTS)] * 2))
+
+        assert hits == [[], []]
+        assert len(cache._connections) >= 2
+
+        cache.close()
+
+        assert not cache._connections
+        assert cache.get(("hash", ALLOWLISTS)) == []  # reconnects
+
+    def test_results_of_other_rules_are_not_used(self, path):
+        PersistentValidationCache(path, max_size=10, rules="old").put(
+            ("hash", ALLOWLISTS), []
+        )
+
+        cache = PersistentValidationCache(path, max_size=10, rules="new")
+        assert cache.get(("hash", ALLOWLISTS)) is None
+
+    def test_file_and_directory_are_private(self, tmp_path):
+        path = tmp_path / "cache" / "validation-cache.db"
+        cache = PersistentValidationCache(str(path), max_size=10, rules=RULES)
+
+        cache.put(("hash", ALLOWLISTS), [])
+
+        assert stat.S_IMODE(os.stat(path).st_mode) == 0o600
+        assert stat.S_IMODE(os.stat(path.parent).st_mode) == 0o700
+
+    @pytest.mark.parametrize("writable", ["file", "directory"])
+    def test_path_others_can_write_to_is_not_used(self, tmp_path, writable):
+        path = tmp_path / "cache" / "validation-cache.db"
+        PersistentValidationCache(str(path), max_size=10, rules=RULES).put(
+            ("hash", ALLOWLISTS), []
+        )
+        os.chmod(path if writable == "file" else path.parent, 0o777)
+
+        cache = PersistentValidationCache(str(path), max_size=10, rules=RULES)
+
+        assert cache.get(("hash", ALLOWLISTS)) is None
+
+    def test_unusable_path_is_a_cache_miss(self, tmp_path):
+        (tmp_path / "file").touch()
+        cache = PersistentValidationCache(str(tmp_path / "file" / "x.db"), 10, RULES)
+
+        cache.put(("hash", ALLOWLISTS), [])
+
+        assert cache.get(("hash", ALLOWLISTS)) is None
+
+
+class TestTaskAnalyzerWithPersistentCache:
+    def test_rules_fingerprint_changes_with_blocked_names(self):
+        fingerprint = validation_rules_fingerprint()
+
+        assert validation_rules_fingerprint() == fingerprint
+        with patch("src.task_analyzer.BLOCKED_NAMES", {"eval"}):
+            assert validation_rules_fingerprint() != fingerprint
+
+    def test_restarted_runner_skips_parsing(self, tmp_path):
+        security_config = SecurityConfig(
+            stdlib_allow={"json"},
+            external_allow=set(),
+            builtins_deny=set(),
+            runner_env_deny=True,
+        )
+        path = str(tmp_path / "validation-cache.db")
+        code = "import os"
+
+        analyzer = TaskAnalyzer(
+            security_config, PersistentValidationCache(path, 10, RULES)
+        )
+        with pytest.raises(SecurityViolationError):
+            analyzer.validate(code)
+
+        TaskAnalyzer._cache.clear()  # as after a restart
+
+        restarted = TaskAnalyzer(
+            security_config, PersistentValidationCache(path, 10, RULES)
+        )
+        with (
+            patch("src.task_analyzer.ast.parse") as mock_parse,
+            pytest.raises(SecurityViolationError) as exc_info,
+        ):
+            restarted.validate(code)
+
+        mock_parse.assert_not_called()
+        assert "os" in exc_info.value.description
+
+    @pytest.mark.asyncio
+    async def test_async_validation_uses_cache_off_event_loop(self, tmp_path):
+        security_config = SecurityConfig(
+            stdlib_allow={"json"},
+            external_allow=set(),
+            builtins_deny=set(),
+            runner_env_deny=True,
+        )
+        cache = PersistentValidationCache(
+            str(tmp_path / "validation-cache.db"), 10, RULES
+        )
+        code = f"import os  # {uuid.uuid4()}"
+        threads: list[threading.Thread] = []
+
+        def record_thread(method):
+            def wrapper(*args):
+                threads.append(threading.current_thread())
+                return method(*args)
+
+            return wrapper
+
+        analyzer = TaskAnalyzer(security_config, cache)
+        with (
+            patch.object(cache, "get", record_thread(cache.get)),
+            patch.object(cache, "put", record_thread(cache.put)),
+        ):
+            with pytest.raises(SecurityViolationError):
+                await analyzer.validate_async(code)
+
+            TaskAnalyzer._cache.clear()  # as after a restart
+
+            with (
+                patch("src.task_analyzer.ast.parse") as mock_parse,
+                pytest.raises(SecurityViolationError),
+            ):
+                await analyzer.validate_async(code)
+
+        analyzer.shutdown()
+        mock_parse.assert_not_called()
+        assert len(threads) == 3  # get and put, then a hit
+        assert threading.current_thread() not in threads
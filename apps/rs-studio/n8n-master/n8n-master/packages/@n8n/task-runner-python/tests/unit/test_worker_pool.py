@@ -0,0 +1,224 @@
+import asyncio
+
+import pytest
+
+from src.config.security_config import SecurityConfig
+from src.errors import TaskResourceLimitError, TaskRuntimeError, TaskTimeoutError
+from src.task_executor import TaskExecutor
+from src.worker_pool import WorkerPool
+
+
+@pytest.fixture
+def security_config():
+    return SecurityConfig(
+        stdlib_allow={"time"},
+        external_allow=set(),
+        builtins_deny=set(),
+        runner_env_deny=True,
+    )
+
+
+WORKFLOW = "workflow-1"
+
+
+def execute(worker, code, node_mode="all_items", items=None, task_timeout=5):
+    return asyncio.run(
+        TaskExecutor.execute_in_worker(
+            process=worker.process,
+            task_conn=worker.task_conn,
+            read_conn=worker.read_conn,
+            code=code,
+            node_mode=node_mode,
+            items=items or [],
+            task_timeout=task_timeout,
+            continue_on_fail=False,
+        )
+    )
+
+
+class TestWorkerPool:
+    def test_start_prewarms_workers(self, security_config):
+        pool = WorkerPool(
+            size=2, max_tasks=1, max_memory_growth=0, security_config=security_config
+        )
+        try:
+            pool.start()
+
+            assert pool.idle_count == 2
+        finally:
+            pool.shutdown()
+
+    def test_worker_is_recycled_after_max_tasks(self, security_config):
+        pool = WorkerPool(
+            size=1, max_tasks=2, max_memory_growth=0, security_config=security_config
+        )
+        try:
+            pool.start()
+
+            first = pool.acquire(WORKFLOW)
+            assert execute(first, "return [{'n': 1}]")[0] == [{"n": 1}]
+            pool.release(first)
+
+            second = pool.acquire(WORKFLOW)
+            assert second is first
+            result, _, _ = execute(
+                second,
+                "return {'n': _item['json']['n']}",
+                "per_item",
+                [{"json": {"n": 2}}],
+            )
+            assert result == [{"json": {"n": 2}, "pairedItem": {"item": 0}}]
+            pool.release(second)
+
+            third = pool.acquire(WORKFLOW)
+            assert third is not first
+            assert not first.process.is_alive()
+            pool.release(third)
+        finally:
+            pool.shutdown()
+
+    def test_used_worker_only_runs_tasks_of_same_workflow(self, security_config):
+        pool = WorkerPool(
+            size=2, max_tasks=5, max_memory_growth=0, security_config=security_config
+        )
+        try:
+            pool.start()
+
+            first = pool.acquire(WORKFLOW)
+            pool.release(first)
+
+            other = pool.acquire("workflow-2")
+            assert other is not first
+            pool.release(other)
+
+            assert pool.acquire(WORKFLOW) is first
+            pool.release(first)
+        finally:
+            pool.shutdown()
+
+    def test_used_workers_over_size_are_retired(self, security_config):
+        pool = WorkerPool(
+            size=1, max_tasks=5, max_memory_growth=0, security_config=security_config
+        )
+        try:
+            first = pool.acquire(WORKFLOW)
+            second = pool.acquire("workflow-2")
+            pool.release(first)
+            pool.release(second)
+
+            assert not first.process.is_alive()
+            assert pool.acquire("workflow-2") is second
+            pool.release(second)
+        finally:
+            pool.shutdown()
+
+    def test_worker_without_workflow_is_not_reused(self, security_config):
+        pool = WorkerPool(
+            size=1, max_tasks=5, max_memory_growth=0, security_config=security_config
+        )
+        try:
+            worker = pool.acquire(None)
+            pool.release(worker)
+
+            assert not worker.process.is_alive()
+        finally:
+            pool.shutdown()
+
+    def test_user_error_keeps_worker_reusable(self, security_config):
+        pool = WorkerPool(
+            size=1, max_tasks=5, max_memory_growth=0, security_config=security_config
+        )
+        try:
+            worker = pool.acquire(WORKFLOW)
+
+            with pytest.raises(TaskRuntimeError):
+                execute(worker, "raise ValueError('boom')")
+
+            assert worker.process.is_alive()
+            assert execute(worker, "return [{'ok': True}]")[0] == [{"ok": True}]
+            pool.release(worker)
+        finally:
+            pool.shutdown()
+
+    def test_timeout_stops_worker(self, security_config):
+        pool = WorkerPool(
+            size=1, max_tasks=5, max_memory_growth=0, security_config=security_config
+        )
+        try:
+            worker = pool.acquire(WORKFLOW)
+
+            with pytest.raises(TaskTimeoutError):
+                execute(worker, "while True:\n    pass", task_timeout=1)
+
+            assert not worker.process.is_alive()
+            pool.release(worker)
+            assert pool.acquire(WORKFLOW) is not worker
+        finally:
+            pool.shutdown()
+
+    def test_cpu_time_limit_applies_per_task(self, security_config):
+        security_config.max_cpu_time = 1
+        pool = WorkerPool(
+            size=1, max_tasks=5, max_memory_growth=0, security_config=security_config
+        )
+        busy_for = (
+            "import time\n"
+            "start = time.process_time()\n"
+            "while time.process_time() - start < {}:\n"
+            "    pass\n"
+            "return []"
+        )
+        try:
+            worker = pool.acquire(WORKFLOW)
+
+            # together over the limit, but each task gets its own allowance
+            execute(worker, busy_for.format(0.6))
+            execute(worker, busy_for.format(0.6))
+
+            with pytest.raises(TaskResourceLimitError):
+                execute(worker, busy_for.format(3))
+
+            assert not worker.process.is_alive()
+            pool.release(worker)
+        finally:
+            pool.shutdown()
+
+    def test_module_changes_do_not_leak_to_next_task(self, security_config):
+        security_config.stdlib_allow = {"json", "colorsys", "sys"}
+        pool = WorkerPool(
+            size=1, max_tasks=5, max_memory_growth=0, security_config=security_config
+        )
+        patch_modules = (
+            "import json\n"
+            "import colorsys\n"
+            "json.dumps = lambda *args, **kwargs: 'patched'\n"
+            "json.JSONEncoder.encode = lambda self, o: 'patched'\n"
+            "json.injected = True\n"
+            "return []"
+        )
+        check_modules = (
+            "import json\n"
+            "import sys\n"
+            "return [{\n"
+            "    'dumps': json.dumps({'a': 1}),\n"
+            "    'encode': json.JSONEncoder().encode([1]),\n"
+            "    'injected': hasattr(json, 'injected'),\n"
+            "    'colorsys_kept': 'colorsys' in sys.modules,\n"
+            "}]"
+        )
+        worker = pool.acquire(WORKFLOW)
+        try:
+            execute(worker, patch_modules)
+            result, _, _ = execute(worker, check_modules)
+
+            assert result == [
+                {
+                    "dumps": '{"a": 1}',
+                    "encode": "[1]",
+                    "injected": False,
+                    "colorsys_kept": False,
+                }
+            ]
+        finally:
+            pool.release(worker)
+            pool.shutdown()
@@ -0,0 +1,111 @@
+from src.message_types.broker import TaskSettings
+from src.workflow_scheduler import QueuedTask, WorkflowScheduler
+
+
+def queued(task_id: str, workflow_id: str, size: int = 0) -> QueuedTask:
+    settings = TaskSettings(
+        code="return []",
+        node_mode="all_items",
+        continue_on_fail=False,
+        items=[],
+        workflow_name="Workflow",
+        workflow_id=workflow_id,
+        node_name="Code",
+        node_id="node",
+    )
+    return QueuedTask(task_id, settings, size)
+
+
+class TestWorkflowScheduler:
+    def test_caps_running_tasks_per_workflow(self):
+        scheduler = WorkflowScheduler(max_per_workflow=2, max_queued=10)
+
+        scheduler.started("a")
+        assert scheduler.can_start("a")
+        scheduler.started("a")
+        assert not scheduler.can_start("a")
+        assert scheduler.can_start("b")
+
+        scheduler.finished("a")
+        assert scheduler.can_start("a")
+
+    def test_no_cap_when_zero(self):
+        scheduler = WorkflowScheduler(max_per_workflow=0, max_queued=10)
+
+        for _ in range(100):
+            scheduler.started("a")
+
+        assert scheduler.can_start("a")
+
+    def test_rejects_when_queue_is_full(self):
+        scheduler = WorkflowScheduler(max_per_workflow=1, max_queued=1)
+
+        assert scheduler.enqueue("a", queued("t1", "a"))
+        assert scheduler.is_saturated
+        assert not scheduler.enqueue("b", queued("t2", "b"))
+
+    def test_rejects_when_queued_bytes_are_over_limit(self):
+        scheduler = WorkflowScheduler(
+            max_per_workflow=1, max_queued=10, max_queued_bytes=100
+        )
+
+        assert scheduler.enqueue("a", queued("t1", "a", size=60))
+        assert not scheduler.enqueue("b", queued("t2", "b", size=60))
+        assert scheduler.enqueue("b", queued("t3", "b", size=40))
+        assert scheduler.is_saturated
+
+        scheduler.remove("t1")
+        assert scheduler.queued_bytes == 40
+        assert scheduler.enqueue("b", queued("t4", "b", size=60))
+
+    def test_queues_task_over_bytes_limit_when_queue_is_empty(self):
+        scheduler = WorkflowScheduler(
+            max_per_workflow=1, max_queued=10, max_queued_bytes=100
+        )
+
+        assert scheduler.enqueue("a", queued("t1", "a", size=500))
+        assert not scheduler.enqueue("a", queued("t2", "a", size=1))
+
+        scheduler.drain()
+        assert scheduler.queued_bytes == 0
+
+    def test_slots_are_shared_by_weight(self):
+        scheduler = WorkflowScheduler(
+            max_per_workflow=1, max_queued=100, weights={"critical": 3}
+        )
+        for i in range(6):
+            scheduler.enqueue("critical", queued(f"c{i}", "critical"))
+            scheduler.enqueue("noisy", queued(f"n{i}", "noisy"))
+
+        order = []
+        for _ in range(8):
+            task = scheduler.next_task()
+            assert task is not None
+            workflow_id = task.settings.workflow_id
+            order.append(workflow_id)
+            scheduler.started(workflow_id)
+            scheduler.finished(workflow_id)
+
+        assert order.count("critical") == 6
+        assert order.count("noisy") == 2
+
+    def test_queued_task_waits_for_its_workflow_slot(self):
+        scheduler = WorkflowScheduler(max_per_workflow=1, max_queued=10)
+        scheduler.started("a")
+        scheduler.enqueue("a", queued("t1", "a"))
+
+        assert scheduler.next_task() is None
+
+        scheduler.finished("a")
+        task = scheduler.next_task()
+        assert task is not None and task.task_id == "t1"
+        assert scheduler.queued_count == 0
+
+    def test_remove_cancelled_task(self):
+        scheduler = WorkflowScheduler(max_per_workflow=1, max_queued=10)
+        scheduler.enqueue("a", queued("t1", "a"))
+
+        assert scheduler.remove("t1")
+        assert not scheduler.remove("t1")
+        assert scheduler.queued_count == 0
+        assert scheduler.next_task() is None